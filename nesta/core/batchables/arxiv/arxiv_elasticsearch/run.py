@@ -9,8 +9,6 @@ searchkit front-end.
 
 from nesta.core.luigihacks.elasticsearchplus import ElasticsearchPlus
 from ast import literal_eval
-import boto3
-import json
 import logging
 import os
 import pandas as pd
@@ -28,6 +26,7 @@ from nesta.packages.mag.fos_lookup import split_ids
 from nesta.packages.geo_utils.lookup import get_country_region_lookup
 from nesta.packages.arxiv.deepchange_analysis import is_multinational
 from nesta.packages.nlp_utils.ngrammer import Ngrammer
+from nesta.packages.misc_utils.batches import get_s3_batch
 
 def hierarchy_field(row_data):
     """
@@ -72,7 +71,8 @@ def run():
     
     # Setup ngrammer
     os.environ['MYSQLDBCONF'] = os.environ['BATCHPAR_config']
-    ngrammer = Ngrammer(database="production")
+    ngrammer = Ngrammer(database="production",
+                        snapshot_path=os.environ.get("BATCHPAR_ngram_snapshot"))
 
     # es setup
     strans_kwargs={'filename':'arxiv.json', 'ignore':['id']}
@@ -90,9 +90,8 @@ def run():
     # collect file
     nrows = 20 if test else None
 
-    s3 = boto3.resource('s3')
-    obj = s3.Object(bucket, batch_file)
-    art_ids = json.loads(obj.get()['Body']._raw_stream.read())
+    art_ids = get_s3_batch(bucket, batch_file,
+                           os.environ.get('BATCHPAR_batch_number'))
     logging.info(f"{len(art_ids)} article IDs "
                  "retrieved from s3")
     
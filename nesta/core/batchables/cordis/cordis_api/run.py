@@ -6,18 +6,17 @@ Transfer data on organisations, projects and outputs
 from the Cordis API on a project-by-project basis.
 """
 
-from nesta.packages.cordis.cordis_api import fetch_data
+from nesta.packages.cordis.cordis_api import fetch_many
 from nesta.core.orms.cordis_orm import Base
 from nesta.core.orms.orm_utils import get_mysql_engine
 from nesta.core.orms.orm_utils import try_until_allowed
 from nesta.core.orms.orm_utils import get_class_by_tablename
 from nesta.core.orms.orm_utils import insert_data
 from nesta.core.luigihacks.luigi_logging import set_log_level
+from nesta.packages.misc_utils.batches import get_s3_batch
 
 import logging
 import os
-import json
-import boto3
 from collections import defaultdict
 
 
@@ -70,16 +69,15 @@ def run():
     try_until_allowed(Base.metadata.create_all, engine)
 
     # Retrieve RCNs to iterate over
-    s3 = boto3.resource('s3')
-    obj = s3.Object(bucket, batch_file)
-    all_rcn = json.loads(obj.get()['Body']._raw_stream.read())
+    all_rcn = get_s3_batch(bucket, batch_file,
+                           os.environ.get('BATCHPAR_batch_number'))
     logging.info(f"{len(all_rcn)} project RCNs retrieved from s3")
 
     # Retrieve all topics
     data = defaultdict(list)
-    for i, rcn in enumerate(all_rcn):
+    for i, (rcn, results) in enumerate(fetch_many(all_rcn)):
         logging.info(i)
-        project, orgs, reports, pubs = fetch_data(rcn)
+        project, orgs, reports, pubs = results
         if project is None:
             continue
         _topics = project.pop('topics')
@@ -11,8 +11,6 @@ in depth analysis of MAG fields of study.
 """
 
 from ast import literal_eval
-import boto3
-import json
 import logging
 import os
 from nuts_finder import NutsFinder
@@ -25,10 +23,12 @@ from nesta.core.orms.orm_utils import object_to_dict
 from nesta.core.orms.arxiv_orm import Article as Art
 from nesta.core.orms.grid_orm import Institute as Inst
 from nesta.packages.arxiv.deepchange_analysis import is_multinational
-from nesta.packages.mag.fos_lookup import build_fos_lookup
+from nesta.packages.mag.fos_lookup import load_fos_graph
 from nesta.packages.mag.fos_lookup import make_fos_tree
 from nesta.packages.geo_utils.lookup import get_country_region_lookup
 from nesta.packages.geo_utils.lookup import get_eu_countries
+from nesta.packages.geo_utils.nuts import BatchNutsFinder
+from nesta.packages.misc_utils.batches import get_s3_batch
 
 
 def run():
@@ -48,9 +48,13 @@ def run():
     logging.info('Retrieving engine connection')
     engine = get_mysql_engine("BATCHPAR_config", "mysqldb",
                               db_name)
-    logging.info('Building FOS lookup')
-    fos_lookup = build_fos_lookup(engine, max_lvl=6)
-    nf = NutsFinder()
+    logging.info('Loading FOS graph')
+    # The FoS graph is built once per routine, and then shared between jobs
+    routine_id = os.environ.get('BATCHPAR_routine_id')
+    fos_lookup = load_fos_graph(engine, max_lvl=6,
+                                bucket=None if routine_id is None else bucket,
+                                key=f'{routine_id}-fos_graph.json')
+    nf = BatchNutsFinder.from_nuts_finder(NutsFinder())
     
     # es setup
     logging.info('Connecting to ES')
@@ -71,9 +75,8 @@ def run():
     # collect file
     logging.info('Retrieving article ids')
     nrows = 20 if test else None
-    s3 = boto3.resource('s3')
-    obj = s3.Object(bucket, batch_file)
-    art_ids = json.loads(obj.get()['Body']._raw_stream.read())
+    art_ids = get_s3_batch(bucket, batch_file,
+                           os.environ.get('BATCHPAR_batch_number'))
     logging.info(f"{len(art_ids)} article IDs "
                  "retrieved from s3")
 
@@ -97,9 +100,12 @@ def run():
     #
     logging.info('Processing rows')
     with db_session(engine) as session:
-        for count, obj in enumerate((session.query(Art)
-                                     .filter(Art.id.in_(art_ids))
-                                     .all())):
+        articles = session.query(Art).filter(Art.id.in_(art_ids)).all()
+        # Resolve the NUTS regions of all institutes in the batch at once
+        nf.find_by_grid_id({inst.institute_id: grid_latlon[inst.institute_id]
+                            for obj in articles for inst in obj.institutes
+                            if inst.institute_id in grid_latlon})
+        for count, obj in enumerate(articles):
             row = object_to_dict(obj)
             # Extract year from date
             if row['created'] is not None:
@@ -131,7 +137,7 @@ def run():
                 lat, lon = grid_latlon[inst_id]
                 if lat is None or lon is None:
                     continue
-                nuts = nf.find(lat=lat, lon=lon)
+                nuts = nf.find_by_grid_id({inst_id: (lat, lon)})[inst_id]
                 for i in range(0, 4):
                     name = f'nuts_{i}'
                     if name not in row:
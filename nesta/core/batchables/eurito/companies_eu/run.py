@@ -9,8 +9,6 @@ to Elasticsearch.
 from nesta.core.luigihacks.elasticsearchplus import ElasticsearchPlus
 
 from ast import literal_eval
-import boto3
-import json
 import logging
 import os
 import pandas as pd
@@ -27,6 +25,7 @@ from nesta.core.orms.crunchbase_orm import CategoryGroup
 from nesta.core.orms.crunchbase_orm import FundingRound
 from nesta.core.orms.geographic_orm import Geographic
 from nesta.packages.geo_utils.lookup import get_eu_countries
+from nesta.packages.misc_utils.batches import get_s3_batch
 
 
 def run():
@@ -80,9 +79,8 @@ def run():
     # collect file
     nrows = 20 if test else None
 
-    s3 = boto3.resource('s3')
-    obj = s3.Object(bucket, batch_file)
-    org_ids = json.loads(obj.get()['Body']._raw_stream.read())
+    org_ids = get_s3_batch(bucket, batch_file,
+                           os.environ.get('BATCHPAR_batch_number'))
     logging.info(f"{len(org_ids)} organisations retrieved from s3")
 
     org_fields = set(c.name for c in Organization.__table__.columns)
@@ -7,8 +7,6 @@ to Elasticsearch.
 """
 
 from ast import literal_eval
-import boto3
-import json
 import logging
 import os
 from datetime import datetime as dt
@@ -19,6 +17,7 @@ from nesta.core.orms.orm_utils import db_session, get_mysql_engine
 from nesta.core.orms.orm_utils import load_json_from_pathstub
 from nesta.core.orms.orm_utils import object_to_dict
 from nesta.core.orms.cordis_orm import Project
+from nesta.packages.misc_utils.batches import get_s3_batch
 
 def validate_date(row, label):
     """Reformat dates so they are as expected on ingestion to ES
@@ -104,9 +103,8 @@ def run():
 
     # collect file
     logging.info('Retrieving project ids')
-    s3 = boto3.resource('s3')
-    obj = s3.Object(bucket, batch_file)
-    project_ids = json.loads(obj.get()['Body']._raw_stream.read())
+    project_ids = get_s3_batch(bucket, batch_file,
+                               os.environ.get('BATCHPAR_batch_number'))
     logging.info(f"{len(project_ids)} project IDs "
                  "retrieved from s3")
 
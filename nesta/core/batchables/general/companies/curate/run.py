@@ -11,8 +11,6 @@ from nesta.core.luigihacks.elasticsearchplus import _clean_up_lists, _remove_pad
 from nesta.core.luigihacks.elasticsearchplus import _country_detection
 
 from ast import literal_eval
-import boto3
-import json
 import logging
 import os
 import pandas as pd
@@ -35,6 +33,7 @@ from nesta.core.orms.geographic_orm import Geographic
 
 # Output ORM
 from nesta.core.orms.general_orm import CrunchbaseOrg, Base
+from nesta.packages.misc_utils.batches import get_s3_batch
 
 def float_pop(d, k):
     """Pop a value from dict by key, then convert to float if not None.
@@ -138,9 +137,8 @@ def run():
 
     # Retrieve list of Org ids from S3
     nrows = 20 if test else None
-    s3 = boto3.resource('s3')
-    obj = s3.Object(bucket, batch_file)
-    org_ids = json.loads(obj.get()['Body']._raw_stream.read())
+    org_ids = get_s3_batch(bucket, batch_file,
+                           os.environ.get('BATCHPAR_batch_number'))
     logging.info(f"{len(org_ids)} organisations retrieved from s3")
     # Lists of fields to extract
     org_fields = list(set(c.name for c in Organization.__table__.columns))
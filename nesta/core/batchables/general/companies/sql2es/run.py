@@ -9,10 +9,9 @@ from nesta.core.luigihacks.elasticsearchplus import ElasticsearchPlus
 from nesta.core.orms.orm_utils import db_session, get_mysql_engine
 from nesta.core.orms.orm_utils import object_to_dict
 from nesta.core.orms.general_orm import CrunchbaseOrg
+from nesta.packages.misc_utils.batches import get_s3_batch
 
 from ast import literal_eval
-import boto3
-import json
 import logging
 import os
 
@@ -41,14 +40,13 @@ def run():
                            strans_kwargs={'filename': 'companies.json'})
 
     # Collect input file
-    s3 = boto3.resource('s3')
-    obj = s3.Object(bucket, batch_file)
-    org_ids = json.loads(obj.get()['Body']._raw_stream.read())
+    org_ids = get_s3_batch(bucket, batch_file,
+                           os.environ.get('BATCHPAR_batch_number'))
     org_ids = org_ids[:20 if test else None]
     logging.info(f"{len(org_ids)} organisations retrieved from s3")
 
     # Pipe orgs to ES
-    with db_session(engine) as session:
+    with db_session(engine) as session, es.profile_batch(bucket, batch_file):
         query = session.query(CrunchbaseOrg).filter(CrunchbaseOrg.id.in_(org_ids))
         for row in query.all():
             row = object_to_dict(row)
@@ -6,8 +6,6 @@ Transfer pre-collected GtR data from MySQL to Elasticsearch.
 """
 
 from ast import literal_eval
-import boto3
-import json
 import logging
 import os
 from datetime import datetime as dt
@@ -18,6 +16,7 @@ from nesta.core.orms.orm_utils import db_session, get_mysql_engine
 from nesta.core.orms.orm_utils import load_json_from_pathstub
 from nesta.core.orms.orm_utils import object_to_dict, get_class_by_tablename
 from nesta.core.orms.gtr_orm import Base, Projects, LinkTable, OrganisationLocation
+from nesta.packages.misc_utils.batches import get_s3_batch
 from collections import defaultdict, Counter
 
 
@@ -197,15 +196,14 @@ def run():
 
     # collect file
     logging.info('Retrieving project ids')
-    s3 = boto3.resource('s3')
-    obj = s3.Object(bucket, batch_file)
-    project_ids = json.loads(obj.get()['Body']._raw_stream.read())
+    project_ids = get_s3_batch(bucket, batch_file,
+                               os.environ.get('BATCHPAR_batch_number'))
     logging.info(f"{len(project_ids)} project IDs "
                  "retrieved from s3")
 
     #
     logging.info('Processing rows')
-    with db_session(engine) as session:
+    with db_session(engine) as session, es.profile_batch(bucket, batch_file):
         locations = get_org_locations(session)
         project_links = get_project_links(session, project_ids)
         for count, obj in enumerate((session.query(Projects)
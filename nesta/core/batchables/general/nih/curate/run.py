@@ -23,14 +23,13 @@ from nesta.core.orms.orm_utils import object_to_dict
 from nesta.core.orms.nih_orm import Projects, Abstracts
 from nesta.core.orms.nih_orm import TextDuplicate
 from nesta.core.orms.general_orm import NihProject, Base
+from nesta.packages.misc_utils.batches import get_s3_batch
 
 from ast import literal_eval
-import boto3
 from collections import defaultdict
 from datetime import datetime
 import dateutil.parser
 from itertools import groupby, chain
-import json
 import logging
 from operator import attrgetter
 import os
@@ -404,9 +403,8 @@ def run():
 
     # Retrieve list of core ids from s3
     nrows = 1000 if test else None
-    s3 = boto3.resource('s3')
-    obj = s3.Object(bucket, batch_file)
-    core_ids = json.loads(obj.get()['Body']._raw_stream.read())
+    core_ids = get_s3_batch(bucket, batch_file,
+                            os.environ.get('BATCHPAR_batch_number'))
     logging.info(f"{len(core_ids)} ids retrieved from s3")
 
     # Get the groups for this batch.
@@ -8,8 +8,6 @@ The patents are grouped by patent families.
 """
 
 from ast import literal_eval
-import boto3
-import json
 import logging
 import os
 
@@ -21,6 +19,7 @@ from nesta.core.orms.orm_utils import object_to_dict
 from nesta.core.orms.patstat_orm import ApplnFamilyAll
 from nesta.core.orms.patstat_2019_05_13 import *
 from nesta.packages.geo_utils.lookup import get_eu_countries
+from nesta.packages.misc_utils.batches import get_s3_batch
 
 
 def select_text(objs, lang_field, text_field):
@@ -155,16 +154,15 @@ def run():
     # Collect file
     logging.info('Retrieving patent family ids')
     nrows = 20 if test else None
-    s3 = boto3.resource('s3')
-    obj = s3.Object(bucket, batch_file)
-    docdb_fam_ids = json.loads(obj.get()['Body']._raw_stream.read())
+    docdb_fam_ids = get_s3_batch(bucket, batch_file,
+                                 os.environ.get('BATCHPAR_batch_number'))
     logging.info(f"{len(docdb_fam_ids)} patent family IDs "
                  "retrieved from s3")
 
     # Process rows
     logging.info('Processing rows')
     _filter = ApplnFamilyAll.docdb_family_id.in_(docdb_fam_ids)
-    with db_session(engine) as session:
+    with db_session(engine) as session, es.profile_batch(bucket, batch_file):
         for obj in session.query(ApplnFamilyAll).filter(_filter).all():
             row = object_to_dict(obj)
             row = reformat_row(row, _engine)
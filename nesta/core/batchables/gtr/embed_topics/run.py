@@ -20,6 +20,7 @@ from nesta.core.orms.orm_utils import db_session
 from nesta.packages.nlp_utils.text2vec import docs2vectors
 from nesta.core.orms.orm_utils import get_mysql_engine
 from nesta.core.luigihacks.s3 import parse_s3_path
+from nesta.packages.misc_utils.batches import get_s3_batch
 
 
 def run():
@@ -40,9 +41,8 @@ def run():
     logging.info(f"Using {db_name} database")
 
     # Get IDs from S3
-    s3 = boto3.resource('s3')
-    obj = s3.Object(bucket, batch_file)
-    ids = json.loads(obj.get()['Body']._raw_stream.read())
+    ids = get_s3_batch(bucket, batch_file,
+                       os.environ.get('BATCHPAR_batch_number'))
     logging.info(f"{len(ids)} article IDs retrieved from s3")
 
     # Connect to SQL
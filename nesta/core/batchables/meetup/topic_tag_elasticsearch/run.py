@@ -21,6 +21,7 @@ from nesta.core.orms.meetup_orm import Group
 from nesta.core.orms.geographic_orm import Geographic
 from nesta.packages.meetup.meetup_utils import get_members_by_percentile
 from nesta.core.orms.orm_utils import load_json_from_pathstub
+from nesta.packages.misc_utils.batches import get_s3_batch
 
 from bs4 import BeautifulSoup
 import json
@@ -60,8 +61,8 @@ def run():
     core_topics = set(json.loads(topics_obj.get()['Body']._raw_stream.read()))
 
     # Extract the group ids for this task
-    ids_obj = s3.Object(s3_bucket, batch_file)
-    group_ids = set(json.loads(ids_obj.get()['Body']._raw_stream.read()))
+    group_ids = set(get_s3_batch(s3_bucket, batch_file,
+                                 os.environ.get('BATCHPAR_batch_number')))
 
     # Extract the mesh terms for this task
     mesh_obj = s3.Object('innovation-mapping-general', 
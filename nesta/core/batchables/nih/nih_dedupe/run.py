@@ -13,10 +13,9 @@ articles, for the total and annuals funds.
 import logging
 from nesta.core.luigihacks.elasticsearchplus import ElasticsearchPlus
 from nesta.core.orms.orm_utils import load_json_from_pathstub
+from nesta.packages.misc_utils.batches import get_s3_batch
 
 from collections import Counter
-import json
-import boto3
 import os
 import numpy as np
 import time
@@ -56,9 +55,8 @@ def run():
     aws_auth_region = os.environ["BATCHPAR_aws_auth_region"]
 
     # Extract the article ids in this chunk
-    s3 = boto3.resource('s3')
-    ids_obj = s3.Object(s3_bucket, batch_file)
-    art_ids = json.loads(ids_obj.get()['Body']._raw_stream.read())
+    art_ids = get_s3_batch(s3_bucket, batch_file,
+                           os.environ.get('BATCHPAR_batch_number'))
     logging.info(f'Processing {len(art_ids)} article ids')
 
     field_null_mapping = load_json_from_pathstub("health-scanner", "nulls.json")
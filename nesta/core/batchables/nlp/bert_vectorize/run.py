@@ -6,8 +6,6 @@ Vectorize text documents via BERT
 """
 
 from ast import literal_eval
-import boto3
-import json
 import logging
 import os
 
@@ -15,6 +13,7 @@ from nesta.core.orms.orm_utils import db_session, get_mysql_engine
 from nesta.core.orms.orm_utils import insert_data, object_to_dict
 from nesta.core.orms.orm_utils import get_class_by_tablename
 from nesta.core.orms.orm_utils import get_base_from_orm_name
+from nesta.packages.misc_utils.batches import get_s3_batch
 
 from sentence_transformers import SentenceTransformer
 
@@ -41,9 +40,8 @@ def run():
 
     # Retrieve list of object ids from S3
     nrows = 20 if test else None
-    s3 = boto3.resource('s3')
-    obj = s3.Object(bucket, batch_file)
-    _ids = json.loads(obj.get()['Body']._raw_stream.read())
+    _ids = get_s3_batch(bucket, batch_file,
+                        os.environ.get('BATCHPAR_batch_number'))
     logging.info(f"{len(_ids)} objects retrieved from s3")
 
     # Retrieve each document by id
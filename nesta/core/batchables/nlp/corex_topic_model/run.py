@@ -17,6 +17,34 @@ from ast import literal_eval
 
 WEIGHT_THRESHOLD = 1e-2
 
+
+def topic_weights(X, topics):
+    """Calculate topic weights for each document as
+    sum(count(term in doc)*{term_weight}), for all documents at once, via
+    the product of the document-term matrix and a term-topic weight matrix.
+
+    Args:
+        X (scipy.sparse.csr_matrix): Document-term matrix.
+        topics (list): Topics as returned by :obj:`Corex.get_topics`, i.e.
+                       lists of (term index, weight, [sign]) tuples.
+    Returns:
+        rows (list): {topic_{i}: weight} for each document.
+    """
+    term_idxs, topic_idxs, weights = [], [], []
+    for itop, topic in enumerate(topics):
+        for term in topic:
+            idx, weight = term[:2]
+            term_idxs.append(idx)
+            topic_idxs.append(itop)
+            weights.append(weight)
+    _, n_terms = X.shape
+    W = csr_matrix((weights, (term_idxs, topic_idxs)),
+                   shape=(n_terms, len(topics)))
+    scores = (X @ W).toarray()
+    return [{f'topic_{itop}': float(score) for itop, score in enumerate(row)}
+            for row in scores]
+
+
 def run():
     s3_path_in = os.environ['BATCHPAR_s3_path_in']
     n_hidden = int(literal_eval(os.environ['BATCHPAR_n_hidden']))
@@ -50,15 +78,11 @@ def run():
     topics = topic_model.get_topics()
 
     # Generate topic names
-    topic_names = {f'topic_{itop}': [_vocab[idx]
-                                     for idx, weight in topic]
+    topic_names = {f'topic_{itop}': [_vocab[term[0]] for term in topic]
                    for itop, topic in enumerate(topics)}
 
     # Calculate topic weights as sum(bool(term in doc)*{term_weight})
-    rows = [{f'topic_{itop}': sum(row.getcol(idx).toarray()[0][0]*weight
-                                  for idx, weight in topic)
-             for itop, topic in enumerate(topics)}
-            for row in X]
+    rows = topic_weights(X, topics)
     # Zip the row indexes back in, and ignore small weights
     rows = [dict(id=id, **{k: v for k, v in row.items()
                            if v > WEIGHT_THRESHOLD})
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix
+
+from nesta.core.batchables.nlp.corex_topic_model.run import topic_weights
+
+
+@pytest.fixture
+def X():
+    rng = np.random.RandomState(42)
+    counts = rng.randint(0, 3, size=(20, 15)) * (rng.uniform(size=(20, 15)) > 0.6)
+    return csr_matrix(counts, dtype=int)
+
+
+@pytest.fixture
+def topics():
+    rng = np.random.RandomState(42)
+    return [[(idx, rng.uniform()) for idx in rng.choice(15, 5, replace=False)]
+            for _ in range(4)]
+
+
+def test_topic_weights(X, topics):
+    rows = topic_weights(X, topics)
+    assert len(rows) == 20
+    # Compare to the weights calculated term by term
+    for row, _row in zip(X, rows):
+        assert list(_row.keys()) == [f'topic_{i}' for i in range(4)]
+        for itop, topic in enumerate(topics):
+            expected = sum(row.getcol(idx).toarray()[0][0]*weight
+                           for idx, weight in topic)
+            assert _row[f'topic_{itop}'] == pytest.approx(expected)
+
+
+def test_topic_weights_with_signs(X, topics):
+    signed_topics = [[(idx, weight, -1.0) for idx, weight in topic]
+                     for topic in topics]
+    assert topic_weights(X, signed_topics) == topic_weights(X, topics)
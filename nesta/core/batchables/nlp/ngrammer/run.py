@@ -25,15 +25,24 @@ def run():
     s3_obj_in = s3.Object(*parse_s3_path(s3_path_in))
     data = json.load(s3_obj_in.get()['Body'])
 
+    # The n-grams are read once per routine and then shared between jobs,
+    # via a snapshot alongside the routine's outputs (unless specified)
+    snapshot_path = os.environ.get("BATCHPAR_ngram_snapshot")
+    if snapshot_path is None and "BATCHPAR_outinfo" in os.environ:
+        s3_prefix = os.path.dirname(os.environ["BATCHPAR_outinfo"])
+        snapshot_path = f"{s3_prefix}/ngram_snapshot.txt"
+
     # Extract ngrams
     ngrammer = Ngrammer(config_filepath="mysqldb.config",
-                        database="production")
-    processed = []
-    for i, row in enumerate(data[first_index: last_index]):
-        new_row = {k: ngrammer.process_document(v)
-                   if type(v) is str and len(v) > 50 else v
-                   for k, v in row.items()}
-        processed.append(new_row)
+                        database="production",
+                        snapshot_path=snapshot_path)
+    processed = [dict(row) for row in data[first_index: last_index]]
+    fields = [(row, k) for row in processed for k, v in row.items()
+              if type(v) is str and len(v) > 50]
+    texts = (row[k] for row, k in fields)
+    for (row, k), processed_doc in zip(fields,
+                                       ngrammer.process_corpus(texts)):
+        row[k] = processed_doc
 
     # Mark the task as done and save the data
     if "BATCHPAR_outinfo" in os.environ:
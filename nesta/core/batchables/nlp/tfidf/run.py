@@ -16,25 +16,46 @@ import numpy as np
 import json
 
 
-def chunker(_transformed, n_chunks):
-    """Yield chunks from a numpy array.
-    
+def tfidf_cuts(_transformed, lower_tfidf_percentile,
+               upper_tfidf_percentile):
+    """Calculate the lower and upper bounds of TFIDF values
+    from percentiles of the non-zero values, which are read
+    directly from the sparse matrix.
+
     Args:
-        _transformed (np.array): Array to split into chunks.
-        n_chunks (int): Number of chunks to split the array into.
-    Yields:
-        chunk (np.array)
+        _transformed (scipy.sparse.csr_matrix): TFIDF matrix.
+        lower_tfidf_percentile (int): Percentile of the lower bound.
+        upper_tfidf_percentile (int): Percentile of the upper bound.
+    Returns:
+        lower_cut, upper_cut (float, float): The bounds.
     """
-    n_rows, _ = _transformed.shape
-    chunk_size = round(n_rows / n_chunks)
-    remaining = n_rows % chunk_size
+    tfidf_values = _transformed.data[_transformed.data > 0]
+    lower_cut = np.percentile(tfidf_values, lower_tfidf_percentile)
+    upper_cut = np.percentile(tfidf_values, upper_tfidf_percentile)
+    return lower_cut, upper_cut
 
-    for i in range(0, n_chunks):
-        chunk = _transformed[i*chunk_size: (i+1)*chunk_size].toarray()
-        for row in chunk:
-            yield row
-    for row in _transformed[n_rows-remaining:].toarray():
-        yield row
+
+def allowed_terms(_transformed, lookup, lower_cut, upper_cut):
+    """Yield the set of terms with TFIDF values between the bounds
+    for each document, directly from the sparse matrix
+    (i.e. without converting any rows to dense arrays).
+
+    Args:
+        _transformed (scipy.sparse.csr_matrix): TFIDF matrix.
+        lookup (dict): Reverse lookup of indexes to terms.
+        lower_cut (float): Lower bound (exclusive) of TFIDF values.
+        upper_cut (float): Upper bound (exclusive) of TFIDF values.
+    Yields:
+        good_words_doc (set): Allowed terms for each document.
+    """
+    _transformed = _transformed.tocsr()
+    terms = np.empty(len(lookup), dtype=object)
+    for idx, term in lookup.items():
+        terms[idx] = term
+    keep = (_transformed.data > lower_cut) & (_transformed.data < upper_cut)
+    indptr, indices = _transformed.indptr, _transformed.indices
+    for start, end in zip(indptr[:-1], indptr[1:]):
+        yield set(terms[indices[start:end][keep[start:end]]])
 
 
 def run():
@@ -70,17 +91,12 @@ def run():
     lookup = {idx: term for term, idx in tvec.vocabulary_.items()}
 
     # Calculate the lower and upper bounds from the percentiles
-    tfidf_values = _transformed[_transformed > 0]
-    lower_cut = np.percentile(tfidf_values, lower_tfidf_percentile)
-    upper_cut = np.percentile(tfidf_values, upper_tfidf_percentile)
-    del tfidf_values
+    lower_cut, upper_cut = tfidf_cuts(_transformed, lower_tfidf_percentile,
+                                      upper_tfidf_percentile)
 
     # Generate the list of allowed terms for each document
-    good_words_corpus = []
-    for row in chunker(_transformed, 100):
-        good_words_doc = set(lookup[idx] for idx, value in enumerate(row)
-                             if (value > lower_cut) and (value < upper_cut))
-        good_words_corpus.append(good_words_doc)
+    good_words_corpus = allowed_terms(_transformed, lookup,
+                                      lower_cut, upper_cut)
 
     # Finally, filter the input data
     outdata = []
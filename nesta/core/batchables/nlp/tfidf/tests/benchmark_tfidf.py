@@ -0,0 +1,85 @@
+"""
+benchmark_tfidf
+===============
+
+Peak RSS (i.e. memory) of the TFIDF cut against vocabulary size,
+applying the cut directly to the sparse matrix (:obj:`tfidf_cuts` and
+:obj:`allowed_terms`) compared to the original method
+(a boolean mask for the percentiles, and densifying the matrix in 100
+chunks for the allowed terms). Each measurement is made in a fresh
+process, on a synthetic TFIDF matrix. Run with:
+
+    python nesta/core/batchables/nlp/tfidf/tests/benchmark_tfidf.py
+"""
+
+from multiprocessing import get_context
+import resource
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from nesta.core.batchables.nlp.tfidf.run import tfidf_cuts
+from nesta.core.batchables.nlp.tfidf.run import allowed_terms
+
+
+def synthetic_tfidf(n_docs, vocab_size, terms_per_doc=150, seed=42):
+    rng = np.random.RandomState(seed)
+    nnz = n_docs * terms_per_doc
+    indptr = np.arange(0, nnz + 1, terms_per_doc)
+    indices = rng.randint(0, vocab_size, size=nnz)
+    _transformed = csr_matrix((rng.uniform(size=nnz), indices, indptr),
+                              shape=(n_docs, vocab_size))
+    _transformed.sum_duplicates()
+    return _transformed
+
+
+def sparse_cut(_transformed, lookup):
+    lower_cut, upper_cut = tfidf_cuts(_transformed, 5, 90)
+    return list(allowed_terms(_transformed, lookup, lower_cut, upper_cut))
+
+
+def dense_cut(_transformed, lookup):
+    tfidf_values = np.asarray(_transformed[_transformed > 0])
+    lower_cut = np.percentile(tfidf_values, 5)
+    upper_cut = np.percentile(tfidf_values, 90)
+    del tfidf_values
+    n_rows, _ = _transformed.shape
+    chunk_size = round(n_rows / 100)
+    good_words_corpus = []
+    for i in range(0, 100):
+        chunk = _transformed[i*chunk_size: (i+1)*chunk_size].toarray()
+        for row in chunk:
+            good_words_corpus.append(set(lookup[idx] for idx, value
+                                         in enumerate(row)
+                                         if lower_cut < value < upper_cut))
+    return good_words_corpus
+
+
+def peak_rss_mb(method, n_docs, vocab_size):
+    """Peak RSS (MB) of this process, after generating the data
+    (the baseline) and after applying the method"""
+    _transformed = synthetic_tfidf(n_docs, vocab_size)
+    lookup = {idx: f"term{idx}" for idx in range(vocab_size)}
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    method(_transformed, lookup)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return baseline, peak
+
+
+def measure(method, n_docs, vocab_size):
+    # Spawn, rather than fork, to measure each method in a fresh process
+    with get_context('spawn').Pool(1) as pool:
+        return pool.apply(peak_rss_mb, (method, n_docs, vocab_size))
+
+
+def run(n_docs=20000, vocab_sizes=(10000, 50000, 200000)):
+    for vocab_size in vocab_sizes:
+        for method in (sparse_cut, dense_cut):
+            baseline, peak = measure(method, n_docs, vocab_size)
+            print(f"vocab {vocab_size:>7}, {method.__name__}: peak RSS "
+                  f"{peak:,.0f} MB ({peak - baseline:+,.0f} MB over the "
+                  "input data)")
+
+
+if __name__ == "__main__":
+    run()
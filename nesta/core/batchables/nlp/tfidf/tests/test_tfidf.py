@@ -0,0 +1,76 @@
+import os
+import numpy as np
+import pytest
+from unittest import mock
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from nesta.core.batchables.nlp.tfidf.run import tfidf_cuts
+from nesta.core.batchables.nlp.tfidf.run import allowed_terms
+from nesta.core.batchables.nlp.tfidf.run import run
+
+PATH = 'nesta.core.batchables.nlp.tfidf.run.{}'
+
+
+@pytest.fixture
+def data():
+    return [{'id': 1, 'title': [['machine', 'learning'], ['deep', 'learning']],
+             'body': [['neural_networks', 'are', 'deep', 'learning', 'models']]},
+            {'id': 2, 'title': [['bed_and_breakfast', 'in', 'london']],
+             'body': [['london', 'is', 'big'], ['breakfast', 'is', 'good']]},
+            {'id': 3, 'title': [['machine', 'learning', 'in', 'london']],
+             'body': [['models', 'of', 'london', 'breakfast']]}]
+
+
+@pytest.fixture
+def transformed(data):
+    corpus = [" ".join(" ".join(item) for k, v in row.items()
+                       if type(v) is list for item in v)
+              for row in data]
+    tvec = TfidfVectorizer()
+    _transformed = tvec.fit_transform(corpus)
+    lookup = {idx: term for term, idx in tvec.vocabulary_.items()}
+    return _transformed, lookup
+
+
+def test_tfidf_cuts(transformed):
+    _transformed, _ = transformed
+    dense = _transformed.toarray()
+    lower_cut, upper_cut = tfidf_cuts(_transformed, 10, 90)
+    assert lower_cut == np.percentile(dense[dense > 0], 10)
+    assert upper_cut == np.percentile(dense[dense > 0], 90)
+
+
+def test_allowed_terms(transformed):
+    _transformed, lookup = transformed
+    lower_cut, upper_cut = tfidf_cuts(_transformed, 10, 90)
+    # Compare to the dense calculation
+    expected = [set(lookup[idx] for idx, value in enumerate(row)
+                    if (value > lower_cut) and (value < upper_cut))
+                for row in _transformed.toarray()]
+    found = list(allowed_terms(_transformed, lookup, lower_cut, upper_cut))
+    assert found == expected
+    assert len(found) == 3
+    assert all(len(terms) > 0 for terms in found)
+
+
+@mock.patch.dict(os.environ, {'BATCHPAR_s3_path_in': 's3://bucket/in.json',
+                              'BATCHPAR_outinfo': '',
+                              'BATCHPAR_first_index': '0',
+                              'BATCHPAR_last_index': '3',
+                              'BATCHPAR_lower_tfidf_percentile': '10',
+                              'BATCHPAR_upper_tfidf_percentile': '90'})
+@mock.patch(PATH.format('boto3'))
+def test_run(mocked_boto3, data):
+    mocked_boto3.resource().Object().get.return_value = {'Body': mock.Mock()}
+    with mock.patch(PATH.format('json.load'), return_value=data):
+        outdata = run()
+    assert [row['id'] for row in outdata] == [1, 2, 3]
+    for row, new_row in zip(data, outdata):
+        for k, v in row.items():
+            if type(v) is not list:
+                assert new_row[k] == v
+                continue
+            # Sentences are retained, but with some terms removed
+            assert len(new_row[k]) == len(v)
+            for sentence, new_sentence in zip(v, new_row[k]):
+                assert set(new_sentence.split()) <= set(sentence)
@@ -10,10 +10,9 @@ document "lolvelty" can't be known a priori.
 
 from nesta.core.luigihacks.elasticsearchplus import ElasticsearchPlus
 from nesta.packages.novelty.lolvelty import lolvelty
+from nesta.packages.misc_utils.batches import get_s3_batch
 from ast import literal_eval
 import os
-import boto3
-import json
 import logging
 
 def run():
@@ -32,10 +31,9 @@ def run():
     test = literal_eval(os.environ["BATCHPAR_test"])
 
     # Extract all document ids in this chunk
-    s3 = boto3.resource('s3')
-    ids_obj = s3.Object(s3_bucket, batch_file)
     logging.info(f'Getting document ids...')
-    all_doc_ids = json.loads(ids_obj.get()['Body']._raw_stream.read())
+    all_doc_ids = get_s3_batch(s3_bucket, batch_file,
+                               os.environ.get('BATCHPAR_batch_number'))
     logging.info(f'Got {len(all_doc_ids)} document ids')
     
     # Set up Elasticsearch
@@ -47,21 +45,21 @@ def run():
                            do_sort=False)
 
     min_match = 0.3 if not test else 0.05
+    scores = {}
     for doc_id in all_doc_ids:
         # Check whether the doc exists with the correct fields
-        existing = es.get(es_index, doc_type=es_type,
-                          id=doc_id)['_source']
+        existing = es.get(es_index, doc_type=es_type, id=doc_id,
+                          _source=list(fields)).get('_source', {})
         # Get the score
         score = None
         if any(f in existing for f in fields):
             score = lolvelty(es, es_index, doc_id,
                              fields, total=count,
                              minimum_should_match=min_match)
-        # Merge existing info into new doc
-        doc = {**existing}
-        doc[score_field] = score
-        es.index(index=es_index, doc_type=es_type,
-                 id=doc_id, body=doc)
+        scores[doc_id] = {score_field: score}
+    # Write only the score field back to the existing docs
+    es.update_fields_bulk(index=es_index, doc_type=es_type, docs=scores)
+    logging.info(f'Updated {len(scores)} documents')
 
 if __name__ == "__main__":
 
@@ -5,6 +5,7 @@ of AWS batch tasks; as a single Luigi Task.
 from abc import ABC
 from abc import abstractmethod
 from collections import defaultdict
+from itertools import islice
 from nesta.core.luigihacks import batchclient
 from subprocess import check_output
 from subprocess import CalledProcessError
@@ -38,6 +39,19 @@ def command_line(command, verbose=False):
     return out_lines[-2]
 
 
+class _Recorder:
+    '''Iterate over the job parameters, recording each one as it is
+    consumed, so that they can be passed to :code:`combine`.'''
+    def __init__(self, iterable):
+        self.iterable = iterable
+        self.seen = []
+
+    def __iter__(self):
+        for item in self.iterable:
+            self.seen.append(item)
+            yield item
+
+
 class AutoBatchTask(luigi.Task, ABC):
     '''A base class for automatically preparing and submitting AWS batch tasks.
 
@@ -113,12 +127,17 @@ class AutoBatchTask(luigi.Task, ABC):
         pid = os.getpid()
         self.TIMEOUT = time.time() + int(_config["timeout"])
 
-        # Generate the parameters for batches
+        # Generate the parameters for batches. Note that prepare may
+        # return a generator, in which case batches are prepared lazily,
+        # as jobs are submitted
         job_params = self.prepare()
         if self.test:
-            if len(job_params) > 2:
+            if isinstance(job_params, list):
                 job_params = job_params[0:2]
-                logging.info(f"Test mode ({pid}): running {len(job_params)} jobs")
+            else:
+                job_params = islice(job_params, 2)
+            logging.info(f"Test mode ({pid}): running up to 2 jobs")
+        recorder = _Recorder(job_params)
 
         # Prepare the environment for batching
         env_files = " ".join(self.env_files)
@@ -134,15 +153,18 @@ class AutoBatchTask(luigi.Task, ABC):
             raise batchclient.BatchJobException("Invalid input "
                                                 "or environment files")
         # Execute batch jobs
-        self.execute(job_params, s3file_timestamp)
+        self.execute(recorder, s3file_timestamp)
         # Combine the outputs
+        if not isinstance(job_params, list):
+            job_params = recorder.seen
         self.combine(job_params)
 
     @abstractmethod
     def prepare(self):
         '''You should implement a method which returns a :code:`list`
-        of :code:`dict`, where each :code:`dict` corresponds to inputs
-        to the batchable. Each row of the output must at least
+        (or generator) of :code:`dict`, where each :code:`dict` corresponds
+        to inputs to the batchable. If a generator is returned, jobs are
+        submitted as soon as their parameters are yielded. Each row of the output must at least
         contain the following keys:
 
         - **done** (`bool`): indicating whether the job has already been
@@ -210,7 +232,21 @@ class AutoBatchTask(luigi.Task, ABC):
         if self.test:
             logging.info(f"Test mode ({pid}): Ready to batch")
         
-        all_job_kwargs = []
+        all_job_kwargs = self._job_kwargs(job_params, env_variables)
+
+        # Wait for jobs to finish
+        self._run_batch_jobs(batch_client, all_job_kwargs)
+
+    def _job_kwargs(self, job_params, env_variables):
+        '''Lazily generate the AWS batch job kwargs from the job parameters.
+
+        Parameters:
+            job_params (iterable of :obj:`dict`): The batchable job parameters.
+            env_variables (:obj:`list` of :obj:`dict`): Environmental
+                          variables to send to every job.
+        Yields:
+            job_kwargs (:obj:`dict`): kwargs for :obj:`BatchClient.submit_job`.
+        '''
         for i, params in enumerate(job_params):
             if params["done"]:
                 continue
@@ -225,56 +261,51 @@ class AutoBatchTask(luigi.Task, ABC):
             # Add the environmental variables to the container overrides
             overrides = dict(environment=_env_variables,
                              memory=self.memory, vcpus=self.vcpus)
-            job_kwargs = dict(jobDefinition=self.job_def,
-                              jobName=self.job_name,
-                              jobQueue=self.job_queue,
-                              timeout=dict(attemptDurationSeconds=self.timeout),
-                              containerOverrides=overrides)
-            all_job_kwargs.append(job_kwargs)
-
-        # Wait for jobs to finish
-        self._run_batch_jobs(batch_client, all_job_kwargs)
+            yield dict(jobDefinition=self.job_def,
+                       jobName=self.job_name,
+                       jobQueue=self.job_queue,
+                       timeout=dict(attemptDurationSeconds=self.timeout),
+                       containerOverrides=overrides)
 
     def _run_batch_jobs(self, batch_client, all_job_kwargs):
         '''Monitor AWS batch jobs until finished or failed.
 
         Parameters:
             batch_client (:obj:`BatchClient`)
-            job_ids (:obj:`list` of :obj:`str`): List of AWS batch
-                    job IDs to monitor.
+            all_job_kwargs (iterable of :obj:`dict`): kwargs of each AWS
+                           batch job, which are consumed (and submitted)
+                           no faster than `self.max_live_jobs` allows.
         '''
 
         # Keep submitting until all submitted
         all_job_ids = set()
         done_job_ids = set()
-        submitted_job_idxs = set()
-        logging.info(f"{os.getpid()}: "
-                     "{} jobs to run".format(len(all_job_kwargs)))
-        while len(all_job_kwargs) > len(all_job_ids):
+        all_job_kwargs = iter(all_job_kwargs)
+        all_submitted = False
+        while not all_submitted:
             # Get the number of live jobs
             running_job_ids = all_job_ids - done_job_ids
             n_live = len(running_job_ids)
             n_done = len(done_job_ids)
-            n_left = len(all_job_kwargs) - n_done - n_live
             logging.info(f"{os.getpid()}: "
                          "{} jobs are live, "
-                         "{} are finished, "
-                         "and {} are yet to be submitted".format(n_live, n_done, n_left))
-                                                 
+                         "{} are finished".format(n_live, n_done))
+
             if n_live > 1:
                 self._assert_timeout(batch_client, running_job_ids)
                 self._assert_success(batch_client, all_job_ids, done_job_ids)
             # Submit some jobs until `self.max_live_jobs` reached
-            for ijob, job_kwargs in enumerate(all_job_kwargs):
-                if n_live >= self.max_live_jobs:
+            while n_live < self.max_live_jobs:
+                job_kwargs = next(all_job_kwargs, None)
+                if job_kwargs is None:
+                    all_submitted = True
                     break
-                if ijob in submitted_job_idxs:
-                    continue
                 # Submit a new job
                 id_ = batch_client.submit_job(**job_kwargs)
                 all_job_ids.add(id_)
-                submitted_job_idxs.add(ijob)
                 n_live += 1
+            if all_submitted:
+                break
             # Wait before continuing
             logging.info(f"{os.getpid()}: Not done submitting...")
             time.sleep(self.poll_time)
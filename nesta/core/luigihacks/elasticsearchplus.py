@@ -5,8 +5,10 @@ from collections import defaultdict
 from collections import OrderedDict
 from elasticsearch import Elasticsearch
 from elasticsearch import RequestsHttpConnection
+from elasticsearch.helpers import bulk
 from retrying import retry
 from functools import reduce
+from functools import partial
 import numpy as np
 import pandas as pd
 import re
@@ -16,8 +18,13 @@ import boto3
 from requests_aws4auth import AWS4Auth
 import time
 import os
+import json
+import logging
 from functools import lru_cache
+from contextlib import contextmanager
+from ast import literal_eval
 
+from nesta.core.luigihacks.s3 import parse_s3_path
 from nesta.packages.nlp_utils.ngrammer import Ngrammer
 from nesta.packages.decorators.schema_transform import schema_transformer
 from nesta.packages.decorators.ratelimit import ratelimit
@@ -496,6 +503,106 @@ def _null_mapping(row, field_null_mapping):
     return _row
 
 
+def _transform_name(transform):
+    """The name of the function underlying a transform."""
+    if isinstance(transform, partial):
+        transform = transform.func
+    return getattr(transform, '__name__', repr(transform))
+
+
+def _size_bucket(size):
+    """Upper bound of the power-of-two bucket containing this size."""
+    return 1 << max(size - 1, 0).bit_length()
+
+
+class TransformProfiler:
+    """Records the wall time and number of calls of each transform
+    in the transformation chain, as well as a histogram of
+    (JSON-serialised) document sizes, with the total time spent
+    transforming documents of each size.
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.n_docs = 0
+        self.seconds = Counter()
+        self.calls = Counter()
+        self.size_docs = Counter()
+        self.size_seconds = Counter()
+
+    def chain_transforms(self, transforms, row):
+        """Apply all transforms sequentially to a given row of data,
+        timing each transform.
+
+        Args:
+            transforms (list): Transforms (functions of a row) to apply.
+            row (dict): Row of data to evaluate.
+        Returns:
+            _row (dict): Modified row.
+        """
+        bucket = _size_bucket(len(json.dumps(row, default=str)))
+        total = 0
+        for transform in transforms:
+            start = time.perf_counter()
+            row = transform(row)
+            seconds = time.perf_counter() - start
+            name = _transform_name(transform)
+            self.seconds[name] += seconds
+            self.calls[name] += 1
+            total += seconds
+        self.n_docs += 1
+        self.size_docs[bucket] += 1
+        self.size_seconds[bucket] += total
+        return row
+
+    def summary(self):
+        """Summarise the profile, with transforms ordered by total time.
+
+        Returns:
+            summary (dict): Profiling summary.
+        """
+        total = sum(self.seconds.values())
+        transforms = [{"name": name, "calls": self.calls[name],
+                       "total_seconds": seconds,
+                       "mean_ms": 1000 * seconds / self.calls[name],
+                       "fraction": seconds / total if total > 0 else 0}
+                      for name, seconds in self.seconds.most_common()]
+        doc_sizes = [{"max_bytes": bucket, "docs": self.size_docs[bucket],
+                      "total_seconds": self.size_seconds[bucket]}
+                     for bucket in sorted(self.size_docs)]
+        return {"n_docs": self.n_docs, "total_seconds": total,
+                "transforms": transforms, "doc_sizes": doc_sizes}
+
+    def report(self, path=None):
+        """Log the summary, optionally save it as JSON, and then reset
+        the profile (e.g. at the end of each batch).
+
+        Args:
+            path (str): Optional local or S3 (s3://bucket/key) path
+                        to save the summary to.
+        Returns:
+            summary (dict): Profiling summary.
+        """
+        summary = self.summary()
+        logging.info(f"Transformed {summary['n_docs']} documents in "
+                     f"{summary['total_seconds']:.2f}s")
+        for t in summary["transforms"]:
+            logging.info(f"{t['name']}: {t['total_seconds']:.3f}s "
+                         f"({100 * t['fraction']:.1f}%) over {t['calls']} "
+                         f"calls, {t['mean_ms']:.3f}ms per call")
+        if path is not None:
+            body = json.dumps(summary, indent=4)
+            if path.startswith("s3://"):
+                s3 = boto3.resource('s3')
+                s3.Object(*parse_s3_path(path)).put(Body=body)
+            else:
+                with open(path, "w") as f:
+                    f.write(body)
+        self.reset()
+        return summary
+
+
 class ElasticsearchPlus(Elasticsearch):
     """Wrapper around the Elasticsearch API, which applies
     transformations (including schema mapping) to input data
@@ -519,6 +626,8 @@ class ElasticsearchPlus(Elasticsearch):
         remove_padding (bool): Remove all whitespace padding?
         auto_translate (bool): Convert large text fields to English?
         do_sort (bool): Sort all lists?
+        profile (bool): Record the wall time of each transform, which can be
+                        summarised with :obj:`report_profile`?
         {args, kwargs}: (kw)args for the core :obj:`Elasticsearch` API.
     """
     def __init__(self, entity_type,
@@ -537,6 +646,7 @@ class ElasticsearchPlus(Elasticsearch):
                  do_sort=True,
                  auto_translate_kwargs={},
                  ngram_fields=[],
+                 profile=False,
                  *args, **kwargs):
 
         self.no_commit = no_commit
@@ -554,10 +664,10 @@ class ElasticsearchPlus(Elasticsearch):
         # Apply the schema mapping
         self.transforms = []
         if strans_kwargs is not None:
-            self.transforms.append(lambda row: schema_transformer(row,
-                                                                  **strans_kwargs))
-        self.transforms.append(lambda row: _add_entity_type(row,
-                                                            entity_type))
+            self.transforms.append(partial(schema_transformer,
+                                           **strans_kwargs))
+        self.transforms.append(partial(_add_entity_type,
+                                       entity_type=entity_type))
 
         # Convert values to null as required
         if null_empty_str:
@@ -565,8 +675,8 @@ class ElasticsearchPlus(Elasticsearch):
 
         # Convert other values to null as specified
         if len(field_null_mapping) > 0:
-            self.transforms.append(lambda row: _null_mapping(row,
-                                                             field_null_mapping))
+            self.transforms.append(partial(_null_mapping,
+                                           field_null_mapping=field_null_mapping))
 
         # Convert coordinates to floats
         if coordinates_as_floats:
@@ -574,11 +684,12 @@ class ElasticsearchPlus(Elasticsearch):
 
         # Detect countries in text fields
         if country_detection:
-            self.transforms.append(lambda row: _country_detection(row))
+            self.transforms.append(_country_detection)
 
         # Convert items which SHOULD be lists to lists
         if listify_terms:
-            self.transforms.append(lambda row: _listify_terms(row, terms_delimiters))
+            self.transforms.append(partial(_listify_terms,
+                                           delimiters=terms_delimiters))
 
         # Convert upper case text to camel case
         if caps_to_camel_case:
@@ -590,9 +701,9 @@ class ElasticsearchPlus(Elasticsearch):
             urls = list(f"translate.google.{ext}"
                         for ext in ('com', 'co.uk', 'co.kr', 'at',
                                     'ru', 'fr', 'de', 'ch', 'es'))
-            self.transforms.append(lambda row: _auto_translate(row, translator=None,
-                                                               service_urls=urls,
-                                                               **auto_translate_kwargs))
+            self.transforms.append(partial(_auto_translate, translator=None,
+                                           service_urls=urls,
+                                           **auto_translate_kwargs))
 
         # Extract any ngrams and split into tokens
         if len(ngram_fields) > 0:
@@ -600,15 +711,19 @@ class ElasticsearchPlus(Elasticsearch):
             if 'MYSQLDBCONF' not in os.environ:                
                 os.environ['MYSQLDBCONF'] = 'mysqldb.config'
             ngrammer = Ngrammer(database="production") 
-            self.transforms.append(lambda row: _ngram_and_tokenize(row, ngrammer,
-                                                                   ngram_fields))
+            self.transforms.append(partial(_ngram_and_tokenize,
+                                           ngrammer=ngrammer,
+                                           ngram_fields=ngram_fields))
 
         # Clean up lists (dedup, remove None, empty lists are None)
         self.transforms.append(_sanitize_html)
         self.transforms.append(_clean_bad_unicode_conversion)
-        self.transforms.append(lambda row: _clean_up_lists(row, do_sort))
+        self.transforms.append(partial(_clean_up_lists, do_sort=do_sort))
         self.transforms.append(_remove_padding)
-        self.transforms.append(lambda row: _nullify_pairs(row, null_pairs))
+        self.transforms.append(partial(_nullify_pairs, null_pairs=null_pairs))
+
+        # Optionally record the time spent in each transform
+        self.profiler = TransformProfiler() if profile else None
         super().__init__(*args, **kwargs)
 
     def chain_transforms(self, row):
@@ -619,8 +734,45 @@ class ElasticsearchPlus(Elasticsearch):
         Returns:
             _row (dict): Modified row.
         """
+        if self.profiler is not None:
+            return self.profiler.chain_transforms(self.transforms, row)
         return reduce(lambda _row, f: f(_row), self.transforms, row)
 
+    def report_profile(self, path=None):
+        """Log (and optionally save) a summary of the time spent in each
+        transform since the last report, see :obj:`TransformProfiler.report`.
+
+        Args:
+            path (str): Optional local or S3 (s3://bucket/key) path
+                        to save the summary to, as JSON.
+        Returns:
+            summary (dict): The profiling summary.
+        """
+        if self.profiler is None:
+            raise ValueError("Profiling is not enabled. Instantiate "
+                             "ElasticsearchPlus with profile=True")
+        return self.profiler.report(path)
+
+    @contextmanager
+    def profile_batch(self, bucket, batch_file):
+        """Profile the transforms applied within this context if the batch
+        parameter `profile_es` is set, and save the summary to
+        s3://{bucket}/{batch_file}-{batch_number}-es_profile.json on exit.
+
+        Args:
+            bucket (str): S3 bucket of the batch file.
+            batch_file (str): S3 key of the batch file.
+        """
+        profile = literal_eval(os.environ.get("BATCHPAR_profile_es", "False"))
+        if profile and self.profiler is None:
+            self.profiler = TransformProfiler()
+        yield self
+        # Summarise the time spent in each ES transform
+        if profile:
+            batch_number = os.environ.get("BATCHPAR_batch_number", 0)
+            self.report_profile(f"s3://{bucket}/{batch_file}-{batch_number}"
+                                "-es_profile.json")
+
     def index(self, **kwargs):
         """Same as the core :obj:`Elasticsearch` API, except applies the
         transformation chain before indexing. Note: only keyword arguments
@@ -643,6 +795,36 @@ class ElasticsearchPlus(Elasticsearch):
             super().index(body=body, **kwargs)
         return body
 
+    def update_fields_bulk(self, index, docs, doc_type='_doc',
+                           transforms=None, chunk_size=500):
+        """Update a subset of fields of existing documents, via
+        `_bulk` `update` actions with partial `doc` payloads. Unlike
+        :obj:`index`, the full transformation chain is not applied
+        (since the schema transformation, for example, would not make sense
+        for a partial document) and so only the given transforms are applied.
+
+        Args:
+            index (str): Elasticsearch index to update.
+            docs (dict): Lookup of document id to partial document.
+            doc_type (str): Document type to supply to ES.
+            transforms (list): Subset of transforms (functions of a row) to
+                               apply to each partial document.
+            chunk_size (int): Number of updates per bulk request.
+        Returns:
+            bodies (dict): The transformed partial documents, as passed
+                           to Elasticsearch.
+        """
+        if transforms is None:
+            transforms = []
+        bodies = {_id: reduce(lambda _row, f: f(_row), transforms, doc)
+                  for _id, doc in docs.items()}
+        actions = ({'_op_type': 'update', '_index': index,
+                    '_type': doc_type, '_id': _id, 'doc': body}
+                   for _id, body in bodies.items())
+        if not self.no_commit:
+            bulk(self, actions, chunk_size=chunk_size)
+        return bodies
+
     def near_duplicates(self, index, doc_id,
                         fields,
                         doc_type,
@@ -1,7 +1,7 @@
 from nesta.core.luigihacks.mysqldb import MySqlTarget
 from nesta.core.luigihacks.autobatch import AutoBatchTask
 from nesta.core.orms.orm_utils import setup_es, get_es_ids, get_config
-from nesta.packages.misc_utils.batches import split_batches, put_s3_batch
+from nesta.packages.misc_utils.batches import split_batches, put_s3_batches
 from abc import abstractmethod
 import luigi
 import logging
@@ -25,6 +25,9 @@ class ElasticsearchTask(AutoBatchTask):
         process_batch_size (int): Number of documents per batch.
         intermediate_bucket (str): S3 bucket where batch chunks are stored.
         sql_config_filename (str): SQL config path/filename in the batch task.
+        batch_manifest (bool): Write a single manifest of all batches to S3,
+                               rather than one file of ids per batch
+                               (see :obj:`put_s3_manifest`)?
     '''
     routine_id = luigi.Parameter()
     db_config_path = luigi.Parameter('mysqldb.config')
@@ -37,6 +40,7 @@ class ElasticsearchTask(AutoBatchTask):
     intermediate_bucket = luigi.Parameter('nesta-production'
                                           '-intermediate')
     sql_config_filename = luigi.Parameter('mysqldb.config')
+    batch_manifest = luigi.BoolParameter(default=False)
 
     @property
     @functools.lru_cache()
@@ -89,16 +93,13 @@ class ElasticsearchTask(AutoBatchTask):
         # Generate the job params
         job_params = []
         batches = split_batches(ids, self.process_batch_size)
-        for count, batch in enumerate(batches, 1):
+        batch_files = put_s3_batches(batches, self.intermediate_bucket,
+                                     self.routine_id,
+                                     manifest=self.batch_manifest)
+        for count, batch_file in enumerate(batch_files, 1):
             done = False  # Already taken care of with _done_ids
-            # write batch of ids to s3
-            batch_file = ''
-            if not done:
-                batch_file = put_s3_batch(batch,
-                                          self.intermediate_bucket,
-                                          self.routine_id)
             params = {
-                "batch_file": batch_file,
+                **batch_file,
                 "config": self.sql_config_filename,
                 "bucket": self.intermediate_bucket,
                 "done": done,
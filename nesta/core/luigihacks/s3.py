@@ -38,6 +38,97 @@ def parse_s3_path(path):
 
 
 
+class S3DoneKeys:
+    """Lazy, prefix-scoped lookup of the keys which exist in an S3 bucket,
+    for checking whether batch jobs have already been done. Rather than
+    listing the whole bucket up front, only the keys under the prefix of
+    interest are listed, on first use. Listings are cached per prefix
+    (and reused for any narrower prefix) until :obj:`refresh` is called.
+
+    Args:
+        bucket (str): Name of the S3 bucket.
+        s3_client: boto3 S3 client, created on first use by default.
+    """
+    def __init__(self, bucket, s3_client=None):
+        self.bucket = bucket
+        self._s3_client = s3_client
+        self._cache = {}
+
+    @property
+    def s3_client(self):
+        if self._s3_client is None:
+            self._s3_client = boto3.client('s3')
+        return self._s3_client
+
+    def _listing(self, prefix):
+        """The cached listing which covers this prefix, which may be that of
+        a broader prefix. If there is none, the prefix is listed and cached.
+
+        Args:
+            prefix (str): Key prefix.
+        Returns:
+            keys (set): Cached keys, including all of those under the prefix.
+        """
+        keys = self._cache.get(prefix)
+        if keys is not None:
+            return keys
+        for cached_prefix, keys in self._cache.items():
+            if prefix.startswith(cached_prefix):
+                return keys
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        keys = set()
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            keys.update(obj['Key'] for obj in page.get('Contents', []))
+        self._cache[prefix] = keys
+        return keys
+
+    def keys(self, prefix=''):
+        """All keys in the bucket under this prefix.
+
+        Args:
+            prefix (str): Key prefix, e.g. the job name of a task.
+        Returns:
+            keys (set): Keys under the prefix. If this prefix was listed
+                        directly, this is the cached set itself, and so
+                        should not be modified.
+        """
+        keys = self._listing(prefix)
+        if prefix in self._cache:
+            return keys
+        return {key for key in keys if key.startswith(prefix)}
+
+    def is_done(self, key, prefix=''):
+        """Whether the key exists in the bucket.
+
+        Args:
+            key (str): Key to check.
+            prefix (str): Prefix of the key, under which all keys are
+                          listed (and cached) for subsequent checks.
+        Returns:
+            done (bool)
+        """
+        if not key.startswith(prefix):
+            raise ValueError(f"Key '{key}' is not under prefix '{prefix}'")
+        # The key is under the prefix, so can be checked directly against
+        # any (possibly broader) cached listing
+        return key in self._listing(prefix)
+
+    def refresh(self, prefix=None):
+        """Forget cached listings, so that they are listed again on next use.
+
+        Args:
+            prefix (str): Only forget listings which overlap with this
+                          prefix (by default, forget everything).
+        """
+        if prefix is None:
+            self._cache.clear()
+            return
+        for cached_prefix in list(self._cache):
+            if (cached_prefix.startswith(prefix) or
+                    prefix.startswith(cached_prefix)):
+                del self._cache[cached_prefix]
+
+
 class S3FS(FileSystem):
     def __init__(self, **kwargs):
         luigi_s3_config = self._get_s3_client_config()
@@ -11,7 +11,7 @@ from luigi.parameter import ParameterVisibility
 import os
 
 from nesta.packages.misc_utils.batches import split_batches
-from nesta.packages.misc_utils.batches import put_s3_batch
+from nesta.packages.misc_utils.batches import put_s3_batches
 from nesta.core.luigihacks import autobatch
 from nesta.core.luigihacks.parameter import SqlAlchemyParameter
 from nesta.core.luigihacks.misctools import get_config
@@ -34,6 +34,9 @@ class Sql2BatchTask(autobatch.AutoBatchTask):
         filter (SqlAlchemy conditional statement): A conditional statement, to be passed
                                                    to query.filter(). This allows for
                                                    subsets of the data to be processed.
+        batch_manifest (bool): Write a single manifest of all batches to S3,
+                               rather than one file of ids per batch
+                               (see :obj:`put_s3_manifest`)?
         kwargs (dict): Any other job parameters to pass to the batchable.
     '''
     date = luigi.DateParameter()
@@ -49,6 +52,7 @@ class Sql2BatchTask(autobatch.AutoBatchTask):
     # the i/o stream and the email error message
     filter_ids = luigi.ListParameter(default=[],
                                      visibility=ParameterVisibility.PRIVATE)
+    batch_manifest = luigi.BoolParameter(default=False)
     kwargs = luigi.DictParameter(default={})
 
     def output(self):
@@ -79,12 +83,13 @@ class Sql2BatchTask(autobatch.AutoBatchTask):
         logging.info(f"Retrieved {len(all_ids)} IDs rom MySQL")
 
         job_params = []
-        for count, batch in enumerate(split_batches(all_ids, self.process_batch_size),1):
-            # write batch of ids to s3
-            batch_file = put_s3_batch(batch, self.intermediate_bucket,
-                                      self.routine_id)
+        batch_files = put_s3_batches(split_batches(all_ids,
+                                                   self.process_batch_size),
+                                     self.intermediate_bucket, self.routine_id,
+                                     manifest=self.batch_manifest)
+        for count, batch_file in enumerate(batch_files, 1):
             params = {
-                "batch_file": batch_file,
+                **batch_file,
                 "config": 'mysqldb.config',
                 "db_name": database,
                 "bucket": self.intermediate_bucket,
@@ -10,15 +10,14 @@ import luigi
 import os
 
 from nesta.packages.misc_utils.batches import split_batches
-from nesta.packages.misc_utils.batches import put_s3_batch
+from nesta.packages.misc_utils.batches import put_s3_batches
 from nesta.core.luigihacks import autobatch
 from nesta.core.luigihacks.parameter import SqlAlchemyParameter
 from nesta.core.luigihacks.misctools import get_config
 from nesta.core.luigihacks.mysqldb import MySqlTarget
 from nesta.core.orms.orm_utils import get_mysql_engine
 from nesta.core.orms.orm_utils import setup_es
-from nesta.core.orms.orm_utils import db_session
-from nesta.core.orms.orm_utils import get_es_ids
+from nesta.core.orms.orm_utils import iter_new_ids
 
 
 class Sql2EsTask(autobatch.AutoBatchTask):
@@ -38,7 +37,12 @@ class Sql2EsTask(autobatch.AutoBatchTask):
                                                    to query.filter(). This allows for
                                                    subsets of the data to be processed.
         entity_type (str): Name of the entity type to label this task with.
-        kwargs (dict): Any other job parameters to pass to the batchable.
+        batch_manifest (bool): Write a single manifest of all batches to S3,
+                               rather than one file of ids per batch
+                               (see :obj:`put_s3_manifest`)?
+        kwargs (dict): Any other job parameters to pass to the batchable,
+                       e.g. {'profile_es': True} to profile the
+                       ElasticsearchPlus transforms of each batch.
     '''
     date = luigi.DateParameter()
     routine_id = luigi.Parameter()
@@ -52,6 +56,7 @@ class Sql2EsTask(autobatch.AutoBatchTask):
     id_field = SqlAlchemyParameter()
     filter = SqlAlchemyParameter(default=None)
     entity_type = luigi.Parameter()
+    batch_manifest = luigi.BoolParameter(default=False)
     kwargs = luigi.DictParameter(default={})
 
     def output(self):
@@ -64,6 +69,9 @@ class Sql2EsTask(autobatch.AutoBatchTask):
         return MySqlTarget(update_id=update_id, **db_config)
 
     def prepare(self):
+        '''Yield the parameters of each batch as soon as the batch is
+        discovered, so that the first batch jobs can be submitted
+        before the remaining ids have been diffed.'''
         if self.test:
             self.process_batch_size = 1000
             logging.warning("Batch size restricted to "
@@ -82,33 +90,20 @@ class Sql2EsTask(autobatch.AutoBatchTask):
                                  production=not self.test,
                                  drop_and_recreate=self.drop_and_recreate)
 
-        # Get set of existing ids from elasticsearch via scroll
-        existing_ids = get_es_ids(es, es_config)
-        logging.info(f"Collected {len(existing_ids)} existing in "
-                     "Elasticsearch")
-
-        # Get set of all entitites from MySQL
-        with db_session(engine) as session:
-            query = session.query(self.id_field)
-            if self.filter is not None:
-                query = query.filter(self.filter)
-            result = query.all()
-            all_ids = {r[0] for r in result}
-        logging.info(f"Identified {len(all_ids)} entitites in MySQL")
-
-        # Remove previously processed
-        ids_to_process = (_id for _id in all_ids
-                          if _id not in existing_ids)
-
-        job_params = []
-        for count, batch in enumerate(split_batches(ids_to_process,
-                                                    self.process_batch_size),
-                                      1):
-            # write batch of ids to s3
-            batch_file = put_s3_batch(batch, self.intermediate_bucket,
-                                      self.routine_id)
+        # Stream the ids in MySQL which are not yet in Elasticsearch
+        ids_to_process = iter_new_ids(engine, self.id_field, es, es_config,
+                                      filter_=self.filter)
+
+        # Note: with a manifest, all batches are diffed before the
+        # manifest is written, and so before any jobs are submitted
+        batches = split_batches(ids_to_process, self.process_batch_size)
+        batch_files = put_s3_batches(batches, self.intermediate_bucket,
+                                     self.routine_id,
+                                     manifest=self.batch_manifest)
+        count = 0
+        for count, batch_file in enumerate(batch_files, 1):
             params = {
-                "batch_file": batch_file,
+                **batch_file,
                 "config": 'mysqldb.config',
                 "db_name": database,
                 "bucket": self.intermediate_bucket,
@@ -125,16 +120,14 @@ class Sql2EsTask(autobatch.AutoBatchTask):
             params.update(self.kwargs)
 
             logging.info(params)
-            job_params.append(params)
+            yield params
             if self.test and count > 1:
                 logging.warning("Breaking after 2 batches while in "
                                 "test mode.")
-                logging.warning(job_params)
                 break
 
         logging.warning("Batch preparation completed, "
-                        f"with {len(job_params)} batches")
-        return job_params
+                        f"with {count} batches")
 
     def combine(self, job_params):
         '''Touch the checkpoint'''
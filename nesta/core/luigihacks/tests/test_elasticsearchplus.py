@@ -2,6 +2,7 @@ import pytest
 from unittest import mock
 from alphabet_detector import AlphabetDetector
 from collections import Counter
+import json
 import time
 
 from nesta.core.luigihacks.elasticsearchplus import Translator
@@ -33,6 +34,7 @@ GUESS_DELIMITER=f"{PATH}._guess_delimiter"
 SCHEMA_TRANS=f"{PATH}.schema_transformer"
 CHAIN_TRANS=f"{PATH}.ElasticsearchPlus.chain_transforms"
 SUPER_INDEX=f"{PATH}.Elasticsearch.index"
+BULK=f"{PATH}.bulk"
 BOTO=f"{PATH}.boto3"
 AWS4AUTH=f"{PATH}.AWS4Auth"
 
@@ -371,6 +373,36 @@ def test_index(mocked_chain_transform, mocked_super_index,
         es.index()
     es.index(body=row)
 
+@mock.patch(AWS4AUTH, return_value=None)
+@mock.patch(BOTO)
+@mock.patch(BULK)
+def test_update_fields_bulk(mocked_bulk, mocked_boto3, mocked_auth):
+    mocked_boto3.Session.return_value.get_credentials.return_value = mock.MagicMock()
+    es = ElasticsearchPlus('dummy', aws_auth_region='blah')
+    docs = {'a': {'score': 1, 'terms_of_x': ''}, 'b': {'score': None}}
+    bodies = es.update_fields_bulk(index='idx', docs=docs,
+                                   transforms=[_null_empty_str])
+    assert bodies == {'a': {'score': 1, 'terms_of_x': None},
+                      'b': {'score': None}}
+    _es, actions = mocked_bulk.call_args[0]
+    assert _es is es
+    assert list(actions) == [{'_op_type': 'update', '_index': 'idx',
+                              '_type': '_doc', '_id': 'a',
+                              'doc': {'score': 1, 'terms_of_x': None}},
+                             {'_op_type': 'update', '_index': 'idx',
+                              '_type': '_doc', '_id': 'b',
+                              'doc': {'score': None}}]
+
+@mock.patch(AWS4AUTH, return_value=None)
+@mock.patch(BOTO)
+@mock.patch(BULK)
+def test_update_fields_bulk_no_commit(mocked_bulk, mocked_boto3, mocked_auth):
+    mocked_boto3.Session.return_value.get_credentials.return_value = mock.MagicMock()
+    es = ElasticsearchPlus('dummy', aws_auth_region='blah', no_commit=True)
+    docs = {'a': {'score': 1}}
+    assert es.update_fields_bulk(index='idx', docs=docs) == docs
+    assert mocked_bulk.call_count == 0
+
 @mock.patch(AWS4AUTH, return_value=None)
 @mock.patch(BOTO)
 def test_near_duplicates_no_results(mocked_boto3, mocked_auth, good_doc):
@@ -398,3 +430,62 @@ def test_near_duplicates_some_results(mocked_boto3, mocked_auth,
                                    doc_type=None, fields=None))
     assert len(hits) == 6 # excludes bad_doc
     
+
+@mock.patch(AWS4AUTH, return_value=None)
+@mock.patch(BOTO)
+@mock.patch(SUPER_INDEX)
+def test_profile(mocked_super_index, mocked_boto3, mocked_auth,
+                 row, field_null_mapping, tmp_path):
+    mocked_boto3.Session.return_value.get_credentials.return_value = mock.MagicMock()
+    es = ElasticsearchPlus('dummy', aws_auth_region='blah', no_commit=True,
+                           field_null_mapping=field_null_mapping)
+    _es = ElasticsearchPlus('dummy', aws_auth_region='blah', no_commit=True,
+                            field_null_mapping=field_null_mapping,
+                            profile=True)
+    with pytest.raises(ValueError):
+        es.report_profile()
+
+    # Profiling doesn't change the output
+    for _ in range(3):
+        assert _es.index(body=dict(row)) == es.index(body=dict(row))
+    _es.index(body={'a': 'b'})
+    assert mocked_super_index.call_count == 0
+
+    path = str(tmp_path / 'profile.json')
+    summary = _es.report_profile(path)
+    assert summary['n_docs'] == 4
+    names = {t['name'] for t in summary['transforms']}
+    assert names == {'_add_entity_type', '_null_empty_str', '_null_mapping',
+                     '_coordinates_as_floats', '_listify_terms',
+                     '_sanitize_html', '_clean_bad_unicode_conversion',
+                     '_clean_up_lists', '_remove_padding', '_nullify_pairs'}
+    assert all(t['calls'] == 4 for t in summary['transforms'])
+    assert sum(t['fraction'] for t in summary['transforms']) == pytest.approx(1)
+    # Three large documents and one small one
+    assert [d['docs'] for d in summary['doc_sizes']] == [1, 3]
+    with open(path) as f:
+        assert json.load(f) == summary
+
+    # The profile is reset after each report
+    assert _es.report_profile()['n_docs'] == 0
+
+
+@mock.patch(AWS4AUTH, return_value=None)
+@mock.patch(BOTO)
+@mock.patch(SUPER_INDEX)
+def test_profile_batch(mocked_super_index, mocked_boto3, mocked_auth,
+                       row, monkeypatch):
+    mocked_boto3.Session.return_value.get_credentials.return_value = mock.MagicMock()
+    es = ElasticsearchPlus('dummy', aws_auth_region='blah', no_commit=True)
+    with es.profile_batch('bucket', 'batch.json'):
+        es.index(body=dict(row))
+    assert es.profiler is None
+
+    monkeypatch.setenv('BATCHPAR_profile_es', 'True')
+    monkeypatch.setenv('BATCHPAR_batch_number', '3')
+    with mock.patch(f"{PATH}.TransformProfiler.report") as mocked_report:
+        with es.profile_batch('bucket', 'batch.json'):
+            es.index(body=dict(row))
+        assert es.profiler.n_docs == 1
+    mocked_report.assert_called_once_with('s3://bucket/batch.json-3'
+                                          '-es_profile.json')
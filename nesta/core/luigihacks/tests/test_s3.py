@@ -0,0 +1,85 @@
+import boto3
+import pytest
+from unittest import mock
+try:
+    from moto import mock_aws
+except ImportError:  # moto < 5, as pinned in requirements_test.txt
+    from moto import mock_s3 as mock_aws
+
+from nesta.core.luigihacks.s3 import S3DoneKeys
+
+
+@pytest.fixture
+def s3_client():
+    with mock_aws():
+        client = boto3.client('s3', region_name='us-east-1')
+        client.create_bucket(Bucket='bucket')
+        for key in ['task-a-1', 'task-a-2', 'task-b-1', 'other']:
+            client.put_object(Bucket='bucket', Key=key, Body=b'')
+        yield client
+
+
+def _count_listings(client):
+    calls = []
+    client.meta.events.register('before-parameter-build.s3.ListObjectsV2',
+                                lambda params, **kwargs: calls.append(
+                                    params['Prefix']))
+    return calls
+
+
+def test_s3_done_keys_prefix_scoped(s3_client):
+    # More than one page of results
+    for i in range(1001):
+        s3_client.put_object(Bucket='bucket', Key=f'big-{i}', Body=b'')
+    done_keys = S3DoneKeys('bucket', s3_client=s3_client)
+    calls = _count_listings(s3_client)
+    assert done_keys.keys('task-a-') == {'task-a-1', 'task-a-2'}
+    assert done_keys.is_done('task-a-1', prefix='task-a-')
+    assert not done_keys.is_done('task-a-3', prefix='task-a-')
+    # Cached: only listed once, and only under the prefix
+    assert calls == ['task-a-']
+    assert len(done_keys.keys('big-')) == 1001
+    assert calls == ['task-a-', 'big-', 'big-']  # paginated
+    with pytest.raises(ValueError):
+        done_keys.is_done('task-b-1', prefix='task-a-')
+
+
+def test_s3_done_keys_reuses_broader_prefix(s3_client):
+    done_keys = S3DoneKeys('bucket', s3_client=s3_client)
+    calls = _count_listings(s3_client)
+    assert done_keys.keys('task-') == {'task-a-1', 'task-a-2', 'task-b-1'}
+    assert done_keys.keys('task-b-') == {'task-b-1'}
+    assert done_keys.is_done('task-b-1', prefix='task-b-')
+    assert not done_keys.is_done('task-b-2', prefix='task-b-')
+    assert calls == ['task-']
+
+
+def test_s3_done_keys_no_copy_on_cache_hit(s3_client):
+    done_keys = S3DoneKeys('bucket', s3_client=s3_client)
+    keys = done_keys.keys('task-a-')
+    assert done_keys.keys('task-a-') is keys
+    with mock.patch.object(done_keys, 'keys') as mocked_keys:
+        assert done_keys.is_done('task-a-1', prefix='task-a-')
+        assert done_keys.is_done('task-a-2', prefix='task-a-2')
+    assert mocked_keys.call_count == 0
+
+
+def test_s3_done_keys_refresh(s3_client):
+    done_keys = S3DoneKeys('bucket', s3_client=s3_client)
+    assert not done_keys.is_done('task-a-3', prefix='task-a-')
+    assert not done_keys.is_done('task-b-2', prefix='task-b-')
+    s3_client.put_object(Bucket='bucket', Key='task-a-3', Body=b'')
+    s3_client.put_object(Bucket='bucket', Key='task-b-2', Body=b'')
+    # Stale until refreshed
+    assert not done_keys.is_done('task-a-3', prefix='task-a-')
+    done_keys.refresh('task-a-')
+    assert done_keys.is_done('task-a-3', prefix='task-a-')
+    assert not done_keys.is_done('task-b-2', prefix='task-b-')
+    done_keys.refresh()
+    assert done_keys.is_done('task-b-2', prefix='task-b-')
+
+
+def test_s3_done_keys_lazy_client():
+    with mock_aws():
+        done_keys = S3DoneKeys('bucket')
+        assert done_keys._s3_client is None
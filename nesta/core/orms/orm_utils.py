@@ -1,11 +1,13 @@
 from configparser import ConfigParser
 from contextlib import contextmanager
-from sqlalchemy import create_engine, insert
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy import Column, MetaData, Table, select
 from sqlalchemy import exists as sql_exists
-from sqlalchemy.exc import OperationalError
+from sqlalchemy.exc import DisconnectionError, OperationalError
 from sqlalchemy.engine.url import URL
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.orm import class_mapper
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.sql.expression import and_, or_
 from nesta.core.luigihacks.misctools import find_filepath_from_pathstub
 from nesta.core.luigihacks.misctools import get_config, load_yaml_from_pathstub
@@ -209,6 +211,75 @@ def get_es_ids(es, es_config, size=1000, query={}):
                    size=size)
     return {s['_id'] for s in scanner}
 
+
+def iter_sql_ids(engine, id_field, filter_=None, chunksize=10000):
+    """Yield pages of ids from the database, in id order, by keyset paging
+    (i.e. :code:`WHERE id > last_id ORDER BY id LIMIT chunksize`) so that
+    each page is an index range scan, however deep into the table.
+
+    Args:
+        engine (SqlAlchemy engine): Database engine.
+        id_field (SqlAlchemy selectable attribute): The (unique) ID field.
+        filter_ (SqlAlchemy conditional statement): Optional filter.
+        chunksize (int): Number of ids per page.
+    Yields:
+        ids (list): A page of ids.
+    """
+    last_id = None
+    while True:
+        with db_session(engine) as session:
+            query = session.query(id_field)
+            if filter_ is not None:
+                query = query.filter(filter_)
+            if last_id is not None:
+                query = query.filter(id_field > last_id)
+            ids = [row[0] for row in query.order_by(id_field).limit(chunksize)]
+        if len(ids) == 0:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+def get_existing_es_ids(es, es_config, ids):
+    """Find which of the given ids already exist in Elasticsearch,
+    with a single `ids` query.
+
+    Args:
+        es: Elasticsearch connection.
+        es_config (dict): Elasticsearch configuration.
+        ids (list): Ids to look up, no more than the index's
+                    max_result_window (10000 by default).
+    Returns:
+        existing_ids (set): The ids (as strings) which exist in Elasticsearch.
+    """
+    body = {"query": {"ids": {"values": [str(_id) for _id in ids]}},
+            "_source": False, "size": len(ids)}
+    results = es.search(index=es_config['index'], doc_type=es_config['type'],
+                        body=body)
+    return {hit['_id'] for hit in results['hits']['hits']}
+
+
+def iter_new_ids(engine, id_field, es, es_config, filter_=None,
+                 chunksize=10000):
+    """Stream the ids which are in the database but not in Elasticsearch.
+    Only one page of ids is held in memory at a time, and each page is
+    checked against Elasticsearch as soon as it is read, so new ids are
+    yielded as they are discovered.
+
+    Args:
+        engine (SqlAlchemy engine): Database engine.
+        id_field (SqlAlchemy selectable attribute): The (unique) ID field.
+        es: Elasticsearch connection.
+        es_config (dict): Elasticsearch configuration.
+        filter_ (SqlAlchemy conditional statement): Optional filter.
+        chunksize (int): Number of ids per page (no more than 10000).
+    Yields:
+        _id: An id in the database, but not in Elasticsearch.
+    """
+    for ids in iter_sql_ids(engine, id_field, filter_, chunksize):
+        existing_ids = get_existing_es_ids(es, es_config, ids)
+        yield from (_id for _id in ids if str(_id) not in existing_ids)
+
 def load_json_from_pathstub(pathstub, filename, sort_on_load=True):
     """Basic wrapper around :obj:`find_filepath_from_pathstub`
     which also opens the file (assumed to be json).
@@ -662,6 +733,49 @@ def insert_data(db_env, section, database, Base,
     return objs
 
 
+def insert_new_rows(engine, _class, rows, chunksize=10000):
+    """
+    Bulk insert rows whose primary keys are not already in the table.
+    Unlike :obj:`insert_data`, the primary keys of the table are never read
+    into memory: instead the rows are streamed in chunks into a temporary
+    staging table, and then copied into the table with a single anti-join
+    against the existing primary keys. Rows with duplicate primary keys
+    must therefore be otherwise identical.
+
+    Args:
+        engine (:obj:`sqlalchemy.engine.base.Engine`): Database engine.
+        _class (:obj:`sqlalchemy.Base`): The ORM for this data.
+        rows (:obj:`iterable` of :obj:`dict`): Rows of data to insert.
+        chunksize (int): Number of rows per bulk insert into the staging table.
+    Returns:
+        n_inserted (int): The number of rows inserted into the table.
+    """
+    table = _class.__table__
+    columns = [c.name for c in table.columns]
+    pkeys = [c.name for c in table.primary_key.columns]
+    staging = Table(f'staging_{table.name}', MetaData(),
+                    *(Column(c.name, c.type) for c in table.columns),
+                    prefixes=['TEMPORARY'])
+    # Anti-join: rows in the staging table which aren't in the table
+    join = staging.outerjoin(table, and_(*(staging.c[pk] == table.c[pk]
+                                           for pk in pkeys)))
+    new_rows = (select([staging.c[col] for col in columns])
+                .select_from(join)
+                .where(table.c[pkeys[0]].is_(None))
+                .distinct())
+    with engine.begin() as conn:
+        table.create(conn, checkfirst=True)
+        staging.create(conn)
+        try:
+            for chunk in split_batches(rows, chunksize):
+                conn.execute(staging.insert(), chunk)
+            result = conn.execute(table.insert().from_select(columns,
+                                                             new_rows))
+        finally:
+            staging.drop(conn)
+    return result.rowcount
+
+
 def db_session_query(query, engine, chunksize=1000,
                      limit=None, offset=0):
     """Perform queries in chunks, with one session per chunk
@@ -771,8 +885,85 @@ def try_until_allowed(f, *args, **kwargs):
             return value
 
 
-def get_mysql_engine(db_env, section, database="production_tests"):
-    '''Generates the MySQL DB engine for tests
+# Default pool settings for engines from get_mysql_engine. MySQL closes
+# idle connections after wait_timeout (8 hours by default), so connections
+# are recycled well before then.
+POOL_SIZE = 5
+MAX_OVERFLOW = 10
+POOL_RECYCLE = 3600
+
+# Process-wide registry of engines, keyed by (db_env, section, database)
+_ENGINES = {}
+# Engines inherited from a parent process, which are kept alive (rather than
+# garbage collected) so that the parent's connections are never closed
+# from the child
+_FORKED_ENGINES = []
+
+
+def _reset_engines_after_fork():
+    """Discard the parent process's engines in a forked child process,
+    so that the child never shares a pooled connection with its parent."""
+    _FORKED_ENGINES.extend(_ENGINES.values())
+    _ENGINES.clear()
+
+
+# os.register_at_fork is new in Python 3.7: on 3.6, forked workers are only
+# protected by the pid check on checkout in _track_pool_usage
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_engines_after_fork)
+
+
+def _mysql_url(db_env, section, database):
+    """Build the MySQL URL from the DB config described by db_env."""
+    conf_path = os.environ[db_env]
+    if conf_path == "TRAVISMODE":
+        return URL(drivername='mysql+pymysql',
+                   username="travis",
+                   database=database)
+    if not os.path.exists(conf_path):
+        raise FileNotFoundError(conf_path)
+    cp = ConfigParser()
+    cp.read(conf_path)
+    conf = dict(cp._sections[section])
+    return URL(drivername='mysql+pymysql',
+               username=conf['user'],
+               password=conf['password'],
+               host=conf['host'],
+               port=conf['port'],
+               database=database)
+
+
+def _track_pool_usage(engine):
+    """Count connections and checkouts on the engine's pool, and refuse
+    connections which were opened by another process (e.g. an engine
+    passed explicitly to a forked process), as described in the
+    SQLAlchemy docs on using connection pools with multiprocessing."""
+    engine.pool_usage = {'connects': 0, 'checkouts': 0}
+
+    @event.listens_for(engine, "connect")
+    def connect(dbapi_connection, connection_record):
+        connection_record.info['pid'] = os.getpid()
+        engine.pool_usage['connects'] += 1
+
+    @event.listens_for(engine, "checkout")
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        pid = os.getpid()
+        if connection_record.info['pid'] != pid:
+            connection_record.connection = connection_proxy.connection = None
+            raise DisconnectionError("Connection record belongs to pid "
+                                     f"{connection_record.info['pid']}, "
+                                     f"attempting to check out in pid {pid}")
+        engine.pool_usage['checkouts'] += 1
+
+
+def get_mysql_engine(db_env, section, database="production_tests",
+                     pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW,
+                     pool_recycle=POOL_RECYCLE, cached=True):
+    '''Generates the MySQL DB engine. Engines are cached process-wide by
+    (config path, section, database), so that the config is only parsed once
+    and all callers share a single connection pool. The config path is read
+    from db_env on every call, so repointing db_env gives a new engine. Note that the pool
+    settings are therefore only applied when the engine is first created.
 
     Args:
         db_env (str): Name of environmental variable
@@ -780,27 +971,48 @@ def get_mysql_engine(db_env, section, database="production_tests"):
         section (str): Section of the DB config to use.
         database (str): Which database to use
                         (default is a database called 'production_tests')
+        pool_size (int): Number of connections to keep open in the pool.
+        max_overflow (int): Number of connections allowed beyond pool_size.
+        pool_recycle (int): Seconds after which a connection is recycled.
+        cached (bool): Whether to use (and register) the shared engine,
+                       rather than creating a new one.
+    Returns:
+        engine (:obj:`sqlalchemy.engine.Engine`)
     '''
+    key = (os.environ[db_env], section, database)
+    if cached and key in _ENGINES:
+        return _ENGINES[key]
+    url = _mysql_url(db_env, section, database)
+    engine = create_engine(url, connect_args={"charset": "utf8mb4"},
+                           poolclass=QueuePool, pool_size=pool_size,
+                           max_overflow=max_overflow,
+                           pool_recycle=pool_recycle)
+    _track_pool_usage(engine)
+    if cached:
+        _ENGINES[key] = engine
+    return engine
+
+
+def mysql_pool_status():
+    '''Usage metrics of the pool of each registered MySQL engine.
 
-    conf_path = os.environ[db_env]
-    if conf_path == "TRAVISMODE":
-        url = URL(drivername='mysql+pymysql',
-                  username="travis",
-                  database=database)
-    else:
-        if not os.path.exists(conf_path):
-            raise FileNotFoundError(conf_path)
-        cp = ConfigParser()
-        cp.read(conf_path)
-        conf = dict(cp._sections[section])
-        url = URL(drivername='mysql+pymysql',
-                  username=conf['user'],
-                  password=conf['password'],
-                  host=conf['host'],
-                  port=conf['port'],
-                  database=database)
-    # Create the database
-    return create_engine(url, connect_args={"charset": "utf8mb4"})
+    Returns:
+        status (dict): Pool metrics, keyed by
+                       (config path, section, database).
+    '''
+    return {key: {'size': engine.pool.size(),
+                  'checked_in': engine.pool.checkedin(),
+                  'checked_out': engine.pool.checkedout(),
+                  'overflow': engine.pool.overflow(),
+                  **engine.pool_usage}
+            for key, engine in _ENGINES.items()}
+
+
+def dispose_mysql_engines():
+    '''Close all pooled connections and empty the engine registry.'''
+    for engine in _ENGINES.values():
+        engine.dispose()
+    _ENGINES.clear()
 
 
 def create_elasticsearch_index(es_client, index, config_path=None):
@@ -0,0 +1,99 @@
+"""
+benchmark_insert_new_rows
+=========================
+
+Time the MeSH join load of :obj:`MeshJoinTask` at NIH ExPORTER scale
+(:obj:`mesh_term_links` followed by :obj:`insert_new_rows`), against the
+previous implementation, which called :obj:`insert_data` once per new term
+and once per project. The previous implementation is quadratic, so it is
+only timed on a small subset of projects. This runs against the MySQL
+test database, as for the test suite (i.e. with MYSQLDBCONF set):
+
+    python nesta/core/orms/tests/benchmark_insert_new_rows.py
+
+Note that the MeSH tables of the test database are dropped and recreated.
+"""
+
+import random
+import time
+
+from nesta.core.orms.orm_utils import get_mysql_engine
+from nesta.core.orms.orm_utils import insert_data
+from nesta.core.orms.orm_utils import insert_new_rows
+from nesta.core.orms.mesh_orm import Base, MeshTerms, ProjectMeshTerms
+from nesta.packages.nih.process_mesh import mesh_term_links
+
+DB_ENV, SECTION, DATABASE = "MYSQLDBCONF", "mysqldb", "production_tests"
+
+
+def synthetic_project_terms(n_projects, terms_per_project, n_terms, seed=42):
+    """MeSH terms of each project, in the format returned by
+    MeshJoinTask.format_mesh_terms"""
+    rng = random.Random(seed)
+    project_terms = {}
+    for project_id in range(n_projects):
+        ids = rng.sample(range(n_terms), terms_per_project)
+        project_terms[project_id] = {'terms': [f'term {i}' for i in ids],
+                                     'ids': ids}
+    return project_terms
+
+
+def reset_tables(engine):
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+
+def old_mesh_join(project_terms):
+    """The previous MeshJoinTask load"""
+    mesh_term_ids = set()
+    for project_id, terms in project_terms.items():
+        rows = []
+        for term, term_id in zip(terms['terms'], terms['ids']):
+            if term_id not in mesh_term_ids:
+                insert_data(DB_ENV, SECTION, DATABASE, Base, MeshTerms,
+                            [{'id': term_id, 'term': term}], low_memory=True)
+                mesh_term_ids.add(term_id)
+            rows.append({'project_id': project_id, 'mesh_term_id': term_id})
+        insert_data(DB_ENV, SECTION, DATABASE, Base, ProjectMeshTerms,
+                    rows, low_memory=True)
+
+
+def new_mesh_join(engine, project_terms):
+    """The current MeshJoinTask load"""
+    new_terms, links = mesh_term_links(project_terms, term_index={})
+    return (insert_new_rows(engine, MeshTerms, new_terms),
+            insert_new_rows(engine, ProjectMeshTerms, links))
+
+
+def timed(func, *args):
+    start = time.time()
+    result = func(*args)
+    return time.time() - start, result
+
+
+def run(n_projects=80000, terms_per_project=20, n_terms=30000,
+        n_baseline=200):
+    engine = get_mysql_engine(DB_ENV, SECTION, DATABASE)
+    project_terms = synthetic_project_terms(n_projects, terms_per_project,
+                                            n_terms)
+    subset = dict(list(project_terms.items())[:n_baseline])
+
+    reset_tables(engine)
+    old_time, _ = timed(old_mesh_join, subset)
+    reset_tables(engine)
+    new_time, _ = timed(new_mesh_join, engine, subset)
+    print(f"{n_baseline:,} projects: {old_time:.2f}s --> {new_time:.2f}s")
+
+    reset_tables(engine)
+    new_time, (n_new_terms, n_links) = timed(new_mesh_join, engine,
+                                             project_terms)
+    print(f"{n_projects:,} projects ({n_new_terms:,} terms, "
+          f"{n_links:,} links): {new_time:.2f}s")
+    # Everything is already in the tables
+    rerun_time, _ = timed(new_mesh_join, engine, project_terms)
+    print(f"{n_projects:,} projects, all duplicates: {rerun_time:.2f}s")
+    reset_tables(engine)
+
+
+if __name__ == "__main__":
+    run()
@@ -7,20 +7,28 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.dialects.mysql import VARCHAR, TEXT
 from sqlalchemy.types import INTEGER
 from sqlalchemy import Column, ForeignKey
+from sqlalchemy import create_engine
 from sqlalchemy.engine.base import Engine
 from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import relationship
 
 from nesta.core.orms.orm_utils import get_class_by_tablename
 from nesta.core.orms.orm_utils import get_mysql_engine
+from nesta.core.orms.orm_utils import mysql_pool_status
+from nesta.core.orms.orm_utils import dispose_mysql_engines
+from nesta.core.orms.orm_utils import _reset_engines_after_fork
 from nesta.core.orms.orm_utils import try_until_allowed
 from nesta.core.orms.orm_utils import insert_data
+from nesta.core.orms.orm_utils import insert_new_rows
 from nesta.core.orms.orm_utils import load_json_from_pathstub
 from nesta.core.orms.orm_utils import get_es_mapping
 from nesta.core.orms.orm_utils import setup_es
 from nesta.core.orms.orm_utils import Elasticsearch
 from nesta.core.orms.orm_utils import merge_metadata
 from nesta.core.orms.orm_utils import get_es_ids
+from nesta.core.orms.orm_utils import iter_sql_ids
+from nesta.core.orms.orm_utils import get_existing_es_ids
+from nesta.core.orms.orm_utils import iter_new_ids
 from nesta.core.orms.orm_utils import object_to_dict
 from nesta.core.orms.orm_utils import db_session
 from nesta.core.orms.orm_utils import db_session_query
@@ -547,3 +555,124 @@ def test_create_delete_stmt_non_composite():
 def test_orm_column_names():
     assert orm_column_names(AutoPKModel) == {'parent_id',}
     assert orm_column_names(DummyModel) == {'_id', '_another_id', 'some_field'}
+
+
+def test_insert_new_rows():
+    # SQLite stands in for MySQL here, since only standard SQL is used
+    engine = create_engine('sqlite://')
+    rows = [{'_id': i, '_another_id': i % 2, 'some_field': i}
+            for i in range(10)]
+    assert insert_new_rows(engine, DummyModel, rows[:6], chunksize=4) == 6
+    # Duplicates within the data and in the table are ignored
+    assert insert_new_rows(engine, DummyModel, iter(rows + rows),
+                           chunksize=4) == 4
+    with db_session(engine) as session:
+        found = session.query(DummyModel._id, DummyModel._another_id,
+                              DummyModel.some_field).all()
+    assert sorted(found) == [(i, i % 2, i) for i in range(10)]
+
+
+def _auto_pk_engine(n_rows):
+    engine = create_engine('sqlite://')
+    AutoPKModel.__table__.create(engine)
+    with db_session(engine) as session:
+        session.add_all([AutoPKModel(parent_id=i) for i in range(n_rows)])
+    return engine
+
+
+def test_iter_sql_ids():
+    engine = _auto_pk_engine(25)
+    pages = list(iter_sql_ids(engine, AutoPKModel.parent_id, chunksize=10))
+    assert [len(page) for page in pages] == [10, 10, 5]
+    assert sum(pages, []) == list(range(25))
+    pages = list(iter_sql_ids(engine, AutoPKModel.parent_id,
+                              filter_=AutoPKModel.parent_id % 2 == 0,
+                              chunksize=10))
+    assert sum(pages, []) == list(range(0, 25, 2))
+
+
+def test_get_existing_es_ids():
+    es = mock.Mock()
+    es.search.return_value = {'hits': {'hits': [{'_id': '1'}, {'_id': '3'}]}}
+    es_config = {'index': 'idx', 'type': '_doc'}
+    assert get_existing_es_ids(es, es_config, [1, 2, 3]) == {'1', '3'}
+    kwargs = es.search.call_args[1]
+    assert kwargs['index'] == 'idx'
+    assert kwargs['body'] == {'query': {'ids': {'values': ['1', '2', '3']}},
+                              '_source': False, 'size': 3}
+
+
+def test_iter_new_ids():
+    engine = _auto_pk_engine(25)
+    es_ids = {str(i) for i in range(0, 25, 3)}
+    es = mock.Mock()
+    es.search.side_effect = lambda body, **kwargs: {'hits': {'hits': [
+        {'_id': _id} for _id in body['query']['ids']['values']
+        if _id in es_ids]}}
+    new_ids = iter_new_ids(engine, AutoPKModel.parent_id, es,
+                           {'index': 'idx', 'type': '_doc'}, chunksize=10)
+    # Ids are yielded as soon as the first page has been checked
+    assert next(new_ids) == 1
+    assert es.search.call_count == 1
+    assert [1] + list(new_ids) == [i for i in range(25) if i % 3]
+    assert es.search.call_count == 3
+
+
+@pytest.fixture
+def sqlite_engines(tmp_path, monkeypatch):
+    """Registered engines are backed by a SQLite file, with MySQL's pooling"""
+    monkeypatch.setenv('DUMMYDBCONF', 'TRAVISMODE')
+    url = f'sqlite:///{tmp_path}/db.sqlite'
+    with mock.patch(PATH.format('create_engine')) as mocked_create:
+        mocked_create.side_effect = (lambda _url, connect_args, **kwargs:
+                                     create_engine(url, **kwargs))
+        yield mocked_create
+    dispose_mysql_engines()
+
+
+def test_get_mysql_engine_is_cached(sqlite_engines):
+    engine = get_mysql_engine('DUMMYDBCONF', 'mysqldb', 'db')
+    assert get_mysql_engine('DUMMYDBCONF', 'mysqldb', 'db') is engine
+    assert sqlite_engines.call_count == 1
+    assert get_mysql_engine('DUMMYDBCONF', 'mysqldb', 'other') is not engine
+    uncached = get_mysql_engine('DUMMYDBCONF', 'mysqldb', 'db', cached=False)
+    assert uncached is not engine
+    assert len(mysql_pool_status()) == 2
+
+
+def test_get_mysql_engine_follows_db_env(sqlite_engines, monkeypatch):
+    engine = get_mysql_engine('DUMMYDBCONF', 'mysqldb', 'db')
+    monkeypatch.setenv('DUMMYDBCONF', 'TRAVISMODE_OTHER')
+    with mock.patch(PATH.format('_mysql_url')):
+        assert get_mysql_engine('DUMMYDBCONF', 'mysqldb', 'db') is not engine
+    monkeypatch.setenv('DUMMYDBCONF', 'TRAVISMODE')
+    assert get_mysql_engine('DUMMYDBCONF', 'mysqldb', 'db') is engine
+
+
+def test_mysql_pool_status(sqlite_engines):
+    engine = get_mysql_engine('DUMMYDBCONF', 'mysqldb', 'db',
+                              pool_size=2, max_overflow=1)
+    kwargs = sqlite_engines.call_args[1]
+    assert (kwargs['pool_size'], kwargs['max_overflow']) == (2, 1)
+    with engine.connect():
+        status, = mysql_pool_status().values()
+        assert status['checked_out'] == 1
+    with engine.connect():
+        pass
+    status, = mysql_pool_status().values()
+    assert status == {'size': 2, 'checked_in': 1, 'checked_out': 0,
+                      'overflow': -1, 'connects': 1, 'checkouts': 2}
+
+
+def test_get_mysql_engine_after_fork(sqlite_engines):
+    engine = get_mysql_engine('DUMMYDBCONF', 'mysqldb', 'db')
+    with engine.connect():
+        pass
+    # Connections opened in another process are not reused...
+    with mock.patch(PATH.format('os.getpid'), return_value=-1):
+        with engine.connect():
+            pass
+    assert engine.pool_usage['connects'] == 2
+    # ...and forked processes get a new engine
+    _reset_engines_after_fork()
+    assert get_mysql_engine('DUMMYDBCONF', 'mysqldb', 'db') is not engine
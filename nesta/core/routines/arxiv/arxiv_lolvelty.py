@@ -64,7 +64,12 @@ class ArxivElasticsearchTask(ElasticsearchTask):
                           region_name='eu-west-2',
                           memory=2048,
                           poll_time=10,
-                          max_live_jobs=100)
+                          max_live_jobs=100,
+                          # The n-grams are read once per routine,
+                          # and then shared between jobs
+                          kwargs={'ngram_snapshot': (f's3://nesta-production'
+                                                     f'-intermediate/{self.routine_id}'
+                                                     '-ngram_snapshot.txt')})
 
 
 class _ArxivElasticsearchTask(ArxivElasticsearchTask):
@@ -31,12 +31,15 @@ class VectorDedupeTask(luigi.Task):
         test (bool): Running in test mode?
         orm (SqlAlchemy ORM): A SqlAlchemy ORM containing the vector field.
         id_field (str): Name of the ID field in the ORM.
+        index_path (str): Optional local or S3 path of a persistent FAISS
+                          index, which is updated with new vectors.
     '''
     date = luigi.DateParameter()
     test = luigi.BoolParameter()
     vector_orm = SqlAlchemyParameter()
     source = luigi.ChoiceParameter(choices=["phr", "abstract"],
                                    var_type=str)
+    index_path = luigi.Parameter(default=None)
     
     def output(self):
         return make_mysql_target(self)
@@ -53,7 +56,8 @@ class VectorDedupeTask(luigi.Task):
                                          k_large=1000,
                                          n_clusters=250,
                                          duplicate_threshold=thresh,
-                                         read_max_chunks=max_chunks)
+                                         read_max_chunks=max_chunks,
+                                         index_path=self.index_path)
         links = [{"text_field":self.source, **link} for link in links]
         insert_data("MYSQLDB", "mysqldb", database, Base,
                     TextDuplicate, links, low_memory=True)
@@ -13,8 +13,7 @@ b) pypatstat generates a database on-the-fly, to maximise open utility of the to
 
 import luigi
 import logging
-from nesta.packages.patstat.fetch_appln import extract_data
-from nesta.packages.misc_utils.batches import split_batches
+from nesta.packages.patstat.fetch_appln import stream_data
 from nesta.core.orms.patstat_orm import ApplnFamilyEU, ApplnFamilyAll, Base
 from nesta.core.luigihacks.mysqldb import make_mysql_target
 from nesta.core.luigihacks.luigi_logging import set_log_level
@@ -39,9 +38,8 @@ class PatstatFamilyTask(luigi.Task):
         database = 'dev' if self.test else 'production'
         for (rgn, _class) in (('eu', ApplnFamilyEU),
                               ('all', ApplnFamilyAll)):
-            data = extract_data(limit=limit, region=rgn)
-            logging.info(f'Got {len(data)} rows')
-            for chunk in split_batches(data, 10000):
+            for chunk in stream_data(limit=limit, region=rgn,
+                                     chunksize=10000):
                 logging.info(f'Inserting chunk of size {len(chunk)}')
                 insert_data('MYSQLDB', 'mysqldb', database,
                             Base, _class, chunk, low_memory=True)
@@ -54,9 +54,17 @@ class GridCBMatchingTask(luigi.Task):
     Args:
         production (bool): Test or "full production" mode.
         date (datetime): Date stamp for this task.
+        grid_release (str): GRID release, to key the cached GRID lookups
+                            (defaults to the row counts and max ids of the
+                            GRID tables).
+        grid_cache_dir (str): Local directory for caching GRID lookups
+                              (defaults to $GRID_LOOKUPS_CACHE_DIR, or the
+                              grid_lookups directory of nesta.packages.grid).
     """
     production = luigi.BoolParameter(default=False)
     date = luigi.DateParameter(default=dt.now())
+    grid_release = luigi.OptionalParameter(default=None)
+    grid_cache_dir = luigi.OptionalParameter(default=None)
 
     def output(self):
         return make_mysql_target(self)
@@ -68,7 +76,8 @@ class GridCBMatchingTask(luigi.Task):
         if not self.production:
             cb_data = cb_data[:1000]
         # Takes about 25 mins
-        matcher = MatchEvaluator()
+        matcher = MatchEvaluator(grid_release=self.grid_release,
+                                 cache_dir=self.grid_cache_dir)
         matches = matcher.generate_matches(cb_data)
         # Flatten ready to save to disk
         out_data = [{"crunchbase_id": k,
@@ -19,15 +19,12 @@ import json
 import time
 import logging 
 from botocore.errorfactory import ClientError
-import boto3
 import os
 
 
-# Define these globally since they are shared resources
-# TODO: consider bundling this into a Singleton
-S3 = boto3.resource('s3')
-_BUCKET = S3.Bucket("nesta-production-intermediate")
-DONE_KEYS = set(obj.key for obj in _BUCKET.objects.all())
+# Define this globally since it is a shared resource. Keys are only
+# listed (and cached) per task prefix, when first needed.
+DONE_KEYS = s3.S3DoneKeys("nesta-production-intermediate")
 S3PREFIX = "s3://nesta-text-for-analysis"
 
 
@@ -65,6 +62,8 @@ class ProcessTextTask(autobatch.AutoBatchTask):
                     f"{self.db_text_field}/{self.date}/"
                     "{}")
         
+        # Keys under this prefix are listed afresh on each run
+        DONE_KEYS.refresh(job_name.format(''))
         # Add the mandatory `outinfo' and `done' fields
         job_params = []
         total = 0
@@ -73,7 +72,7 @@ class ProcessTextTask(autobatch.AutoBatchTask):
             # Check whether the job has been done already
             s3_key = job_name.format(len(job_params))
             s3_path = "s3://nesta-production-intermediate/%s" % s3_key
-            done = s3_key in DONE_KEYS
+            done = DONE_KEYS.is_done(s3_key, prefix=job_name.format(''))
             # Fill in the params
             params = {"start_id": start_id,
                       # OTHER PARAMS HERE: TABLE NAME, DB NAME ETC
@@ -135,13 +134,14 @@ class GroupsMembersTask(autobatch.AutoBatchTask):
                  "WHERE country = %s AND category_id = %s;")
         cursor.execute(query, (self.iso2, self.category))
         
+        DONE_KEYS.refresh(f"{self.job_name}-")
         # Add the mandatory `outinfo' and `done' fields
         job_params = []
         for group_id, group_urlname in cursor:
             # Check whether the job has been done already
             s3_key = "{}-{}-{}".format(self.job_name, group_id, group_urlname)
             s3_path = "s3://nesta-production-intermediate/%s" % s3_key
-            done = s3_key in DONE_KEYS
+            done = DONE_KEYS.is_done(s3_key, prefix=f"{self.job_name}-")
             # Fill in the params
             params = {"group_urlname":group_urlname,
                       "group_id":group_id,
@@ -211,6 +211,7 @@ class MembersGroupsTask(autobatch.AutoBatchTask):
                  "WHERE country = %s AND category_id = %s;")
         cursor.execute(query, (self.iso2, self.category))
 
+        DONE_KEYS.refresh(f"{self.job_name}-")
         job_params = []
         while True:
             chunk = cursor.fetchmany(100)
@@ -220,7 +221,7 @@ class MembersGroupsTask(autobatch.AutoBatchTask):
             # Check whether the job has been done already
             s3_key = "{}-{}-{}".format(self.job_name, data[0], data[-1])
             s3_path = "s3://nesta-production-intermediate/%s" % s3_key
-            done = s3_key in DONE_KEYS
+            done = DONE_KEYS.is_done(s3_key, prefix=f"{self.job_name}-")
             # Fill in the params
             params = {"member_ids":str(data),
                       "config":"mysqldb.config",
@@ -238,7 +239,7 @@ class MembersGroupsTask(autobatch.AutoBatchTask):
         #     # Check whether the job has been done already
         #     s3_key = "{}-{}".format(self.job_name, member_id)
         #     s3_path = "s3://nesta-production-intermediate/%s" % s3_key
-        #     done = s3_key in DONE_KEYS
+        #     done = DONE_KEYS.is_done(s3_key, prefix=f"{self.job_name}-")
         #     # Fill in the params
         #     params = {"member_id":member_id,
         #               "config":"mysqldb.config",
@@ -302,6 +303,7 @@ class GroupDetailsTask(autobatch.AutoBatchTask):
                  "WHERE meetup_groups.country IS NULL;")
         cursor.execute(query)
 
+        DONE_KEYS.refresh(f"{self.job_name}-")
         # Add the mandatory `outinfo' and `done' fields
         job_params = []
         while True:
@@ -313,7 +315,7 @@ class GroupDetailsTask(autobatch.AutoBatchTask):
             # Check whether the job has been done already
             s3_key = "{}-{}-{}".format(self.job_name, data[0], data[-1])
             s3_path = "s3://nesta-production-intermediate/%s" % s3_key
-            done = s3_key in DONE_KEYS
+            done = DONE_KEYS.is_done(s3_key, prefix=f"{self.job_name}-")
             # Fill in the params
             params = {"group_urlnames":str([x.encode("utf8") 
                                             for x in data]),
@@ -7,14 +7,15 @@ import luigi
 import re
 import os
 
-from nesta.core.orms.orm_utils import (get_mysql_engine, db_session, 
-                                       exists, insert_data)
-from nesta.core.orms.mesh_orm import MeshTerms, ProjectMeshTerms, Base
+from nesta.core.orms.orm_utils import (get_mysql_engine, db_session,
+                                       insert_new_rows)
+from nesta.core.orms.mesh_orm import MeshTerms, ProjectMeshTerms
 from nesta.core.orms.nih_orm import Projects
 from nesta.core.luigihacks.mysqldb import MySqlTarget
 from nesta.core.luigihacks.misctools import get_config
 
 from nesta.packages.nih.process_mesh import retrieve_mesh_terms
+from nesta.packages.nih.process_mesh import mesh_term_links
 
 
 bucket = 'innovation-mapping-general'
@@ -80,19 +81,12 @@ class MeshJoinTask(luigi.Task):
         
         engine = get_mysql_engine(self.db_config_env, 'mysqldb', db)
         with db_session(engine) as session:
-            
-            if self.test:
-                existing_projects = set()
-                projects = session.query(Projects.application_id).distinct()
-                for p in projects:
-                    existing_projects.update(int(p.application_id))
-            
-            projects_done = set()
-            projects_mesh = session.query(ProjectMeshTerms.project_id).distinct()
-            for p in projects_mesh:
-                projects_done.update(int(p.project_id))
-            
-            mesh_term_ids = {int(m.id) for m in session.query(MeshTerms.id).all()}
+            existing_projects = {int(p.application_id) for p in
+                                 session.query(Projects.application_id).distinct()}
+            projects_done = {int(p.project_id) for p in
+                             session.query(ProjectMeshTerms.project_id).distinct()}
+            term_index = {int(m.id): m.term
+                          for m in session.query(MeshTerms).all()}
 
         logging.info('Inserting associations')
         
@@ -103,26 +97,14 @@ class MeshJoinTask(luigi.Task):
             # each project id has set of mesh terms and corresponding term ids
             df_mesh = retrieve_mesh_terms(bucket, key)
             project_terms = self.format_mesh_terms(df_mesh)
-            # go through documents
-            for project_count, (project_id, terms) in enumerate(project_terms.items()):
-                rows = []
-                if self.test and (project_count > 2):
-                    continue
-                if (project_id in projects_done) or (project_id not in existing_projects):
-                    continue
-
-                for term, term_id in zip(terms['terms'], terms['ids']):
-                    term_id = int(term_id)
-                    # add term to mesh term table if not present
-                    if term_id not in mesh_term_ids:
-                        objs = insert_data(
-                                self.db_config_env, 'mysqldb', db, Base, MeshTerms, 
-                                [{'id': term_id, 'term': term}], low_memory=True)
-                        mesh_term_ids.update({term_id})
-                    # prepare row to be added to project-mesh_term link table
-                    rows.append({'project_id': project_id, 'mesh_term_id': term_id})
-                # inesrt rows to link table
-                insert_data(self.db_config_env, 'mysqldb', db, Base, 
-                        ProjectMeshTerms, rows, low_memory=True)
+            if self.test:
+                project_terms = dict(list(project_terms.items())[:3])
+            # resolve every term in one pass, and then bulk insert
+            # any new terms followed by the project-term links
+            new_terms, links = mesh_term_links(project_terms, term_index,
+                                               projects=existing_projects,
+                                               projects_done=projects_done)
+            n_terms = insert_new_rows(engine, MeshTerms, new_terms)
+            n_links = insert_new_rows(engine, ProjectMeshTerms, links)
+            logging.info(f'Inserted {n_terms} terms and {n_links} links from {key}')
         self.output().touch() # populate project-mesh_term link table
-
@@ -5,6 +5,10 @@ Cordis API
 Extract all Cordis data via the API, by project.
 """
 
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from itertools import chain
 import requests
 import pandas as pd
 import json
@@ -143,32 +147,27 @@ def filter_pubs(pubs):
         _pubs (list): Flattened list of input data.
     """
     _pubs, pids = [], set()
-    for p in pubs['datasets'] + pubs['publications']:
+    for p in chain(pubs['datasets'], pubs['publications']):
         if 'pid' not in p:
             continue
-        already_found = any(id in pids for id in p['pid'])
-        pids = pids.union(p['pid'])
+        already_found = not pids.isdisjoint(p['pid'])
+        pids.update(p['pid'])  # Note: in place, to keep this linear
         if already_found or len(p['pid']) == 0:
             continue
         _pubs.append(dict(id=p['pid'][0], **p))
     return _pubs
 
 
-def fetch_data(rcn):
-    """
-    Fetch all data (project, reports, orgs, publications)
-    for a given project id.
+def _parse_project(_project):
+    """Extract the project info and organisations from the raw project
+    data, along with the RCNs of its result reports.
 
     Args:
-        rcn (str): Project id.
+        _project (dict): Project data from the Cordis API.
     Returns:
-        data (tuple): project, orgs, reports, pubs
+        data (tuple): project, orgs, report_rcns
     """
-    # Collect project info
-    _project = hit_api(rcn=rcn, content_type='project')
-    if _project is None:
-        return (None,None,None,None)
-    info = _project['information']    
+    info = _project['information']
     project = {**extract_fields(info, INFO_FIELDS),
                **extract_fields(_project['objective'],
                                 OBJS_FIELDS)}
@@ -177,29 +176,124 @@ def fetch_data(rcn):
     oid_field = 'organizationId'
     for _orgs in _project['organizations'].values():
         for org in _orgs:
-            no_id_found = (oid_field not in org or 
+            no_id_found = (oid_field not in org or
                            org[oid_field] == '')
             if 'name' not in org and no_id_found:
                 continue
             elif no_id_found:
                 org[oid_field] = generate_id(org['name'])
             orgs.append(extract_fields(org, ORGS_FIELDS))
+    report_rcns = [report['rcn'] for report in info['relatedResultsReport']]
+    return project, orgs, report_rcns
 
-    # Collect result reports
-    _reports = [hit_api(rcn=report['rcn'], 
-                        content_type='result')
-                for report in info['relatedResultsReport']]
-    reports = []
-    if _reports is not None:
-        reports = [extract_fields(rep, REPS_FIELDS)
-                   for rep in _reports]
-    # Collect publications via OpenAIRE
+
+def _parse_reports(_reports):
+    """Extract fields from result reports, skipping any without data"""
+    return [extract_fields(rep, REPS_FIELDS)
+            for rep in _reports if rep is not None]
+
+
+def fetch_pubs(rcn):
+    """
+    Fetch publications for a given project id via OpenAIRE.
+
+    Args:
+        rcn (str): Project id.
+    Returns:
+        pubs (list): Deduplicated publications, empty if none were found.
+    """
     try:
         pubs = hit_api(api='openaire', rcn=rcn)
         if pubs is None:
             raise HTTPError
     except (HTTPError, JSONDecodeError):
-        pubs = []
-    else:
-        pubs = filter_pubs(pubs)
+        return []
+    return filter_pubs(pubs)
+
+
+def fetch_data(rcn):
+    """
+    Fetch all data (project, reports, orgs, publications)
+    for a given project id.
+
+    Args:
+        rcn (str): Project id.
+    Returns:
+        data (tuple): project, orgs, reports, pubs
+    """
+    # Collect project info
+    _project = hit_api(rcn=rcn, content_type='project')
+    if _project is None:
+        return (None,None,None,None)
+    project, orgs, report_rcns = _parse_project(_project)
+    # Collect result reports
+    reports = _parse_reports([hit_api(rcn=report_rcn,
+                                      content_type='result')
+                              for report_rcn in report_rcns])
+    # Collect publications via OpenAIRE
+    pubs = fetch_pubs(rcn)
     return project, orgs, reports, pubs
+
+
+def fetch_many(rcns, max_workers=10):
+    """
+    Fetch all data (project, reports, orgs, publications) for many
+    project ids concurrently. Once a project has been fetched, its result
+    reports and publications are fetched in parallel. All requests share
+    the global rate limit of :obj:`hit_api`, so concurrency only
+    serves to use the full request budget when requests are slow.
+
+    Args:
+        rcns (iterable): Project ids.
+        max_workers (int): Number of concurrent requests, which is also
+                           the number of projects in progress at any time.
+    Yields:
+        rcn, data (tuple): Project id, and the (project, orgs, reports, pubs)
+                           of the project, in order of completion.
+    """
+    rcns = iter(rcns)
+    pending = {}  # future --> (rcn, part)
+    in_progress = {}  # rcn --> collected parts of the project
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        def submit_project():
+            for rcn in rcns:
+                future = executor.submit(hit_api, rcn=rcn,
+                                         content_type='project')
+                pending[future] = (rcn, 'project')
+                return
+
+        for _ in range(max_workers):
+            submit_project()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                rcn, part = pending.pop(future)
+                value = future.result()
+                if part == 'project' and value is None:
+                    submit_project()
+                    yield rcn, (None, None, None, None)
+                    continue
+                if part == 'project':
+                    project, orgs, report_rcns = _parse_project(value)
+                    # Fan out requests for the reports and publications
+                    for i, report_rcn in enumerate(report_rcns):
+                        _future = executor.submit(hit_api, rcn=report_rcn,
+                                                  content_type='result')
+                        pending[_future] = (rcn, i)
+                    pending[executor.submit(fetch_pubs, rcn)] = (rcn, 'pubs')
+                    in_progress[rcn] = {'project': project, 'orgs': orgs,
+                                        'reports': [None]*len(report_rcns),
+                                        'remaining': len(report_rcns) + 1}
+                    continue
+                state = in_progress[rcn]
+                if part == 'pubs':
+                    state['pubs'] = value
+                else:
+                    state['reports'][part] = value
+                state['remaining'] -= 1
+                if state['remaining'] > 0:
+                    continue
+                del in_progress[rcn]
+                submit_project()
+                yield rcn, (state['project'], state['orgs'],
+                            _parse_reports(state['reports']), state['pubs'])
@@ -0,0 +1,63 @@
+"""
+benchmark_filter_pubs
+=====================
+
+Time :obj:`filter_pubs` against the previous implementation (which
+copied the set of seen pids for every publication) on synthetic
+OpenAIRE outputs of increasingly large projects. Run with:
+
+    python nesta/packages/cordis/tests/benchmark_filter_pubs.py
+"""
+
+import random
+import time
+
+from nesta.packages.cordis.cordis_api import filter_pubs
+
+
+def filter_pubs_quadratic(pubs):
+    """The previous implementation of filter_pubs"""
+    _pubs, pids = [], set()
+    for p in pubs['datasets'] + pubs['publications']:
+        if 'pid' not in p:
+            continue
+        already_found = any(id in pids for id in p['pid'])
+        pids = pids.union(p['pid'])
+        if already_found or len(p['pid']) == 0:
+            continue
+        _pubs.append(dict(id=p['pid'][0], **p))
+    return _pubs
+
+
+def synthetic_pubs(n, seed=42):
+    """Publications and datasets with 1-3 pids each, a fraction of which
+    are duplicates of earlier outputs, or have no pids at all."""
+    rng = random.Random(seed)
+    outputs, all_pids = [], []
+    for i in range(n):
+        pids = [f'10.{i}/{j}' for j in range(rng.randint(1, 3))]
+        if all_pids and rng.random() < 0.2:
+            pids.append(rng.choice(all_pids))
+        all_pids += pids
+        output = {'title': f'output {i}', 'pid': pids}
+        if rng.random() < 0.05:
+            output.pop('pid')
+        outputs.append(output)
+    return {'datasets': outputs[:n//10], 'publications': outputs[n//10:]}
+
+
+def run(sizes=(100, 1000, 10000, 20000)):
+    for n in sizes:
+        pubs = synthetic_pubs(n)
+        times = []
+        for func in (filter_pubs_quadratic, filter_pubs):
+            start = time.time()
+            result = func(pubs)
+            times.append(time.time() - start)
+        assert result == filter_pubs_quadratic(pubs)
+        print(f"{n:>6} outputs: {1000*times[0]:8.1f} ms --> "
+              f"{1000*times[1]:6.1f} ms")
+
+
+if __name__ == "__main__":
+    run()
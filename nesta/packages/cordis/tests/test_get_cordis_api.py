@@ -1,9 +1,18 @@
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import json
+import socketserver
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
 import pytest
 from unittest import mock
 from nesta.packages.cordis.cordis_api import hit_api
 from nesta.packages.cordis.cordis_api import extract_fields
 from nesta.packages.cordis.cordis_api import get_framework_ids
 from nesta.packages.cordis.cordis_api import fetch_data
+from nesta.packages.cordis.cordis_api import fetch_many
+from nesta.packages.cordis.cordis_api import filter_pubs
 
 PKGPATH = 'nesta.packages.cordis.cordis_api.{}'
 
@@ -61,3 +70,91 @@ def test_fetch_data(mocked_extract, mocked_api):
     response = fetch_data(None)
     assert type(response) is tuple
     assert len(response) == 4
+
+
+def test_filter_pubs():
+    pubs = {'datasets': [{'pid': ['a', 'b']}, {'title': 'no pid'}],
+            'publications': [{'pid': []},
+                             {'pid': ['c', 'b']},  # duplicate of the first
+                             {'pid': ['c', 'd']},  # duplicate via 'c'
+                             {'pid': ['e']}]}
+    assert filter_pubs(pubs) == [{'id': 'a', 'pid': ['a', 'b']},
+                                 {'id': 'e', 'pid': ['e']}]
+
+
+def _project(rcn):
+    reports = [{'rcn': f'{rcn}-{i}', 'title': 'report'} for i in range(2)]
+    return {'information': {'rcn': rcn, 'title': f'project {rcn}',
+                            'relatedResultsReport': reports},
+            'objective': {'objective': 'an objective'},
+            'organizations': {'participants': [{'name': 'an org',
+                                                'organizationId': rcn}]}}
+
+
+class CordisStandIn(BaseHTTPRequestHandler):
+    """Local stand-in for the Cordis API, which records the maximum
+    number of concurrent requests"""
+    lock = threading.Lock()
+    live = 0
+    max_live = 0
+
+    def do_GET(self):
+        with self.lock:
+            type(self).live += 1
+            type(self).max_live = max(self.max_live, self.live)
+        time.sleep(0.3)
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        rcn, status = params['rcn'], 200
+        if url.path.endswith('openaire'):
+            payload = {'datasets': [],
+                       'publications': [{'pid': [f'doi-{rcn}']}]}
+        elif rcn == 'missing':
+            status = 404
+            payload = {'errorType': 'ica', 'message': ''}
+        elif params['contenttype'] == 'project':
+            payload = _project(rcn)
+        else:
+            payload = {'rcn': rcn, 'title': 'report', 'teaser': 'teaser'}
+        body = json.dumps({'payload': payload}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(body)
+        with self.lock:
+            type(self).live -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+class _Server(socketserver.ThreadingMixIn, HTTPServer):
+    """A threaded HTTP server (http.server.ThreadingHTTPServer is 3.7+)"""
+    daemon_threads = True
+
+
+@pytest.fixture
+def cordis_stand_in():
+    server = _Server(('127.0.0.1', 0), CordisStandIn)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    prefix = f'http://127.0.0.1:{server.server_port}/{{}}'
+    with mock.patch(PKGPATH.format('TOP_PREFIX'), prefix):
+        yield CordisStandIn
+    server.shutdown()
+
+
+def test_fetch_many(cordis_stand_in):
+    rcns = ['1', 'missing', '2', '3']
+    results = dict(fetch_many(rcns, max_workers=4))
+    assert results.keys() == set(rcns)
+    assert results['missing'] == (None, None, None, None)
+    # Requests for the projects, reports and publications overlapped
+    assert cordis_stand_in.max_live > 1
+    for rcn in ['1', '2', '3']:
+        assert results[rcn] == fetch_data(rcn)
+        project, orgs, reports, pubs = results[rcn]
+        assert project['title'] == f'project {rcn}'
+        assert orgs == [{'name': 'an org', 'organization_id': rcn}]
+        assert [r['rcn'] for r in reports] == [f'{rcn}-0', f'{rcn}-1']
+        assert [p['id'] for p in pubs] == [f'doi-{rcn}']
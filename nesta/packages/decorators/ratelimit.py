@@ -2,26 +2,167 @@
 ratelimit
 =========
 
-Apply rate limiting at a threshold per second
+Apply rate limiting at a threshold per second. Limits are
+implemented as a token bucket, which can be shared between threads,
+coroutines and (via a lock file) processes, so that concurrent callers
+collectively honour an API's published quota.
 '''
 
+from contextlib import contextmanager
+from functools import wraps
+import asyncio
+import fcntl
+import os
+import threading
 import time
 
-def ratelimit(max_per_second):
+
+class RateLimiter:
+    '''Token-bucket rate limiter which can be shared between threads
+    and coroutines, such that the combined rate of hits
+    (i.e. calls to :obj:`wait` or :obj:`wait_async`) does not exceed the
+    threshold. Up to `burst` hits are permitted back-to-back, after which
+    tokens are replenished at `max_per_second`.
+
+    Hits reserve their slot immediately and then sleep outside of the lock,
+    so waiting never blocks other callers from reserving a slot.
+    If a `lock_file` is specified, the bucket state is kept in the file
+    (under an exclusive lock) and is therefore shared between all
+    processes on the host which use the same file.
+
+    Args:
+        max_per_second (float): Number of permitted hits per second
+        burst (int): Capacity of the bucket, i.e. number of hits which
+                     are permitted back-to-back.
+        start_full (bool): Whether the bucket starts full (otherwise the
+                           first hit waits for a token to be replenished).
+        lock_file (str): Optional path of a file for sharing the
+                         bucket between processes.
+    '''
+    def __init__(self, max_per_second, burst=1, start_full=True,
+                 lock_file=None):
+        if burst < 1:
+            raise ValueError(f'burst must be at least 1, got {burst}')
+        self.min_interval = 1.0 / float(max_per_second)
+        self.burst = burst
+        self.lock_file = lock_file
+        self._lock = threading.Lock()
+        # The bucket is represented by the time at which it will be full
+        # (the "theoretical arrival time" of the generic cell rate algorithm)
+        self._full_time = self._now()
+        if not start_full:
+            self._full_time += burst * self.min_interval
+        if lock_file is not None:
+            with self._shared_state() as state:
+                if state[0] is None:
+                    state[0] = self._full_time
+
+    def _now(self):
+        # Wall time is used across processes, since monotonic clocks
+        # aren't guaranteed to share a reference point between processes
+        return time.monotonic() if self.lock_file is None else time.time()
+
+    @contextmanager
+    def _shared_state(self):
+        '''Lock the shared state file, and yield its contents as
+        a single-item list, which is written back on exit.'''
+        fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o666)
+        with os.fdopen(fd, 'r+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                content = f.read().strip()
+                state = [float(content) if content else None]
+                yield state
+                f.seek(0)
+                f.truncate()
+                f.write(repr(state[0]))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _update(self, update):
+        '''Apply an update function to the state of the bucket, which
+        returns the new state and a value to return.'''
+        with self._lock:
+            if self.lock_file is None:
+                self._full_time, value = update(self._full_time)
+                return value
+            with self._shared_state() as state:
+                state[0], value = update(state[0])
+        return value
+
+    def _reserve(self, full_time):
+        now = self._now()
+        full_time = max(full_time, now)
+        left_to_wait = full_time - (self.burst - 1) * self.min_interval - now
+        return full_time + self.min_interval, left_to_wait
+
+    def _release(self, full_time):
+        return max(full_time, self._now() + self.min_interval), None
+
+    def reserve(self):
+        '''Reserve the next hit, without waiting for it.
+
+        Returns:
+            left_to_wait (float): Seconds until the hit is permitted.
+        '''
+        return self._update(self._reserve)
+
+    def release(self):
+        '''Record that a hit has completed, such that the next token
+        is not replenished until a full interval from now. This means that
+        the interval is counted from the end of (e.g.) a slow request
+        rather than from its start.'''
+        self._update(self._release)
+
+    def wait(self):
+        '''Block until the next hit is permitted.'''
+        left_to_wait = self.reserve()
+        if left_to_wait > 0:
+            time.sleep(left_to_wait)
+
+    async def wait_async(self):
+        '''Sleep (without blocking the event loop) until the
+        next hit is permitted.'''
+        left_to_wait = self.reserve()
+        if left_to_wait > 0:
+            await asyncio.sleep(left_to_wait)
+
+
+def ratelimit(max_per_second, burst=1, lock_file=None):
     '''
+    Decorate a function or coroutine function such that it is called
+    no more than `max_per_second`, including when called concurrently.
+    As before, the bucket starts empty, so that the first call also waits,
+    and the interval is counted from the end of each call.
+
     Args:
         max_per_second (float): Number of permitted hits per second
+        burst (int): Number of calls which are permitted back-to-back.
+        lock_file (str): Optional path of a file for sharing the limit
+                         between processes.
     '''
-    min_interval = 1.0 / float(max_per_second)
     def decorate(func):
-        last_time_called = [time.clock()]  # `list`s are globally persistified
+        limiter = RateLimiter(max_per_second, burst=burst, start_full=False,
+                              lock_file=lock_file)
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_rate_limited(*args, **kargs):
+                await limiter.wait_async()
+                try:
+                    return await func(*args, **kargs)
+                finally:
+                    limiter.release()
+            async_rate_limited.limiter = limiter
+            return async_rate_limited
+
+        @wraps(func)
         def rate_limited(*args, **kargs):
-            elapsed = time.clock() - last_time_called[0]
-            left_to_wait = min_interval - elapsed
-            if left_to_wait > 0:
-                time.sleep(left_to_wait)
-            ret = func(*args,**kargs)
-            last_time_called[0] = time.clock()
-            return ret
+            limiter.wait()
+            try:
+                return func(*args, **kargs)
+            finally:
+                limiter.release()
+        rate_limited.limiter = limiter
         return rate_limited  # Note: returning a method
     return decorate  # Note: returning a method
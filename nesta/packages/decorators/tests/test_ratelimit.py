@@ -1,7 +1,10 @@
+import asyncio
 import pytest
+import threading
 import time
 
 from nesta.packages.decorators.ratelimit import ratelimit
+from nesta.packages.decorators.ratelimit import RateLimiter
 
 class TestRateLimit():
     def test_rate_limit(self):
@@ -14,3 +17,57 @@ class TestRateLimit():
             assert time.time() - previous_time > 1
             previous_time = time.time()
 
+
+
+class TestRateLimiter():
+    def test_rate_limiter_is_shared_between_threads(self):
+        limiter = RateLimiter(max_per_second=20)
+        start = time.time()
+        threads = [threading.Thread(target=limiter.wait) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # 10 hits at 20 per second, the first of which is immediate
+        assert time.time() - start > 0.4
+
+    def test_rate_limiter_burst(self):
+        limiter = RateLimiter(max_per_second=10, burst=5)
+        start = time.time()
+        for _ in range(5):
+            limiter.wait()
+        assert time.time() - start < 0.1
+        limiter.wait()
+        assert time.time() - start > 0.09
+
+    def test_rate_limiter_wait_async(self):
+        limiter = RateLimiter(max_per_second=20)
+        async def hit_many():
+            await asyncio.gather(*(limiter.wait_async() for _ in range(10)))
+        start = time.time()
+        asyncio.get_event_loop().run_until_complete(hit_many())
+        assert time.time() - start > 0.4
+
+    def test_rate_limiter_lock_file_is_shared(self, tmp_path):
+        lock_file = str(tmp_path / 'ratelimit.lock')
+        limiters = [RateLimiter(max_per_second=20, lock_file=lock_file)
+                    for _ in range(2)]
+        start = time.time()
+        for _ in range(5):
+            for limiter in limiters:
+                limiter.wait()
+        # 10 hits at 20 per second, between two "processes"
+        assert time.time() - start > 0.4
+
+    def test_rate_limit_concurrent_calls(self):
+        calls = []
+        wrapped = ratelimit(20)(lambda: calls.append(time.time()))
+        start = time.time()
+        threads = [threading.Thread(target=wrapped) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(calls) == 5
+        # 5 calls at 20 per second, the first of which also waits
+        assert time.time() - start > 0.24
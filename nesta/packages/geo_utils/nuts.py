@@ -0,0 +1,115 @@
+"""
+nuts
+====
+
+Batched lookup of NUTS regions from (lat, lon) coordinates. Rather than
+testing each coordinate against every NUTS shape (as :obj:`NutsFinder.find`
+does), the shapes are indexed once in an STRtree, duplicate coordinates are
+resolved only once, and results are cached by coordinate and by GRID id.
+"""
+
+from shapely.geometry import Point, shape
+from shapely.geometry.base import BaseGeometry
+from shapely.prepared import prep
+from shapely.strtree import STRtree
+
+
+def _coordinate(lat, lon):
+    """Hashable (lat, lon) key, or None if the coordinate is missing.
+    Note: coordinates from MySQL are Decimals, which are converted to float."""
+    if lat is None or lon is None:
+        return None
+    return (float(lat), float(lon))
+
+
+class BatchNutsFinder:
+    """Drop-in replacement for :obj:`NutsFinder.find`, for resolving many
+    coordinates at once. The results are identical to :obj:`NutsFinder.find`:
+    the properties of every NUTS shape containing the coordinate,
+    ordered by NUTS level.
+
+    Args:
+        features (list): GeoJSON features of the NUTS shapes, with
+                         'LEVL_CODE' and 'NUTS_ID' properties.
+    """
+    def __init__(self, features):
+        self.properties = [f['properties'] for f in features]
+        # Note: the STRtree of older shapely releases (e.g. the 1.6 pinned
+        # by nuts_finder) doesn't keep the shapes alive, so they're kept here
+        self._shapes = [shape(f['geometry']) for f in features]
+        self.tree = STRtree(self._shapes)
+        self._shape_idxs = {id(_shape): idx
+                            for idx, _shape in enumerate(self._shapes)}
+        self._prepared = [prep(_shape) for _shape in self._shapes]
+        self._coordinate_cache = {}
+        self._grid_cache = {}
+
+    @classmethod
+    def from_nuts_finder(cls, nuts_finder):
+        """Index the NUTS shapes already loaded by a :obj:`NutsFinder`.
+
+        Args:
+            nuts_finder (NutsFinder): A NutsFinder instance.
+        Returns:
+            finder (BatchNutsFinder): Indexed NUTS shapes.
+        """
+        return cls(nuts_finder.shapes['features'])
+
+    def _candidates(self, point):
+        """Indexes of the shapes whose bounding boxes contain the point."""
+        # Note: shapely < 2 returns the (indexed) shapes rather than indexes
+        return [self._shape_idxs[id(hit)] if isinstance(hit, BaseGeometry)
+                else int(hit) for hit in self.tree.query(point)]
+
+    def _resolve(self, coordinates):
+        """Resolve and cache any coordinates which haven't been seen before,
+        testing only the shapes returned by the STRtree."""
+        for coordinate in set(coordinates):
+            if coordinate is None or coordinate in self._coordinate_cache:
+                continue
+            lat, lon = coordinate
+            point = Point(lon, lat)
+            shape_idxs = [idx for idx in self._candidates(point)
+                          if self._prepared[idx].contains(point)]
+            # Order by level, and then by the original order of the shapes
+            shape_idxs.sort(key=lambda idx: (self.properties[idx]['LEVL_CODE'],
+                                             idx))
+            self._coordinate_cache[coordinate] = [self.properties[idx]
+                                                  for idx in shape_idxs]
+
+    def find_many(self, latlons):
+        """Find the NUTS regions of many coordinates.
+
+        Args:
+            latlons (list): (lat, lon) pairs, where either may be None.
+        Returns:
+            nuts (list): For each coordinate, a list of the properties of
+                         the NUTS shapes containing it (empty if the
+                         coordinate is missing).
+        """
+        coordinates = [_coordinate(lat, lon) for lat, lon in latlons]
+        self._resolve(coordinates)
+        return [self._coordinate_cache.get(c, []) for c in coordinates]
+
+    def find(self, lat, lon):
+        """Find the NUTS regions of a single coordinate, with the same
+        signature as :obj:`NutsFinder.find`."""
+        nuts, = self.find_many([(lat, lon)])
+        return nuts
+
+    def find_by_grid_id(self, grid_latlons):
+        """Find the NUTS regions of GRID institutes, which are cached by
+        GRID id so that they are only ever resolved once.
+
+        Args:
+            grid_latlons (dict): Mapping of GRID id to (lat, lon).
+        Returns:
+            nuts (dict): Mapping of GRID id to the list of properties of
+                         the NUTS shapes containing the institute.
+        """
+        new = [grid_id for grid_id in grid_latlons
+               if grid_id not in self._grid_cache]
+        for grid_id, nuts in zip(new, self.find_many(grid_latlons[grid_id]
+                                                      for grid_id in new)):
+            self._grid_cache[grid_id] = nuts
+        return {grid_id: self._grid_cache[grid_id] for grid_id in grid_latlons}
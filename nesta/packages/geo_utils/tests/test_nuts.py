@@ -0,0 +1,83 @@
+from decimal import Decimal
+import random
+
+import pytest
+from unittest import mock
+from shapely.geometry import Point, box, mapping, shape
+
+from nesta.packages.geo_utils.nuts import BatchNutsFinder
+
+
+def _feature(nuts_id, level, *bounds):
+    return {'type': 'Feature',
+            'properties': {'NUTS_ID': nuts_id, 'LEVL_CODE': level},
+            'geometry': mapping(box(*bounds))}
+
+
+@pytest.fixture
+def features():
+    # Note: deliberately not ordered by level
+    return [_feature('AB1', 1, 0, 0, 5, 10),
+            _feature('AB', 0, 0, 0, 10, 10),
+            _feature('AB2', 1, 5, 0, 10, 10),
+            _feature('AB11', 2, 0, 0, 5, 5),
+            _feature('CD', 0, 20, 20, 30, 30),
+            _feature('CD1', 1, 20, 20, 30, 30)]
+
+
+def _find(features, lat, lon):
+    """The NutsFinder.find algorithm"""
+    point = Point(lon, lat)
+    nuts = [f['properties'] for f in features
+            if shape(f['geometry']).contains(point)]
+    return sorted(nuts, key=lambda row: row['LEVL_CODE'])
+
+
+def test_find(features):
+    finder = BatchNutsFinder(features)
+    assert [n['NUTS_ID'] for n in finder.find(lat=2, lon=1)] == ['AB', 'AB1',
+                                                                'AB11']
+    assert [n['NUTS_ID'] for n in finder.find(lat=7, lon=7)] == ['AB', 'AB2']
+    assert finder.find(lat=-1, lon=-1) == []
+    assert finder.find(lat=None, lon=1) == []
+    assert finder.find(lat=Decimal('25.5'), lon=Decimal('25.5')) == \
+        _find(features, 25.5, 25.5)
+
+
+def test_find_many_matches_nuts_finder(features):
+    random.seed(0)
+    latlons = [(random.uniform(-5, 35), random.uniform(-5, 35))
+               for _ in range(200)]
+    latlons += latlons[:50] + [(None, None)]  # duplicates & missing
+    finder = BatchNutsFinder(features)
+    nuts = finder.find_many(latlons)
+    assert len(nuts) == len(latlons)
+    for (lat, lon), _nuts in zip(latlons[:-1], nuts):
+        assert _nuts == _find(features, lat, lon)
+    assert nuts[-1] == []
+
+
+def test_find_many_resolves_each_coordinate_once(features):
+    finder = BatchNutsFinder(features)
+    with mock.patch.object(finder, 'tree', wraps=finder.tree) as tree:
+        finder.find_many([(1, 1), (1, 1), (25, 25)])
+        finder.find_many([(1, 1), (25, 25)])
+        finder.find(lat=1, lon=1)
+    # Once per distinct coordinate
+    assert tree.query.call_count == 2
+
+
+def test_find_by_grid_id(features):
+    finder = BatchNutsFinder(features)
+    nuts = finder.find_by_grid_id({'grid.1': (1, 1), 'grid.2': (None, None)})
+    assert nuts == {'grid.1': _find(features, 1, 1), 'grid.2': []}
+    # Cached by GRID id
+    assert finder.find_by_grid_id({'grid.1': (25, 25)}) == {'grid.1':
+                                                            nuts['grid.1']}
+
+
+def test_from_nuts_finder(features):
+    nuts_finder = mock.Mock()
+    nuts_finder.shapes = {'type': 'FeatureCollection', 'features': features}
+    finder = BatchNutsFinder.from_nuts_finder(nuts_finder)
+    assert finder.find(lat=1, lon=1) == _find(features, 1, 1)
@@ -1,6 +1,10 @@
+import os
+import pickle
 import sys
 from unicodedata import category
-from collections import Counter, defaultdict
+from collections import Counter
+from functools import lru_cache
+import numpy as np
 import pandas as pd
 from nltk.util import ngrams
 from nesta.packages.misc_utils.jaccard import fast_nested_jaccard
@@ -11,9 +15,17 @@ from nesta.packages.grid.grid import grid_name_lookup
 from nesta.core.orms.orm_utils import get_mysql_engine
 
 
-"""All unicode punctuation characters"""
-PUNCT = "".join(chr(i) for i in range(sys.maxunicode)  
-                if category(chr(i)).startswith("P"))
+@lru_cache()
+def punct_table():
+    """Translation table mapping all unicode punctuation characters to
+    a space. This is built lazily, since scanning every code point
+    takes a noticeable amount of time, and then reused by every call.
+
+    Returns:
+        table (dict): Translation table for :obj:`str.translate`
+    """
+    return {i: ' ' for i in range(sys.maxunicode)
+            if category(chr(i)).startswith("P")}
 
 
 def hashable_tokens(string_to_split):
@@ -41,8 +53,7 @@ def process_name(name):
     Returns:
         hashable_tokens (tuple): Hashable, standardised tuple of tokens.
     """
-    trans = str.maketrans(PUNCT, ' '*len(PUNCT)) # map punct to space
-    _name = name.translate(trans)  # remove punctuation
+    _name = name.translate(punct_table())  # map punctuation to space
     _name = _name.lower()  # lowercase
     return hashable_tokens(_name)
 
@@ -66,38 +77,117 @@ def append_disputed_countries(grid_ctrys):
     return grid_ctrys.union(_disputed_ctrys)
 
 
-def generate_grid_lookups():
+# Bump if the format of the GRID lookups changes
+GRID_LOOKUPS_VERSION = 1
+
+
+def grid_release_fingerprint(engine):
+    """Identify the GRID release in the database from the row count and
+    maximum id of the institutes and aliases tables, which are read from
+    the primary key indexes rather than by scanning the tables. Note that
+    rows edited in place are not detected, so an explicit `grid_release`
+    should be given if the tables are ever patched rather than reloaded.
+
+    Args:
+        engine (sqlalchemy.Engine): Connection to the GRID tables.
+    Returns:
+        grid_release (str): Identifier of the GRID release.
+    """
+    queries = ("SELECT COUNT(*), MAX(id) FROM grid_institutes",
+               "SELECT COUNT(*), MAX(id) FROM grid_aliases")
+    with engine.connect() as connection:
+        stats = [tuple(connection.execute(query).first())
+                 for query in queries]
+    return '-'.join(str(value) for row in stats for value in row)
+
+
+def grid_cache_dir():
+    """Local directory of GRID lookup artifacts, from the
+    GRID_LOOKUPS_CACHE_DIR environmental variable if set, otherwise
+    the grid_lookups directory in this package."""
+    default = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'grid_lookups')
+    return os.environ.get('GRID_LOOKUPS_CACHE_DIR', default)
+
+
+def grid_lookups_path(cache_dir, grid_release):
+    """Local path of the GRID lookups artifact for a given GRID release."""
+    filename = f"grid_lookups-v{GRID_LOOKUPS_VERSION}-{grid_release}.pickle"
+    return os.path.join(cache_dir, filename)
+
+
+def build_grid_lookups(engine):
+    """Build the GRID lookups (see :obj:`generate_grid_lookups`)
+    from the database, with grouped operations over all names at once."""
     # Generate GRID ID-country lookup
-    engine = get_mysql_engine("MYSQLDB", "mysqldb", "production")
-    chunks = pd.read_sql_table('grid_institutes', engine,
-                               columns=["id", "city", "country_code"],
-                               chunksize=1000)
-    grid_df = pd.concat([df for df in chunks])
+    grid_df = pd.read_sql("SELECT id, country_code FROM grid_institutes",
+                          engine)
     alpha2_to_alpha3 = get_iso2_to_iso3_lookup()
-    grid_ctry_lookup = {row['id']:
-                        alpha2_to_alpha3[row['country_code']]
-                        for _, row in grid_df.iterrows()}
+    grid_ctry_lookup = dict(zip(grid_df['id'],
+                                grid_df['country_code'].map(
+                                    alpha2_to_alpha3.__getitem__)))
 
     # Generate reverse lookup
-    _lookup = grid_name_lookup(engine)
-    lookup = defaultdict(set)
-    name_id_lookup = defaultdict(set)
-    for name, ids in _lookup.items():
-        _name = process_name(name)
-        for _id in ids:
-            lookup[_id].add(_name)
-        name_id_lookup[_name] = name_id_lookup[_name].union(ids)
-    # Don't want defdict behaviour after this point
-    name_id_lookup = {k: v for k, v in name_id_lookup.items()}
-
-    # Generate list of all names for the inst, including
+    rows = [(name, grid_id)
+            for name, grid_ids in grid_name_lookup(engine).items()
+            for grid_id in grid_ids]
+    ids = pd.DataFrame(rows, columns=['name', 'id'])
+    # Note: names are tuples, so are factorized (rather than grouped on
+    # directly) to stop pandas from interpreting them as a MultiIndex
+    processed = ids['name'].map(process_name).values
+    codes, names = pd.factorize(processed)
+    ids_by_name = ids['id'].groupby(codes).agg(set)
+    name_id_lookup = dict(zip(names[ids_by_name.index], ids_by_name))
+
+    # Generate list of all names for the institutes, including
     # duplicates and aliases
-    grid_df['names'] = grid_df.apply(lambda row:
-                                     lookup[row['id']], axis=1)
-    all_grid_names = set().union(*grid_df.names)
+    in_grid = np.unique(codes[ids['id'].isin(grid_df['id']).values])
+    all_grid_names = set(names[in_grid])
     return all_grid_names, name_id_lookup, grid_ctry_lookup
 
 
+def generate_grid_lookups(grid_release=None, cache_dir=None, engine=None):
+    """Generate the GRID lookups used by :obj:`MatchEvaluator`. The lookups
+    are persisted in a cache directory as a versioned artifact for the
+    GRID release, and are only rebuilt from the database for new GRID
+    releases.
+
+    Args:
+        grid_release (str): Identifier of the GRID release. Defaults to the
+                            row counts and max ids of the GRID tables
+                            (see :obj:`grid_release_fingerprint`).
+        cache_dir (str): Local directory of GRID lookup artifacts,
+                         defaults to :obj:`grid_cache_dir`.
+        engine (sqlalchemy.Engine): Connection to the GRID tables,
+                                    defaults to the production database.
+    Returns:
+        all_grid_names (set): Processed names of all GRID institutes.
+        name_id_lookup (dict): Lookup of GRID names to IDs
+                               (including aliases)
+        grid_ctry_lookup (dict): Lookup of GRID ID to country code
+    """
+    if cache_dir is None:
+        cache_dir = grid_cache_dir()
+    if grid_release is None:
+        if engine is None:
+            engine = get_mysql_engine("MYSQLDB", "mysqldb", "production")
+        grid_release = grid_release_fingerprint(engine)
+    path = grid_lookups_path(cache_dir, grid_release)
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    if engine is None:
+        engine = get_mysql_engine("MYSQLDB", "mysqldb", "production")
+    lookups = build_grid_lookups(engine)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write atomically, so that concurrent readers never see a partial file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(lookups, f)
+    os.replace(tmp_path, path)
+    return lookups
+
+
 def _evaluate_matches(match_scores, iso3_code,
                       name_id_lookup, grid_ctry_lookup,
                       score_threshold=1,
@@ -208,10 +298,14 @@ class MatchEvaluator:
                                    Long names with exact matches will be
                                    accepted, regardless of the country
                                    match.
+        grid_release (str): GRID release, for loading the GRID lookups
+                            (see :obj:`generate_grid_lookups`).
+        cache_dir (str): Local directory of GRID lookup artifacts
+                         (see :obj:`grid_cache_dir`).
     """
     def __init__(self, score_threshold=0.95, multinat_threshold=3,
                  multimatch_threshold=2, long_name_threshold=4,
-                 nested_threshold=0.8):
+                 nested_threshold=0.8, grid_release=None, cache_dir=None):
         self.nested_threshold = nested_threshold
         self.score_threshold = score_threshold
         self.mn_threshold = multinat_threshold
@@ -219,7 +313,8 @@ class MatchEvaluator:
         self.ln_threshold = long_name_threshold
 
         # Generate GRID lookup tables
-        lookups = generate_grid_lookups()
+        lookups = generate_grid_lookups(grid_release=grid_release,
+                                        cache_dir=cache_dir)
         all_grid_names, name_id_lookup, grid_ctry_lookup = lookups
         self.all_grid_names = all_grid_names
         self.name_id_lookup = name_id_lookup
@@ -0,0 +1,70 @@
+"""
+benchmark_grid_matcher
+======================
+
+Import time of :obj:`grid_matcher` and throughput (names/second) of
+:obj:`process_name`, against the previous implementation (which scanned
+every unicode code point for punctuation at import, and built a
+translation table on every call). Run with:
+
+    python nesta/packages/grid/tests/benchmark_grid_matcher.py
+"""
+
+import random
+import subprocess
+import sys
+import time
+from unicodedata import category
+
+IMPORT = "import nesta.packages.grid.grid_matcher"
+
+
+def old_punct():
+    return "".join(chr(i) for i in range(sys.maxunicode)
+                   if category(chr(i)).startswith("P"))
+
+
+def old_process_name(name, punct, hashable_tokens):
+    trans = str.maketrans(punct, ' '*len(punct))
+    _name = name.translate(trans)
+    _name = _name.lower()
+    return hashable_tokens(_name)
+
+
+def import_time():
+    start = time.time()
+    subprocess.run([sys.executable, "-c", IMPORT], check=True)
+    return time.time() - start
+
+
+def synthetic_names(n, seed=42):
+    rng = random.Random(seed)
+    words = ['University', 'of', 'Institute', 'Technology', 'Nesta',
+             'Ltd.', '(UK)', 'Co-operative', '«Société»', 'R&D', 'Inc,']
+    return [' '.join(rng.choices(words, k=rng.randint(2, 6)))
+            for _ in range(n)]
+
+
+def run(n_names=2000):
+    start = time.time()
+    punct = old_punct()
+    old_scan = time.time() - start
+    print(f"Import: {import_time():.2f}s, of which the previous "
+          f"PUNCT scan at import added {old_scan:.2f}s")
+
+    from nesta.packages.grid.grid_matcher import hashable_tokens
+    from nesta.packages.grid.grid_matcher import process_name
+    names = synthetic_names(n_names)
+    start = time.time()
+    old = [old_process_name(name, punct, hashable_tokens) for name in names]
+    old_rate = n_names / (time.time() - start)
+    process_name(names[0])  # Build the lazy table
+    start = time.time()
+    new = [process_name(name) for name in names]
+    new_rate = n_names / (time.time() - start)
+    assert old == new
+    print(f"process_name: {old_rate:,.0f} --> {new_rate:,.0f} names/s")
+
+
+if __name__ == "__main__":
+    run()
@@ -1,9 +1,18 @@
 from unittest import mock
+import os
+
+import pytest
+from sqlalchemy import create_engine, event
+
+from nesta.core.orms.grid_orm import Alias, Institute
 
 from nesta.packages.grid.grid_matcher import hashable_tokens
 from nesta.packages.grid.grid_matcher import process_name
+from nesta.packages.grid.grid_matcher import punct_table
 from nesta.packages.grid.grid_matcher import append_disputed_countries
 from nesta.packages.grid.grid_matcher import generate_grid_lookups
+from nesta.packages.grid.grid_matcher import grid_lookups_path
+from nesta.packages.grid.grid_matcher import grid_release_fingerprint
 from nesta.packages.grid.grid_matcher import _evaluate_matches
 from nesta.packages.grid.grid_matcher import MatchEvaluator
 
@@ -34,6 +43,13 @@ def test_process_name(mocked_hashable_tokens):
     assert process_name(a) == _a
 
 
+def test_punct_table():
+    table = punct_table()
+    assert table is punct_table()  # built once
+    assert all(table[ord(c)] == ' ' for c in '¡!,.«»-()&')
+    assert all(ord(c) not in table for c in 'aZ1 €+')
+
+
 def test_append_disputed_countries():
     grid_ctrys = {'UGA', 'GBR', 'TWN'}
     _grid_ctrys = append_disputed_countries(grid_ctrys)
@@ -187,3 +203,98 @@ def test_MatchEvaluator(mocked_generate_grid_lookups):
     me = MatchEvaluator(score_threshold=0.85, nested_threshold=0.6)
     matches = me.generate_matches(data)
     assert matches == {'first': {'grid_ids': {1}, 'score': 0.875}} # appl inc, USA matches to apple inc, USA
+
+
+@pytest.fixture
+def grid_engine(tmp_path):
+    """SQLite fixture of the GRID tables"""
+    engine = create_engine(f'sqlite:///{tmp_path}/grid.db')
+
+    @event.listens_for(engine, 'connect')
+    def add_collation(dbapi_connection, connection_record):
+        dbapi_connection.create_collation('utf8_bin',
+                                          lambda a, b: (a > b) - (a < b))
+
+    for _class in (Institute, Alias):
+        _class.__table__.create(engine)
+    with engine.connect() as connection:
+        connection.execute(Institute.__table__.insert(), [
+            {'id': 'grid.1', 'name': 'Nesta', 'country_code': 'GB'},
+            {'id': 'grid.2', 'name': 'IBM (United Kingdom)',
+             'country_code': 'GB'},
+            {'id': 'grid.3', 'name': 'IBM (France)', 'country_code': 'FR'},
+            {'id': 'grid.4', 'name': 'Unknown Place', 'country_code': None}])
+        connection.execute(Alias.__table__.insert(), [
+            {'grid_id': 'grid.1', 'alias': 'NESTA, Inc.'},
+            {'grid_id': 'grid.3', 'alias': 'IBM'}])
+    return engine
+
+
+@pytest.fixture
+def default_cache_dir(tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / 'default_cache')
+    monkeypatch.setenv('GRID_LOOKUPS_CACHE_DIR', cache_dir)
+    return cache_dir
+
+
+@mock.patch(PATH.format('get_iso2_to_iso3_lookup'),
+            return_value={'GB': 'GBR', 'FR': 'FRA', None: None})
+def test_generate_grid_lookups(mocked_iso, grid_engine, default_cache_dir):
+    all_grid_names, name_id_lookup, grid_ctry_lookup = \
+        generate_grid_lookups(engine=grid_engine)
+    # Cached in the default directory
+    assert len(os.listdir(default_cache_dir)) == 1
+    assert grid_ctry_lookup == {'grid.1': 'GBR', 'grid.2': 'GBR',
+                                'grid.3': 'FRA', 'grid.4': None}
+    assert name_id_lookup == {('nesta',): {'grid.1'},
+                              ('inc', 'nesta'): {'grid.1'},
+                              ('ibm',): {'grid.2', 'grid.3'},
+                              ('ibm', 'kingdom', 'united'): {'grid.2'},
+                              ('france', 'ibm'): {'grid.3'},
+                              ('place', 'unknown'): {'grid.4'}}
+    assert all_grid_names == set(name_id_lookup)
+
+
+@mock.patch(PATH.format('get_mysql_engine'))
+@mock.patch(PATH.format('get_iso2_to_iso3_lookup'),
+            return_value={'GB': 'GBR', 'FR': 'FRA', None: None})
+def test_generate_grid_lookups_cached(mocked_iso, mocked_engine,
+                                      grid_engine, tmp_path):
+    mocked_engine.return_value = grid_engine
+    cache_dir = str(tmp_path / 'cache')
+    lookups = generate_grid_lookups(grid_release='2020-03', cache_dir=cache_dir)
+    assert os.path.exists(grid_lookups_path(cache_dir, '2020-03'))
+    # Subsequent start-ups are a file load
+    mocked_engine.reset_mock()
+    with mock.patch(PATH.format('build_grid_lookups'),
+                    return_value=lookups) as mocked_build:
+        assert generate_grid_lookups(grid_release='2020-03',
+                                     cache_dir=cache_dir) == lookups
+        assert mocked_engine.call_count == 0
+        # A new release is rebuilt
+        generate_grid_lookups(grid_release='2020-06', cache_dir=cache_dir)
+        assert mocked_build.call_count == 1
+
+
+@mock.patch(PATH.format('get_iso2_to_iso3_lookup'),
+            return_value={'GB': 'GBR', 'FR': 'FRA', None: None})
+def test_generate_grid_lookups_fingerprint(mocked_iso, grid_engine,
+                                           tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    lookups = generate_grid_lookups(cache_dir=cache_dir, engine=grid_engine)
+    release = grid_release_fingerprint(grid_engine)
+    assert os.listdir(cache_dir) == [f'grid_lookups-v1-{release}.pickle']
+    with mock.patch(PATH.format('build_grid_lookups'),
+                    return_value=lookups) as mocked_build:
+        assert generate_grid_lookups(cache_dir=cache_dir,
+                                     engine=grid_engine) == lookups
+        assert mocked_build.call_count == 0
+        with grid_engine.connect() as connection:
+            connection.execute(Alias.__table__.insert(),
+                               [{'grid_id': 'grid.2', 'alias': 'IBM UK'}])
+        generate_grid_lookups(cache_dir=cache_dir, engine=grid_engine)
+        assert mocked_build.call_count == 1
+
+
+def test_grid_release_fingerprint(grid_engine):
+    assert grid_release_fingerprint(grid_engine) == '4-grid.4-2-2'
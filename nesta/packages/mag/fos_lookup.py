@@ -2,14 +2,31 @@ from nesta.core.orms.orm_utils import db_session
 from nesta.core.orms.orm_utils import get_mysql_engine
 from nesta.core.orms.mag_orm import FieldOfStudy as FoS
 
+from botocore.exceptions import ClientError
 from more_itertools import unique_everseen
 from collections import defaultdict
+import boto3
 import json
+import logging
+
+FOS_GRAPH_VERSION = 1
+
+
+def _hashable(item):
+    """Lists (i.e. rows of the FoS map) are not hashable, so convert them"""
+    return tuple(item) if isinstance(item, list) else item
+
 
 class _UniqueList(list):
     """List with insert-ordered unique entries"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._seen = set(_hashable(item) for item in self)
+
     def append(self, item):
-        if item not in self:
+        key = _hashable(item)
+        if key not in self._seen:
+            self._seen.add(key)
             super().append(item)
 
 
@@ -45,6 +62,32 @@ def _find_index(field, fos_map):
     return None, None
 
 
+def _index_fos_map(fos_map):
+    """
+    Find the (fos_level, idx) index of every field within
+    the FoS map in a single pass, equivalent to calling
+    :obj:`_find_index` for each field.
+    """
+    index = {}
+    for i_level, fields in fos_map.items():
+        uniques = {}
+        for it in fields:
+            uniques.setdefault(it[0], len(uniques))
+        for field, idx in uniques.items():
+            index.setdefault(field, (i_level, idx))
+    return index
+
+
+def _row_ids(row, field, ids, fos_lookup):
+    """
+    Split the parent or child ID field of this row, using
+    the pre-split IDs if a :obj:`FosGraph` has been provided.
+    """
+    if isinstance(fos_lookup, FosGraph) and row['id'] in fos_lookup.names:
+        return getattr(fos_lookup, field)[row['id']] & ids
+    return split_ids(row[field], ids)
+
+
 def _make_fos_map(fos_rows, fos_lookup):
     """
     Apply the FoS lookup to the rows of FoS for this
@@ -54,10 +97,11 @@ def _make_fos_map(fos_rows, fos_lookup):
     fos_map = defaultdict(_UniqueList)
     for row in fos_rows:
         # Get child ids and remove missing ids
-        parent_ids = split_ids(row['parent_ids'], ids)
-        child_ids = split_ids(row['child_ids'], ids)        
-        # Iterate over children
-        for cid in child_ids:
+        parent_ids = _row_ids(row, 'parent_ids', ids, fos_lookup)
+        child_ids = _row_ids(row, 'child_ids', ids, fos_lookup)
+        # Iterate over children, in ID order so that the order
+        # of nodes in the FoS tree is deterministic
+        for cid in sorted(child_ids):
             parent, child = fos_lookup[(row['id'], cid)]
             level = row['level']
             if len(parent_ids) == 0: 
@@ -73,19 +117,20 @@ def _make_fos_tree(fos_map):
     """
     nodes = defaultdict(dict)
     links = []
+    index = _index_fos_map(fos_map)
     # Iterate over each level in the FoS map
     for _, fields in fos_map.items():
         # Iterate over each field in this level
         for row in fields:
             child = row[0]  # Indexing used since size not known
             parent = row[-1]  # Note: child could equal parent
-            c_level, c_idx = _find_index(child, fos_map)
+            c_level, c_idx = index.get(child, (None, None))
             if c_level is None:
                 continue
             if child != parent:
                 # If there is a parent, generate the link
                 # from parent to child
-                p_level, p_idx = _find_index(parent, fos_map)
+                p_level, p_idx = index.get(parent, (None, None))
                 if p_level is not None:
                     links.append([[p_level, p_idx],
                                   [c_level, c_idx]])
@@ -117,7 +162,9 @@ def make_fos_tree(fos_rows, fos_lookup):
     
     Args:
         fos_rows (list): List of MAG fields of study, from the ORM.
-        fos_lookup (dict): Lookup table generated by :obj:`build_fos_lookup`
+        fos_lookup (dict): Lookup table generated by :obj:`build_fos_lookup`,
+                           or equivalently a :obj:`FosGraph`, which
+                           avoids re-splitting the ID fields of each row.
     Returns:
         fos_tree (dict): Useful tree-like representation of the FoS.
     """
@@ -126,6 +173,13 @@ def make_fos_tree(fos_rows, fos_lookup):
     return fos_tree
 
 
+def _split(ids):
+    """Split a comma-delimited string of ids into a set"""
+    if ids is None:
+        return set()
+    return set(int(x) for x in ids.split(','))
+
+
 def split_ids(ids, existing=None):
     """Split the child or parent ID fields from the MAG FoS ORM.
     
@@ -135,9 +189,7 @@ def split_ids(ids, existing=None):
     Returns:
         ids (set): A set of ids split out of the input.
     """
-    if ids is None:
-        return set()
-    found = set(int(x) for x in ids.split(','))
+    found = _split(ids)
     if existing is None:
         existing = found
     missing = found - existing
@@ -153,13 +205,112 @@ def build_fos_lookup(engine, max_lvl=2):
     Returns:
         fos_lookup (dict): Lookup of IDs to names, where keys and values are (parent, child) pairs.
     """
-    with db_session(engine) as session:
-        fos = [f.__dict__ for f in (session.query(FoS)
-                                    .filter(FoS.level <= max_lvl)
-                                    .all())]
+    fos = _query_fos(engine, max_lvl)
     fos_children = {f['id']: split_ids(f['child_ids'])
                     for f in fos}
     fos_names = {f['id']: f['name'] for f in fos}    
     return {(pid, cid): [fos_names[pid], fos_names[cid]]
             for pid, children in fos_children.items()
             for cid in children if cid in fos_children}
+
+
+def _query_fos(engine, max_lvl):
+    """Retrieve all FoS up to the maximum level from the database."""
+    with db_session(engine) as session:
+        return [f.__dict__ for f in (session.query(FoS)
+                                     .filter(FoS.level <= max_lvl)
+                                     .all())]
+
+
+class FosGraph:
+    """Precomputed graph of FoS, with the parent and child ID
+    fields split once up front. This can be used in place of the
+    lookup table generated by :obj:`build_fos_lookup`
+    (i.e. :code:`fos_graph[(pid, cid)]` gives the parent and child names)
+    and is much faster when passed to :obj:`make_fos_tree`.
+
+    Args:
+        fos (list): FoS rows, containing id, name, level, parent_ids and child_ids.
+        max_lvl (int): Maximum FoS level in the graph.
+    """
+    def __init__(self, fos, max_lvl):
+        self.max_lvl = max_lvl
+        self._fos = [[f['id'], f['name'], f['level'],
+                      f['parent_ids'], f['child_ids']] for f in fos]
+        self.names = {f['id']: f['name'] for f in fos}
+        self.parent_ids = {f['id']: _split(f['parent_ids']) for f in fos}
+        self.child_ids = {f['id']: _split(f['child_ids']) for f in fos}
+
+    def __getitem__(self, pair):
+        pid, cid = pair
+        if pid not in self.names or cid not in self.names:
+            raise KeyError(pair)
+        if cid not in self.child_ids[pid]:
+            raise KeyError(pair)
+        return [self.names[pid], self.names[cid]]
+
+    def __contains__(self, pair):
+        try:
+            self[pair]
+        except KeyError:
+            return False
+        return True
+
+    def to_json(self):
+        """Serialise a versioned snapshot of the graph to JSON, storing
+        the raw ID fields of each FoS row."""
+        return json.dumps({'version': FOS_GRAPH_VERSION,
+                           'max_lvl': self.max_lvl,
+                           'fos': self._fos})
+
+    @classmethod
+    def from_json(cls, snapshot):
+        """Load the graph from a snapshot generated by :obj:`to_json`."""
+        data = json.loads(snapshot)
+        if data['version'] != FOS_GRAPH_VERSION:
+            raise ValueError(f"FoS graph snapshot version {data['version']} "
+                             f"does not match {FOS_GRAPH_VERSION}")
+        fields = ('id', 'name', 'level', 'parent_ids', 'child_ids')
+        fos = [dict(zip(fields, f)) for f in data['fos']]
+        return cls(fos, data['max_lvl'])
+
+
+def build_fos_graph(engine, max_lvl=2):
+    """Build a :obj:`FosGraph` from the database.
+
+    Args:
+        engine (sqlalchemy.engine): Database engine.
+        max_lvl (int): Maximum FoS level to consider
+    Returns:
+        fos_graph (FosGraph): Precomputed graph of FoS.
+    """
+    return FosGraph(_query_fos(engine, max_lvl), max_lvl)
+
+
+def load_fos_graph(engine, max_lvl=2, bucket=None, key=None):
+    """Load a :obj:`FosGraph` from a snapshot on S3 if it exists.
+    Otherwise build it from the database, and then save the snapshot
+    so that subsequent jobs don't need to rebuild it.
+
+    Args:
+        engine (sqlalchemy.engine): Database engine.
+        max_lvl (int): Maximum FoS level to consider
+        bucket (str): S3 bucket of the snapshot. If None, always build.
+        key (str): S3 key of the snapshot.
+    Returns:
+        fos_graph (FosGraph): Precomputed graph of FoS.
+    """
+    if bucket is None:
+        return build_fos_graph(engine, max_lvl)
+    obj = boto3.resource('s3').Object(bucket, key)
+    try:
+        snapshot = obj.get()['Body'].read()
+        fos_graph = FosGraph.from_json(snapshot)
+    except (ClientError, ValueError) as err:
+        logging.info(f'Rebuilding FoS graph snapshot: {err}')
+    else:
+        if fos_graph.max_lvl == max_lvl:
+            return fos_graph
+    fos_graph = build_fos_graph(engine, max_lvl)
+    obj.put(Body=fos_graph.to_json())
+    return fos_graph
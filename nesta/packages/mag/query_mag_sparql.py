@@ -8,14 +8,24 @@ import requests
 
 from nesta.packages.misc_utils.batches import split_batches
 from nesta.packages.misc_utils.sparql_query import sparql_query
+from nesta.packages.misc_utils.sparql_query import concurrent_sparql_query
+from nesta.packages.decorators.ratelimit import RateLimiter
 from nesta.core.orms.orm_utils import db_session, get_mysql_engine
 from nesta.core.orms.mag_orm import FieldOfStudy
 
 
 MAG_ENDPOINT = 'http://ma-graph.org/sparql'
+MAG_MAX_PER_SECOND = 10
 
 
-def _batch_query_articles_by_doi(query, articles, batch_size=10):
+def _mag_rate_limiter():
+    """A rate limiter to be shared between the concurrent queries of a single
+    harvest, so that MAG is not overwhelmed."""
+    return RateLimiter(max_per_second=MAG_MAX_PER_SECOND)
+
+
+def _batch_query_articles_by_doi(query, articles, batch_size=10, max_workers=1,
+                                 rate_limiter=None):
     """Manages batches and generates sparql queries for articles and queries them from
     mag via the sparql api using the supplied `doi`.
 
@@ -24,6 +34,8 @@ def _batch_query_articles_by_doi(query, articles, batch_size=10):
         articles (:obj:`list` of :obj:`dict`): articles to query in MAG.
             Must contatin at least `id` and `doi` in each dict.
         batch_size (int): number of ids to query in a batch. Max size = 50
+        max_workers (int): number of batches to query concurrently
+        rate_limiter (RateLimiter): limiter to share between concurrent queries
 
     Yields:
         (:obj:`list` of :obj:`dict`): batches of data returned from MAG
@@ -31,26 +43,38 @@ def _batch_query_articles_by_doi(query, articles, batch_size=10):
     if not 1 <= batch_size <= 10:  # max limit for uri length
         raise ValueError("batch_size must be between 1 and 10")
 
-    for articles_batch in split_batches(articles, batch_size):
-        clean_dois = [(a['doi']
-                       .replace('\n', '')
-                       .replace('\\', '')
-                       .replace('"', '')) for a in articles_batch]
-        concat_dois = ','.join(f'"{a}"^^xsd:string' for a in clean_dois)
-        article_filter = f"FILTER (?doi IN ({concat_dois}))"
-
-        for results_batch in sparql_query(MAG_ENDPOINT,
-                                          query.format(article_filter=article_filter)):
+    articles_batches = []
+    def _queries():
+        for articles_batch in split_batches(articles, batch_size):
+            # Copy, since split_batches reuses the same list
+            articles_batches.append(list(articles_batch))
+            clean_dois = [(a['doi']
+                           .replace('\n', '')
+                           .replace('\\', '')
+                           .replace('"', '')) for a in articles_batch]
+            concat_dois = ','.join(f'"{a}"^^xsd:string' for a in clean_dois)
+            article_filter = f"FILTER (?doi IN ({concat_dois}))"
+            yield (len(articles_batches) - 1,
+                   query.format(article_filter=article_filter))
+
+    for ibatch, pages in concurrent_sparql_query(MAG_ENDPOINT, _queries(),
+                                                 max_workers=max_workers,
+                                                 rate_limiter=rate_limiter,
+                                                 query_func=sparql_query):
+        articles_batch = articles_batches[ibatch]
+        articles_batches[ibatch] = None  # free up memory
+        for results_batch in pages:
             yield articles_batch, results_batch
 
 
-def query_articles_by_doi(articles):
+def query_articles_by_doi(articles, max_workers=4):
     """Queries Microsoft Academic Graph via the SPARQL endpoint, using doi.
     Deduplication is applied by identifying the closest match on title.
 
     Args:
         articles (:obj:`list` of :obj:`dict`): articles to query in MAG.
             Must contatin at least `id` and `doi` in each dict.
+        max_workers (int): number of batches of articles to query concurrently
 
     Yields:
         (dict): single article
@@ -79,7 +103,9 @@ def query_articles_by_doi(articles):
     GROUP BY ?paper ?doi ?paperTitle ?citationCount
     ORDER BY ?paper
     '''
-    for articles_batch, results_batch in _batch_query_articles_by_doi(query, articles):
+    for articles_batch, results_batch in _batch_query_articles_by_doi(query, articles,
+                                                                      max_workers=max_workers,
+                                                                      rate_limiter=_mag_rate_limiter()):
         # combine results by doi
         articles_to_dedupe = defaultdict(list)
         for result in results_batch:
@@ -140,7 +166,8 @@ def _batched_entity_filter(concat_format, filter_on, ids, batch_size):
 
 def _batch_query_sparql(query,
                         concat_format=None, filter_on=None, ids=None,
-                        batch_size=50):
+                        batch_size=50, max_workers=1, rate_limiter=None,
+                        checkpoint_file=None, order_by=None):
     """Manages batching of sparql queries, with filtering and yielding of single rows
     mag via the sparql api.
 
@@ -153,6 +180,12 @@ def _batch_query_sparql(query,
         ids (list): If ids are supplied they are queried as batches, otherwise
             all entities are queried
         batch_size (int): number of ids to query in a batch. Maximum = 50
+        max_workers (int): number of batches to query concurrently
+        rate_limiter (RateLimiter): limiter to share between concurrent queries
+        checkpoint_file (str): path to a file for recording completed batches,
+            such that an interrupted harvest can be resumed
+        order_by (str): variable to page results by, rather than by OFFSET
+            (see :obj:`sparql_query`)
 
     Yields:
         (dict): single row of returned data
@@ -170,9 +203,16 @@ def _batch_query_sparql(query,
         # retrieve all
         entity_filters = ['']
 
-    for entity_filter in entity_filters:
-        for batch in sparql_query(MAG_ENDPOINT, query.format(entity_filter)):
-            yield from batch
+    kwargs = {} if order_by is None else {'order_by': order_by}
+    queries = ((entity_filter, query.format(entity_filter))
+               for entity_filter in entity_filters)
+    for _, pages in concurrent_sparql_query(MAG_ENDPOINT, queries,
+                                            max_workers=max_workers,
+                                            rate_limiter=rate_limiter,
+                                            checkpoint_file=checkpoint_file,
+                                            query_func=sparql_query, **kwargs):
+        for rows in pages:
+            yield from rows
 
 
 def extract_entity_id(entity):
@@ -194,13 +234,16 @@ def extract_entity_id(entity):
         raise ValueError(f"Unable to extract id from {entity}")
 
 
-def query_fields_of_study_sparql(ids=None, results_limit=None):
+def query_fields_of_study_sparql(ids=None, results_limit=None, max_workers=4,
+                                 checkpoint_file=None):
     """Queries the MAG for fields of study. Expect >650k results for all levels.
 
     Args:
         ids: (:obj:`list` of `int`): field of study ids to query,
                                      all are returned if None
         results_limit (int): limit the number of results returned (for testing)
+        max_workers (int): number of batches of ids to query concurrently
+        checkpoint_file (str): path to a file for recording completed batches
 
     Yields:
         (dict): processed field of study
@@ -212,25 +255,32 @@ def query_fields_of_study_sparql(ids=None, results_limit=None):
     PREFIX magp: <http://ma-graph.org/property/>
 
     SELECT ?field
-           ?name
-           ?level
+           SAMPLE(?fieldName) as ?name
+           SAMPLE(?fieldLevel) as ?level
            GROUP_CONCAT(DISTINCT ?parent; separator=",") as ?parents
            GROUP_CONCAT(?child; separator=",") as ?children
     WHERE {{
         ?field rdf:type magc:FieldOfStudy .
-        ?field magp:level ?level .
-        OPTIONAL {{ ?field foaf:name ?name }}
+        ?field magp:level ?fieldLevel .
+        OPTIONAL {{ ?field foaf:name ?fieldName }}
         OPTIONAL {{ ?field magp:hasParent ?parent }}
         OPTIONAL {{ ?child magp:hasParent ?field }}
         {}
     }}
-    GROUP BY ?field ?name ?level'''
+    GROUP BY ?field'''
+    # Grouping by ?field alone (each field has a single name and level)
+    # means that it uniquely identifies each row, as keyset paging requires
     concat_format = "<http://ma-graph.org/entity/{}>"
 
     for count, row in enumerate(_batch_query_sparql(query,
                                                     concat_format=concat_format,
                                                     filter_on='field',
-                                                    ids=ids), start=1):
+                                                    ids=ids,
+                                                    max_workers=max_workers,
+                                                    rate_limiter=_mag_rate_limiter(),
+                                                    checkpoint_file=checkpoint_file,
+                                                    order_by='field'),
+                                start=1):
         # reformat field, parents, children out of urls.
         row['id'] = extract_entity_id(row.pop('field'))
 
@@ -286,12 +336,15 @@ def update_field_of_study_ids_sparql(engine, fos_ids):
     return fos_not_found
 
 
-def query_authors(ids=None, results_limit=None):
+def query_authors(ids=None, results_limit=None, max_workers=4,
+                  checkpoint_file=None):
     """Queries the MAG for authors and their affiliations.
 
     Args:
         ids: (:obj:`list` of `int`): author ids to query, all are returned if None
         results_limit (int): limit the number of results returned (for testing)
+        max_workers (int): number of batches of ids to query concurrently
+        checkpoint_file (str): path to a file for recording completed batches
 
     Yields:
         (dict): a single author with affiliation
@@ -323,7 +376,11 @@ def query_authors(ids=None, results_limit=None):
     for count, row in enumerate(_batch_query_sparql(query,
                                                     concat_format=concat_format,
                                                     filter_on='author',
-                                                    ids=ids), start=1):
+                                                    ids=ids,
+                                                    max_workers=max_workers,
+                                                    rate_limiter=_mag_rate_limiter(),
+                                                    checkpoint_file=checkpoint_file),
+                                start=1):
         renaming = {'author': 'author_id',
                     'authorName': 'author_name',
                     'affiliation': 'author_affiliation_id',
@@ -433,20 +490,8 @@ def query_by_grid_id(grid_id, from_date='2000-01-01', min_citations=1,
                    for k, v in row.items()}
 
 
-def batch_query_papers_by_institute_id(query):
-    """Queries MAG for a batch and yields a row of data at a time.
-
-    Args:
-        query(str): SPARQL query
-
-    Yields:
-        (dict): row of data
-    """
-    for batch in sparql_query(MAG_ENDPOINT, query):
-        yield from batch
-
 def count_papers(institutes, done_institutes, paper_ids, intermediate_file,
-                 save_every=1000000, limit=None):
+                 save_every=1000000, limit=None, max_workers=4):
     """Count the number of papers produced from a list of supplied institues.
 
     Args:
@@ -457,6 +502,7 @@ def count_papers(institutes, done_institutes, paper_ids, intermediate_file,
         institutes and paper ids
         save_every(int): saves to s3 each time this number of papers are found
         limit(int): break at this number of processed records, for testing
+        max_workers(int): number of institutes to query concurrently
 
     Returns:
         (int): total number of papers found
@@ -466,7 +512,7 @@ def count_papers(institutes, done_institutes, paper_ids, intermediate_file,
     PREFIX org: <http://www.w3.org/ns/org#>
     PREFIX dcterms: <http://purl.org/dc/terms/>
 
-    SELECT ?paperId
+    SELECT DISTINCT ?paperId
 
     WHERE {{
     ?affiliationId magp:grid <http://www.grid.ac/institutes/{}> .
@@ -474,9 +520,15 @@ def count_papers(institutes, done_institutes, paper_ids, intermediate_file,
     ?paperId dcterms:creator ?authorId .
     }}
     '''
+    queries = ((institute, query.format(institute)) for institute in institutes
+               if institute not in done_institutes)
     count = 0
-    for institute in institutes:
-        for row in batch_query_papers_by_institute_id(query.format(institute)):
+    for institute, pages in concurrent_sparql_query(MAG_ENDPOINT, queries,
+                                                    max_workers=max_workers,
+                                                    rate_limiter=_mag_rate_limiter(),
+                                                    query_func=sparql_query,
+                                                    order_by='paperId'):
+        for row in (row for rows in pages for row in rows):
             count += 1
             logging.debug(row)
             paper_id = extract_entity_id(row['paperId'])
@@ -11,6 +11,9 @@ from nesta.packages.mag.fos_lookup import _make_fos_map
 from nesta.packages.mag.fos_lookup import _make_fos_tree
 from nesta.packages.mag.fos_lookup import make_fos_tree
 from nesta.packages.mag.fos_lookup import intdict_to_list
+from nesta.packages.mag.fos_lookup import _index_fos_map
+from nesta.packages.mag.fos_lookup import FosGraph
+from nesta.packages.mag.fos_lookup import load_fos_graph
 
 
 @pytest.fixture
@@ -128,6 +131,12 @@ def test_find_index(fos_map_large):
     assert _find_index('Neutralino', fos_map_large) == (3, 1)
 
 
+def test_index_fos_map(fos_map_large):
+    index = _index_fos_map(fos_map_large)
+    for field, idx in index.items():
+        assert _find_index(field, fos_map_large) == idx
+
+
 def test_make_fos_map(fos_rows, fos_lookup, fos_map):
     assert _make_fos_map(fos_rows, fos_lookup) == fos_map
 
@@ -140,6 +149,71 @@ def test_make_fos_tree(fos_rows, fos_lookup, fos_nodes):
     assert make_fos_tree(fos_rows, fos_lookup) == fos_nodes
 
 
+def test_make_fos_tree_orders_by_id(fos_rows, fos_lookup, fos_nodes):
+    fos_rows[0]['child_ids'] = '3,2'
+    fos_rows[2]['child_ids'] = '5,4'
+    assert make_fos_tree(fos_rows, fos_lookup) == fos_nodes
+
+
+@pytest.fixture
+def fos_graph(fos_rows, fos_lookup):
+    names = {cid: cname for (_, cid), (_, cname) in fos_lookup.items()}
+    names[1] = 'Physics'
+    fos = [dict(name=names[row['id']], **row) for row in fos_rows]
+    return FosGraph(fos, max_lvl=2)
+
+
+def test_fos_graph_lookup(fos_graph, fos_lookup):
+    for (pid, cid), names in fos_lookup.items():
+        assert fos_graph[(pid, cid)] == list(names)
+    assert (1, 4) not in fos_graph
+    with pytest.raises(KeyError):
+        fos_graph[(4, 1)]
+
+
+def test_make_fos_tree_with_graph(fos_rows, fos_lookup, fos_graph, fos_nodes):
+    assert make_fos_tree(fos_rows, fos_graph) == fos_nodes
+    assert (make_fos_tree(fos_rows[1:], fos_graph) ==
+            make_fos_tree(fos_rows[1:], fos_lookup))
+
+
+def test_fos_graph_snapshot(fos_rows, fos_graph, fos_nodes):
+    _fos_graph = FosGraph.from_json(fos_graph.to_json())
+    assert _fos_graph.max_lvl == fos_graph.max_lvl
+    assert _fos_graph.child_ids == fos_graph.child_ids
+    assert make_fos_tree(fos_rows, _fos_graph) == fos_nodes
+
+
+def test_fos_graph_snapshot_bad_version(fos_graph):
+    snapshot = fos_graph.to_json().replace('"version": 1', '"version": 0')
+    with pytest.raises(ValueError):
+        FosGraph.from_json(snapshot)
+
+
+@mock.patch('nesta.packages.mag.fos_lookup.build_fos_graph')
+@mock.patch('nesta.packages.mag.fos_lookup.boto3')
+def test_load_fos_graph_from_snapshot(mocked_boto3, mocked_build, fos_graph):
+    obj = mocked_boto3.resource().Object()
+    obj.get()['Body'].read.return_value = fos_graph.to_json()
+    _fos_graph = load_fos_graph(None, max_lvl=2, bucket='bucket', key='key')
+    assert _fos_graph.names == fos_graph.names
+    assert mocked_build.call_count == 0
+    assert obj.put.call_count == 0
+
+
+@mock.patch('nesta.packages.mag.fos_lookup.build_fos_graph')
+@mock.patch('nesta.packages.mag.fos_lookup.boto3')
+def test_load_fos_graph_rebuilds_stale_snapshot(mocked_boto3, mocked_build,
+                                                fos_graph):
+    obj = mocked_boto3.resource().Object()
+    obj.get()['Body'].read.return_value = fos_graph.to_json()
+    mocked_build.return_value = fos_graph
+    assert load_fos_graph(None, max_lvl=3, bucket='bucket',
+                          key='key') == fos_graph
+    assert mocked_build.call_count == 1
+    obj.put.assert_called_once_with(Body=fos_graph.to_json())
+
+
 def test_intdict_to_list_complete_values():
     assert intdict_to_list({0:'a',1:'b', 2:'c'}) == ['a','b','c']
     assert intdict_to_list({0:'c',1:'a', 2:'c'}) == ['c','a','c']
@@ -9,6 +9,7 @@ from nesta.packages.mag.query_mag_api import get_journal_articles
 from nesta.packages.mag.query_mag_api import build_composite_expr
 from nesta.packages.mag.query_mag_sparql import extract_entity_id
 from nesta.packages.mag.query_mag_sparql import query_articles_by_doi
+from nesta.packages.mag.query_mag_sparql import query_fields_of_study_sparql
 from nesta.packages.mag.query_mag_sparql import _batch_query_sparql
 from nesta.packages.mag.query_mag_sparql import _batched_entity_filter
 from nesta.packages.mag.query_mag_sparql import MAG_ENDPOINT
@@ -118,6 +119,23 @@ class TestQueryArticles:
         assert result == [{'paperTitle': 'title_aa', 'score': 1, 'id': 1, 'doi': '1.1/1234'}]
 
 
+class TestQueryFieldsOfStudy:
+    @mock.patch('nesta.packages.mag.query_mag_sparql._batch_query_sparql', autospec=True)
+    def test_query_fields_of_study_pages_by_unique_field(self, mocked_batch):
+        mocked_batch.return_value = iter([{'field': 'http://ma-graph.org/entity/1',
+                                           'name': 'a', 'level': '0',
+                                           'parents': '',
+                                           'children': 'http://ma-graph.org/entity/2'}])
+        result = list(query_fields_of_study_sparql())
+        assert result == [{'id': 1, 'name': 'a', 'level': '0',
+                           'parent_ids': None, 'child_ids': '2'}]
+
+        # Keyset paging is only safe if ?field is unique per row
+        (query,), kwargs = mocked_batch.call_args
+        assert kwargs['order_by'] == 'field'
+        assert query.rstrip().endswith('GROUP BY ?field')
+
+
 class TestBatchQuerySparql:
     @mock.patch('nesta.packages.mag.query_mag_sparql._batched_entity_filter', autospec=True)
     @mock.patch('nesta.packages.mag.query_mag_sparql.sparql_query', autospec=True)
@@ -1,7 +1,13 @@
 """Utilties for working with batches."""
+from base64 import b64decode
+from base64 import b64encode
 import boto3
 import json
+import numpy as np
 import time
+import zlib
+
+MANIFEST_VERSION = 1
 
 def split_batches(data, batch_size):
     """Breaks batches down into chunks consumable by the database.
@@ -42,6 +48,135 @@ def put_s3_batch(data, bucket, prefix):
     return filename
 
 
+def _is_int(_id):
+    return isinstance(_id, (int, np.integer)) and not isinstance(_id, bool)
+
+
+def _compress(data):
+    return b64encode(zlib.compress(data)).decode('ascii')
+
+
+def _decompress(data):
+    return zlib.decompress(b64decode(data))
+
+
+def encode_batch(batch):
+    """Compactly encode a batch of ids. Integer ids are encoded as
+    contiguous ranges, or as a compressed bitmap if that is smaller
+    (i.e. for sparse sets of ids). Otherwise the ids are compressed.
+
+    Args:
+        batch (list): Ids in the batch.
+    Returns:
+        encoded (dict): Encoded batch, to be decoded by :obj:`decode_batch`.
+    """
+    if len(batch) == 0 or not all(_is_int(_id) for _id in batch):
+        return {'ids': _compress(json.dumps(list(batch)).encode())}
+    ids = np.unique(np.array(batch, dtype=np.int64))
+    # Contiguous ranges, as [first, last] pairs
+    breaks = np.flatnonzero(np.diff(ids) != 1) + 1
+    starts = ids[np.concatenate([[0], breaks])]
+    ends = ids[np.concatenate([breaks - 1, [len(ids) - 1]])]
+    encoded = {'ranges': [[int(first), int(last)]
+                          for first, last in zip(starts, ends)]}
+    # A bitmap is only worthwhile if the ids aren't spread too thinly
+    span = int(ids[-1] - ids[0]) + 1
+    if span <= 64 * len(ids):
+        bits = np.zeros(span, dtype=bool)
+        bits[ids - ids[0]] = True
+        bitmap = {'start': int(ids[0]), 'size': span,
+                  'bitmap': _compress(np.packbits(bits).tobytes())}
+        if len(json.dumps(bitmap)) < len(json.dumps(encoded)):
+            encoded = bitmap
+    return encoded
+
+
+def decode_batch(encoded):
+    """Decode a batch of ids encoded by :obj:`encode_batch`.
+
+    Args:
+        encoded (dict): Encoded batch.
+    Returns:
+        batch (list): Ids in the batch (integer ids are sorted).
+    """
+    if 'ids' in encoded:
+        return json.loads(_decompress(encoded['ids']))
+    if 'ranges' in encoded:
+        return [_id for first, last in encoded['ranges']
+                for _id in range(first, last + 1)]
+    bits = np.unpackbits(np.frombuffer(_decompress(encoded['bitmap']),
+                                       dtype=np.uint8))[:encoded['size']]
+    return [int(_id) + encoded['start'] for _id in np.flatnonzero(bits)]
+
+
+def put_s3_manifest(batches, bucket, prefix):
+    """Writes out a single manifest describing all batches to s3, from
+    which each batchable task can extract its own batch
+    with :obj:`get_s3_batch`.
+
+    Args:
+        batches (iterable): Batches (lists) of ids.
+        bucket (str): s3 bucket.
+        prefix (str): Prefix of the manifest filename.
+    Returns:
+        (str, int): name of the manifest in the s3 bucket (key),
+                    and the number of batches.
+    """
+    manifest = {'version': MANIFEST_VERSION,
+                'batches': [encode_batch(batch) for batch in batches]}
+    timestamp = str(time.time()).replace('.', '')
+    filename = f"{prefix}-{timestamp}-manifest.json"
+    s3 = boto3.resource('s3')
+    s3.Object(bucket, filename).put(Body=json.dumps(manifest))
+    return filename, len(manifest['batches'])
+
+
+def put_s3_batches(batches, bucket, prefix, manifest=False):
+    """Write out batches to s3, either as one file per batch
+    (see :obj:`put_s3_batch`) or as a single manifest
+    (see :obj:`put_s3_manifest`).
+
+    Args:
+        batches (iterable): Batches (lists) of ids.
+        bucket (str): s3 bucket.
+        prefix (str): Prefix of the filenames.
+        manifest (bool): Write a single manifest?
+    Yields:
+        (dict): Job parameters locating each batch, i.e. the `batch_file`
+                and, for manifests, the `batch_number`.
+    """
+    if not manifest:
+        for batch in batches:
+            yield {'batch_file': put_s3_batch(batch, bucket, prefix)}
+        return
+    filename, n_batches = put_s3_manifest(batches, bucket, prefix)
+    for batch_number in range(n_batches):
+        yield {'batch_file': filename, 'batch_number': batch_number}
+
+
+def get_s3_batch(bucket, batch_file, batch_number=None):
+    """Reads a batch of ids from s3, as written by :obj:`put_s3_batch`
+    or (if the batch number is given) :obj:`put_s3_manifest`.
+
+    Args:
+        bucket (str): s3 bucket.
+        batch_file (str): name of the file in the s3 bucket (key).
+        batch_number (int): Index of the batch in the manifest, if any
+                            (e.g. :code:`os.environ.get('BATCHPAR_batch_number')`).
+    Returns:
+        (list): The ids in this batch.
+    """
+    s3 = boto3.resource('s3')
+    obj = s3.Object(bucket, batch_file)
+    data = json.loads(obj.get()['Body']._raw_stream.read())
+    if batch_number is None:
+        return data
+    if data['version'] != MANIFEST_VERSION:
+        raise ValueError(f"Manifest version {data['version']} "
+                         f"does not match {MANIFEST_VERSION}")
+    return decode_batch(data['batches'][int(batch_number)])
+
+
 class BatchWriter(list):
     """A list with functionality to monitor appends.
     When a specified size is reached a function is called and the list cleared down.
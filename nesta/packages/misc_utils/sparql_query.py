@@ -5,15 +5,97 @@ sparql_query
 A wrapper to SPARQLWrapper to query a given SPARQL endpoint
 with rate-limiting.
 
+Results can either be paged with LIMIT/OFFSET (the default) or,
+for deep result sets, by keyset paging on an ORDER BY variable
+which uniquely identifies each row (since OFFSET gets slower
+with every page). Many queries (e.g. one per batch of entity filters)
+can be executed concurrently with :obj:`concurrent_sparql_query`.
 """
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
 from http.client import RemoteDisconnected
+import json
 import logging
+import os
+import queue
 from SPARQLWrapper import SPARQLWrapper, JSON
 from SPARQLWrapper.SPARQLExceptions import EndPointNotFound
+import threading
 import time
 
 
-def sparql_query(endpoint, query, nbatch=5000, batch_limit=None):
+def _keyset_condition(order_by, binding):
+    """Generate a SPARQL condition for selecting rows which come after
+    the given binding, when ordered by the `order_by` variable.
+
+    Args:
+        order_by (str): Name of the variable to order by (without '?').
+        binding (dict): SPARQL JSON binding of the last row of the previous page.
+    Returns:
+        (str): The SPARQL condition.
+    """
+    value = binding['value'].replace('\\', '\\\\').replace('"', '\\"')
+    datatype = binding.get('datatype')
+    if binding['type'] in ('literal', 'typed-literal') and datatype is not None:
+        return f'?{order_by} > "{value}"^^<{datatype}>'
+    # IRIs and plain literals are ordered by their string value
+    return f'STR(?{order_by}) > "{value}"'
+
+
+def _keyset_query(query, order_by, last_binding, nbatch):
+    """Add keyset paging to a query, by inserting a filter before the final
+    closing brace (i.e. the end of the WHERE block) and ordering by the
+    `order_by` variable.
+
+    Args:
+        query (str): SPARQL query string, without an ORDER BY clause.
+        order_by (str): Name of the variable to order by (without '?').
+        last_binding (dict): SPARQL JSON binding of the last row of the
+                             previous page, or None for the first page.
+        nbatch (int): Batch size.
+    Returns:
+        (str): The SPARQL query for this page.
+    """
+    keyset_filter = ''
+    if last_binding is not None:
+        keyset_filter = f"FILTER ({_keyset_condition(order_by, last_binding)})\n"
+    head, tail = query.rsplit('}', 1)
+    return f"{head}{keyset_filter}}}{tail} ORDER BY ?{order_by} LIMIT {nbatch}"
+
+
+def _query_with_retries(sparql, query, rate_limiter=None,
+                        retry_attempts=5, retry_delay=5):
+    """Execute a single query, retrying on connection errors.
+
+    Args:
+        sparql (SPARQLWrapper): SPARQLWrapper object for the endpoint.
+        query (str): SPARQL query string.
+        rate_limiter (RateLimiter): Optional limiter, shared between queries.
+        retry_attempts (int): Number of attempts before giving up.
+        retry_delay (int): Seconds to wait between attempts.
+    Returns:
+        (dict): The JSON results of the query
+    Raises:
+        ConnectionError: If every attempt fails with a connection error.
+    """
+    logging.debug(query)
+    sparql.setQuery(query)
+    for attempt in range(1, retry_attempts + 1):
+        if rate_limiter is not None:
+            rate_limiter.wait()
+        try:
+            return sparql.query().convert()
+        except (EndPointNotFound, RemoteDisconnected) as err:
+            error = err
+            if attempt < retry_attempts:
+                logging.warning("Connection error, retrying...")
+                time.sleep(retry_delay)
+    raise ConnectionError(f"SPARQL query failed after {retry_attempts} "
+                          f"attempts: {error}") from error
+
+
+def sparql_query(endpoint, query, nbatch=5000, batch_limit=None,
+                 order_by=None, rate_limiter=None):
     """Query a given endpoint with rate-limiting in 'nbatch' batches
 
     Args:
@@ -21,31 +103,32 @@ def sparql_query(endpoint, query, nbatch=5000, batch_limit=None):
         query (str): SPARQL query string.
         nbatch (int): Batch size.
         batch_limit (int): limit the number of batches, for testing
+        order_by (str): If specified, page by this variable (without '?')
+                        rather than by OFFSET. The variable must uniquely
+                        identify each row, and the query must end
+                        with its WHERE block (optionally followed by a GROUP BY,
+                        but not an ORDER BY).
+        rate_limiter (RateLimiter): Optional limiter, shared between queries.
     Returns:
         (:obj:`list` of :obj:`dict`): Batch of results as a list of dictionaries
     """
+    if order_by is not None and 'ORDER BY' in query.upper():
+        raise ValueError("Queries paged by 'order_by' must not "
+                         "have their own ORDER BY clause")
     sparql = SPARQLWrapper(endpoint)
     sparql.setReturnFormat(JSON)
 
     # Execute the query in batches of nbatch
     n = 0
     total_batches = 0
-    retry_attempts = 5
-    retry_delay = 5  # seconds
+    last_binding = None
     while True:
         # Run the query and get the results
-        batch_query = f"{query} LIMIT {nbatch} OFFSET {n}"
-        logging.debug(batch_query)
-        sparql.setQuery(batch_query)
-        retries = retry_attempts
-        results = None
-        while retries > 0 and not results:
-            try:
-                results = sparql.query().convert()
-            except (EndPointNotFound, RemoteDisconnected):
-                logging.warning("Connection error, retrying...")
-                time.sleep(retry_delay)
-                retries -= 1
+        if order_by is None:
+            batch_query = f"{query} LIMIT {nbatch} OFFSET {n}"
+        else:
+            batch_query = _keyset_query(query, order_by, last_binding, nbatch)
+        results = _query_with_retries(sparql, batch_query, rate_limiter)
 
         # Extract the data values from the results
         data = results["results"]["bindings"]
@@ -56,6 +139,8 @@ def sparql_query(endpoint, query, nbatch=5000, batch_limit=None):
             # Extract values for each item
             clean_batch = [{k: v['value'] for k, v in row.items()} for row in data]
             n += n_results
+            if order_by is not None:
+                last_binding = data[-1][order_by]
             yield clean_batch
 
         total_batches += 1
@@ -65,3 +150,148 @@ def sparql_query(endpoint, query, nbatch=5000, batch_limit=None):
             break
         if batch_limit and total_batches >= batch_limit:
             break
+
+
+def _load_checkpoint(checkpoint_file):
+    """Load the keys of completed queries from a checkpoint file,
+    which contains one JSON-encoded key per line.
+
+    Args:
+        checkpoint_file (str): Path to the checkpoint file.
+    Returns:
+        (set): Keys of completed queries.
+    """
+    if checkpoint_file is None or not os.path.exists(checkpoint_file):
+        return set()
+    with open(checkpoint_file) as f:
+        return {json.loads(line) for line in f if line.strip()}
+
+
+def concurrent_sparql_query(endpoint, queries, max_workers=4,
+                            rate_limiter=None, checkpoint_file=None,
+                            query_func=sparql_query, max_queued_pages=2,
+                            **kwargs):
+    """Execute many queries against an endpoint concurrently, with a bounded
+    pool of threads (which can share a rate limiter). The pages of results of
+    each query are streamed in the order that the queries were provided,
+    holding at most `max_queued_pages` unconsumed pages per query in memory.
+    If the generator is closed early, queries which have not started are
+    cancelled, and running queries stop after their current page. If a
+    checkpoint file is specified, queries which were completed during a
+    previous call are skipped, and each query is only marked as complete
+    once the consumer has finished processing its results.
+
+    Args:
+        endpoint (str): SPARQL endpoint URL.
+        queries (iterable): Iterable of (key, query) pairs, where the key
+                            is a JSON-serialisable identifier for the query.
+        max_workers (int): Maximum number of concurrent queries.
+        rate_limiter (RateLimiter): Optional limiter, shared between queries.
+        checkpoint_file (str): Optional path to a file for recording
+                               the keys of completed queries.
+        query_func (function): Function with the signature of
+                               :obj:`sparql_query`, which yields batches of rows.
+        max_queued_pages (int): Maximum number of pages of each query to
+                                fetch ahead of the consumer.
+        kwargs: Any other keyword arguments for the query_func.
+    Yields:
+        key, pages (:obj:`tuple` of key, iterator of :obj:`list` of :obj:`dict`):
+                   The key of each query, and an iterator over its pages of
+                   rows, which must be consumed before the next query.
+    """
+    if rate_limiter is not None:
+        kwargs['rate_limiter'] = rate_limiter
+    done = _load_checkpoint(checkpoint_file)
+    if len(done) > 0:
+        logging.info(f"Skipping {len(done)} previously completed queries")
+    stop = threading.Event()
+
+    def _run(query, pages):
+        try:
+            for batch in query_func(endpoint, query, **kwargs):
+                if not _put(pages, batch, stop):
+                    return
+        finally:
+            _put(pages, _END_OF_QUERY, stop)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    pending = deque()
+    try:
+        for key, query in queries:
+            if key in done:
+                continue
+            pages = queue.Queue(maxsize=max_queued_pages)
+            pending.append((key, executor.submit(_run, query, pages), pages))
+            # Bound the number of queued queries, to bound the memory
+            if len(pending) < 2*max_workers:
+                continue
+            yield from _complete(pending.popleft(), checkpoint_file)
+        while pending:
+            yield from _complete(pending.popleft(), checkpoint_file)
+    finally:
+        # Stop any running queries and drop those which haven't started
+        stop.set()
+        for _, future, _ in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+_END_OF_QUERY = object()
+
+
+def _put(pages, page, stop):
+    """Put a page onto a query's queue, waiting for space until stopped.
+
+    Args:
+        pages (queue.Queue): Queue of pages of the query.
+        page: The page (or end-of-query marker).
+        stop (threading.Event): Set when the consumer has gone away.
+    Returns:
+        (bool): Whether the page was queued (rather than stopped).
+    """
+    while not stop.is_set():
+        try:
+            pages.put(page, timeout=0.1)
+        except queue.Full:
+            continue
+        return True
+    return False
+
+
+def _iter_pages(future, pages):
+    """Iterate over the pages of a running query, as they are fetched.
+
+    Args:
+        future (Future): The running query.
+        pages (queue.Queue): Queue of pages of the query.
+    Yields:
+        (:obj:`list` of :obj:`dict`): Each page of rows.
+    """
+    while True:
+        page = pages.get()
+        if page is _END_OF_QUERY:
+            break
+        yield page
+    future.result()  # Raise any error from the query
+
+
+def _complete(pending_query, checkpoint_file):
+    """Yield the pages of a pending query, and then record the query as
+    complete in the checkpoint file (if specified).
+
+    Args:
+        pending_query (tuple): The key, Future and page queue of the query.
+        checkpoint_file (str): Optional path to the checkpoint file.
+    Yields:
+        key, pages (:obj:`tuple` of key, iterator of :obj:`list` of :obj:`dict`):
+                   The key and pages of rows of the query.
+    """
+    key, future, pages = pending_query
+    pages = _iter_pages(future, pages)
+    yield key, pages
+    # Discard any pages which the consumer didn't process
+    for _ in pages:
+        pass
+    if checkpoint_file is not None:
+        with open(checkpoint_file, 'a') as f:
+            f.write(json.dumps(key) + '\n')
@@ -1,8 +1,18 @@
+import boto3
+import json
 import pytest
+try:
+    from moto import mock_aws
+except ImportError:  # moto < 5, as pinned in requirements_test.txt
+    from moto import mock_s3 as mock_aws
 from unittest import mock
 
 from nesta.packages.misc_utils.batches import split_batches
 from nesta.packages.misc_utils.batches import BatchWriter
+from nesta.packages.misc_utils.batches import encode_batch
+from nesta.packages.misc_utils.batches import decode_batch
+from nesta.packages.misc_utils.batches import put_s3_batches
+from nesta.packages.misc_utils.batches import get_s3_batch
 
 
 @pytest.fixture
@@ -86,3 +96,48 @@ def test_batch_writer_calls_function_with_args():
         batch_writer.append(b)
 
     mock_function_to_call.assert_called_once_with([1, 2], mock_arg, some_kwarg=mock_kwarg)
+
+
+@pytest.mark.parametrize('batch', [list(range(10, 1000)),  # contiguous
+                                   list(range(0, 10000, 3)),  # sparse
+                                   [1, 10**12, 5, 6, 7],  # very sparse
+                                   ['a', 'b', 'c'],  # not integers
+                                   []])
+def test_encode_decode_batch(batch):
+    encoded = encode_batch(batch)
+    decoded = decode_batch(json.loads(json.dumps(encoded)))
+    if all(isinstance(_id, int) for _id in batch):
+        assert decoded == sorted(batch)
+    else:
+        assert decoded == batch
+
+
+def test_encode_batch_is_compact():
+    assert encode_batch(list(range(10, 1000))) == {'ranges': [[10, 999]]}
+    assert 'bitmap' in encode_batch(list(range(0, 10000, 3)))
+    assert encode_batch([1, 10**12]) == {'ranges': [[1, 1], [10**12, 10**12]]}
+
+
+@mock_aws
+def test_put_and_get_s3_batches():
+    s3 = boto3.resource('s3', region_name='us-east-1')
+    s3.create_bucket(Bucket='bucket')
+    batches = [list(range(i, i + 100)) for i in range(0, 1000, 100)]
+
+    # Manifest: one file for all batches
+    params = list(put_s3_batches(iter(batches), 'bucket', 'prefix',
+                                 manifest=True))
+    assert len(params) == 10
+    assert len({p['batch_file'] for p in params}) == 1
+    assert len(list(s3.Bucket('bucket').objects.all())) == 1
+    for batch, p in zip(batches, params):
+        # Note that the batch number is read from the environment, as a str
+        assert get_s3_batch('bucket', p['batch_file'],
+                            str(p['batch_number'])) == batch
+
+    # One file per batch
+    params = list(put_s3_batches(iter(batches), 'bucket', 'prefix'))
+    assert len({p['batch_file'] for p in params}) == 10
+    assert all('batch_number' not in p for p in params)
+    for batch, p in zip(batches, params):
+        assert get_s3_batch('bucket', p['batch_file']) == batch
@@ -0,0 +1,161 @@
+import pytest
+from unittest import mock
+from http.client import RemoteDisconnected
+
+from nesta.packages.misc_utils.sparql_query import _keyset_condition
+from nesta.packages.misc_utils.sparql_query import _keyset_query
+from nesta.packages.misc_utils.sparql_query import _query_with_retries
+from nesta.packages.misc_utils.sparql_query import sparql_query
+from nesta.packages.misc_utils.sparql_query import concurrent_sparql_query
+
+SPARQL_WRAPPER = 'nesta.packages.misc_utils.sparql_query.SPARQLWrapper'
+
+
+def _response(values, var='x'):
+    bindings = [{var: {'type': 'uri', 'value': v}} for v in values]
+    return {'results': {'bindings': bindings}}
+
+
+def test_keyset_condition():
+    uri = {'type': 'uri', 'value': 'http://a.org/1'}
+    assert _keyset_condition('x', uri) == 'STR(?x) > "http://a.org/1"'
+    typed = {'type': 'literal', 'value': '3',
+             'datatype': 'http://www.w3.org/2001/XMLSchema#integer'}
+    assert _keyset_condition('x', typed) == ('?x > "3"^^<http://www.w3.org'
+                                             '/2001/XMLSchema#integer>')
+    plain = {'type': 'literal', 'value': 'a "quote"'}
+    assert _keyset_condition('x', plain) == 'STR(?x) > "a \\"quote\\""'
+
+
+def test_keyset_query():
+    query = "SELECT ?x WHERE { ?x a ?y . OPTIONAL { ?x b ?z } } GROUP BY ?x"
+    first = _keyset_query(query, 'x', None, 10)
+    assert first == ("SELECT ?x WHERE { ?x a ?y . OPTIONAL { ?x b ?z } } "
+                     "GROUP BY ?x ORDER BY ?x LIMIT 10")
+    last = {'type': 'uri', 'value': 'http://a.org/1'}
+    later = _keyset_query(query, 'x', last, 10)
+    assert later == ("SELECT ?x WHERE { ?x a ?y . OPTIONAL { ?x b ?z } "
+                     "FILTER (STR(?x) > \"http://a.org/1\")\n} "
+                     "GROUP BY ?x ORDER BY ?x LIMIT 10")
+
+
+@mock.patch('nesta.packages.misc_utils.sparql_query.time.sleep')
+def test_query_with_retries(mocked_sleep):
+    sparql = mock.Mock()
+    sparql.query.return_value.convert.side_effect = [RemoteDisconnected(),
+                                                     _response(['1'])]
+    assert _query_with_retries(sparql, 'query') == _response(['1'])
+    sparql.query.return_value.convert.side_effect = RemoteDisconnected()
+    with pytest.raises(ConnectionError):
+        _query_with_retries(sparql, 'query', retry_attempts=3)
+    assert mocked_sleep.call_count == 3
+
+
+@mock.patch(SPARQL_WRAPPER)
+def test_sparql_query_offset_paging(mocked_wrapper):
+    sparql = mocked_wrapper.return_value
+    sparql.query.return_value.convert.side_effect = [_response(['1', '2']),
+                                                     _response(['3'])]
+    batches = list(sparql_query('endpoint', 'SELECT ?x WHERE { ?x a ?y }',
+                                nbatch=2))
+    assert batches == [[{'x': '1'}, {'x': '2'}], [{'x': '3'}]]
+    queries = [c[0][0] for c in sparql.setQuery.call_args_list]
+    assert queries == ['SELECT ?x WHERE { ?x a ?y } LIMIT 2 OFFSET 0',
+                       'SELECT ?x WHERE { ?x a ?y } LIMIT 2 OFFSET 2']
+
+
+@mock.patch(SPARQL_WRAPPER)
+def test_sparql_query_keyset_paging(mocked_wrapper):
+    sparql = mocked_wrapper.return_value
+    sparql.query.return_value.convert.side_effect = [_response(['1', '2']),
+                                                     _response(['3', '4']),
+                                                     _response([])]
+    rate_limiter = mock.Mock()
+    batches = list(sparql_query('endpoint', 'SELECT ?x WHERE { ?x a ?y }',
+                                nbatch=2, order_by='x',
+                                rate_limiter=rate_limiter))
+    assert batches == [[{'x': '1'}, {'x': '2'}], [{'x': '3'}, {'x': '4'}]]
+    queries = [c[0][0] for c in sparql.setQuery.call_args_list]
+    assert 'OFFSET' not in ''.join(queries)
+    assert 'FILTER' not in queries[0]
+    assert 'FILTER (STR(?x) > "2")' in queries[1]
+    assert 'FILTER (STR(?x) > "4")' in queries[2]
+    assert rate_limiter.wait.call_count == 3
+
+
+def test_sparql_query_keyset_paging_rejects_order_by():
+    with pytest.raises(ValueError):
+        list(sparql_query('endpoint', 'SELECT ?x WHERE { ?x a ?y } ORDER BY ?x',
+                          order_by='x'))
+
+
+def _collect(results):
+    return [(key, [row for page in pages for row in page])
+            for key, pages in results]
+
+
+def test_concurrent_sparql_query_preserves_order():
+    def query_func(endpoint, query):
+        return iter([[{'q': query, 'n': 1}], [{'q': query, 'n': 2}]])
+    queries = [(i, f'query {i}') for i in range(10)]
+    results = _collect(concurrent_sparql_query('endpoint', queries,
+                                               max_workers=3,
+                                               query_func=query_func))
+    assert [key for key, _ in results] == list(range(10))
+    for key, rows in results:
+        assert rows == [{'q': f'query {key}', 'n': 1},
+                        {'q': f'query {key}', 'n': 2}]
+
+
+def test_concurrent_sparql_query_checkpoints(tmp_path):
+    checkpoint_file = str(tmp_path / 'checkpoint.txt')
+    query_func = mock.Mock(side_effect=lambda endpoint, query: iter([[query]]))
+    queries = [('a', 'query a'), ('b', 'query b'), ('c', 'query c')]
+
+    # Interrupt after the first query has been processed
+    results = concurrent_sparql_query('endpoint', queries, max_workers=2,
+                                      checkpoint_file=checkpoint_file,
+                                      query_func=query_func)
+    key, pages = next(results)
+    assert (key, list(pages)) == ('a', [['query a']])
+    key, pages = next(results)
+    assert (key, list(pages)) == ('b', [['query b']])
+    results.close()
+
+    # Only 'a' was fully processed, so 'b' and 'c' are resumed
+    query_func.reset_mock()
+    results = _collect(concurrent_sparql_query('endpoint', queries,
+                                               checkpoint_file=checkpoint_file,
+                                               query_func=query_func))
+    assert results == [('b', ['query b']), ('c', ['query c'])]
+    assert query_func.call_count == 2
+
+
+def test_concurrent_sparql_query_streams_and_stops_early():
+    fetched = []
+    def query_func(endpoint, query):
+        for n in range(1000):
+            fetched.append((query, n))
+            yield [n]
+    queries = [(i, f'query {i}') for i in range(100)]
+    results = concurrent_sparql_query('endpoint', queries, max_workers=2,
+                                      max_queued_pages=2,
+                                      query_func=query_func)
+    key, pages = next(results)
+    assert [next(pages), next(pages)] == [[0], [1]]
+    results.close()
+    # Only a few pages of the first couple of queries were ever fetched
+    assert {query for query, _ in fetched} <= {'query 0', 'query 1'}
+    assert len(fetched) < 10
+
+
+def test_concurrent_sparql_query_raises_query_errors():
+    def query_func(endpoint, query):
+        yield [1]
+        raise ValueError(query)
+    results = concurrent_sparql_query('endpoint', [('a', 'query a')],
+                                      query_func=query_func)
+    key, pages = next(results)
+    assert next(pages) == [1]
+    with pytest.raises(ValueError, match='query a'):
+        next(pages)
@@ -83,6 +83,42 @@ def format_duplicate_map(dupe_map):
     return processed_dupe_map
 
 
+def mesh_term_links(project_terms, term_index, projects=None,
+                    projects_done=None):
+    """
+    Resolve the MeSH terms of each project against an in-memory index of
+    known terms in a single pass, generating the new terms and the
+    project-term links to be bulk inserted.
+
+    Args:
+        project_terms (dict): project_id: {'terms': [...], 'ids': [...]},
+                              as returned by MeshJoinTask.format_mesh_terms
+        term_index (dict): term_id: term for all known terms, which is
+                           updated in place with any new terms.
+        projects (set): If specified, only link projects in this set.
+        projects_done (set): Projects which have already been linked.
+
+    Returns:
+        (:obj:`list` of :obj:`dict`): rows of new MeSH terms
+        (:obj:`list` of :obj:`dict`): rows of project-term links
+    """
+    if projects_done is None:
+        projects_done = set()
+    new_terms, links = [], []
+    for project_id, terms in project_terms.items():
+        if project_id in projects_done:
+            continue
+        if projects is not None and project_id not in projects:
+            continue
+        for term, term_id in zip(terms['terms'], terms['ids']):
+            term_id = int(term_id)
+            if term_id not in term_index:
+                term_index[term_id] = term
+                new_terms.append({'id': term_id, 'term': term})
+            links.append({'project_id': project_id, 'mesh_term_id': term_id})
+    return new_terms, links
+
+
 if __name__ == '__main__':
     from sqlalchemy.orm import sessionmaker
     from nesta.core.orms.orm_utils import get_mysql_engine
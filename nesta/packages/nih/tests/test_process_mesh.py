@@ -3,6 +3,7 @@ import pytest
 
 from nesta.packages.nih.process_mesh import format_mesh_terms
 from nesta.packages.nih.process_mesh import format_duplicate_map
+from nesta.packages.nih.process_mesh import mesh_term_links
 
 
 @pytest.fixture
@@ -67,3 +68,19 @@ def test_format_duplicate_map_combines_duplicates_against_the_same_key():
 
     expected_result = {600: [500, 888], 111: [999], 123: [998, 444]}
     assert format_duplicate_map(test_dupe_map) == expected_result
+
+
+def test_mesh_term_links():
+    project_terms = {1: {'terms': ['Mesh', 'Mash'], 'ids': [1, 7]},
+                     2: {'terms': ['Mesh', 'Term'], 'ids': [1, 9]},
+                     3: {'terms': ['Term'], 'ids': [9]},
+                     4: {'terms': ['Other'], 'ids': [5]}}
+    term_index = {7: 'Mash'}
+    new_terms, links = mesh_term_links(project_terms, term_index,
+                                       projects={1, 2, 3}, projects_done={3})
+    assert new_terms == [{'id': 1, 'term': 'Mesh'}, {'id': 9, 'term': 'Term'}]
+    assert links == [{'project_id': 1, 'mesh_term_id': 1},
+                     {'project_id': 1, 'mesh_term_id': 7},
+                     {'project_id': 2, 'mesh_term_id': 1},
+                     {'project_id': 2, 'mesh_term_id': 9}]
+    assert term_index == {1: 'Mesh', 7: 'Mash', 9: 'Term'}
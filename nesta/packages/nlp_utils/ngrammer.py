@@ -7,15 +7,68 @@ previously collected wiktionary n-grams.
 """
 
 import os
+import boto3
+import logging
+from botocore.exceptions import ClientError
 from sqlalchemy.orm import sessionmaker
 from collections import defaultdict
 
 from nesta.core.orms.wiktionary_ngrams_orm import WiktionaryNgram
 from nesta.core.orms.wiktionary_ngrams_orm import Base
 from nesta.core.orms.orm_utils import get_mysql_engine
+from nesta.core.luigihacks.s3 import parse_s3_path
 from nesta.packages.nlp_utils.preprocess import tokenize_document
+from nesta.packages.nlp_utils.preprocess import tokenize_corpus
 from nesta.packages.nlp_utils.preprocess import stop_words
 
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = f"# ngrammer snapshot v{SNAPSHOT_VERSION}"
+
+
+def save_snapshot(ngrams, path):
+    """Save n-grams to a snapshot, which is a plain text file of sorted
+    n-grams (one per line) following a version header.
+
+    Args:
+        ngrams (iterable): The n-grams to save.
+        path (str): Local path or S3 path (s3://bucket/key) of the snapshot.
+    """
+    body = "\n".join([SNAPSHOT_HEADER] + sorted(ngrams))
+    if path.startswith("s3://"):
+        s3 = boto3.resource('s3')
+        s3.Object(*parse_s3_path(path)).put(Body=body.encode('utf-8'))
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(body)
+
+
+def load_snapshot(path):
+    """Load n-grams from a snapshot generated by :obj:`save_snapshot`.
+
+    Args:
+        path (str): Local path or S3 path (s3://bucket/key) of the snapshot.
+    Returns:
+        ngrams (list): The n-grams, or None if the snapshot
+                       doesn't exist or is from a different version.
+    """
+    try:
+        if path.startswith("s3://"):
+            s3 = boto3.resource('s3')
+            body = s3.Object(*parse_s3_path(path)).get()['Body'].read()
+            body = body.decode('utf-8')
+        else:
+            with open(path, encoding='utf-8') as f:
+                body = f.read()
+    except (ClientError, FileNotFoundError):
+        logging.info(f"No n-gram snapshot found at {path}")
+        return None
+    lines = body.split("\n")
+    if lines[0] != SNAPSHOT_HEADER:
+        logging.info(f"Ignoring n-gram snapshot {path}, since its version "
+                     f"is '{lines[0]}' rather than '{SNAPSHOT_HEADER}'")
+        return None
+    return lines[1:]
+
 
 class Ngrammer:
     """Find and replace n-grams in text based on
@@ -26,8 +79,31 @@ class Ngrammer:
                   If not specified, it looks instead for the environ
                   variable 'MYSQLDBCONF'
         database (str): Database name
+        snapshot_path (str): Local or S3 path of an n-gram snapshot
+                  (see :obj:`save_snapshot`). If the snapshot doesn't exist
+                  (or is out of date) the n-grams are instead read from the
+                  database, and then saved to the snapshot.
     """
-    def __init__(self, config_filepath=None, database="dev"):
+    def __init__(self, config_filepath=None, database="dev",
+                 snapshot_path=None):
+        ngrams = None
+        if snapshot_path is not None:
+            ngrams = load_snapshot(snapshot_path)
+        if ngrams is None:
+            ngrams = self._query_ngrams(config_filepath, database)
+            if snapshot_path is not None:
+                save_snapshot(ngrams, snapshot_path)
+        # Split out n-grams by size (speeds up the extraction later)
+        self.ngrams = defaultdict(set)
+        for ngram in ngrams:
+            size = ngram.count("_") + 1
+            self.ngrams[size].add(ngram)
+        self._trie = None
+        self._trie_signature = None
+
+    @staticmethod
+    def _query_ngrams(config_filepath, database):
+        """Read every n-gram from the database"""
         if config_filepath is not None:
             os.environ["MYSQLDBCONF"] = config_filepath
         engine = get_mysql_engine("MYSQLDBCONF", "mysqldb",
@@ -35,11 +111,90 @@ class Ngrammer:
         Session = sessionmaker(engine)
         Base.metadata.create_all(engine)
         session = Session()
-        # Split out n-grams by size (speeds up the extraction later)
-        self.ngrams = defaultdict(set)
-        for row in session.query(WiktionaryNgram).all():
-            size = row.ngram.count("_") + 1
-            self.ngrams[size].add(row.ngram)
+        ngrams = [row.ngram for row in session.query(WiktionaryNgram).all()]
+        session.close()
+        return ngrams
+
+    def build_trie(self):
+        """Build a token trie from :obj:`self.ngrams`, in which each n-gram
+        is a path of its components, terminated by the key :obj:`None`.
+        This is called automatically if the number of n-grams
+        has changed, but should be called explicitly if
+        :obj:`self.ngrams` is otherwise modified in place.
+        """
+        trie = {}
+        for size, ngrams in self.ngrams.items():
+            if size < 2:  # Unigrams are already tokens
+                continue
+            for ngram in ngrams:
+                node = trie
+                for token in ngram.split("_"):
+                    node = node.setdefault(token, {})
+                node[None] = size
+        self._trie = trie
+        self._trie_signature = self._signature()
+        return trie
+
+    def _signature(self):
+        return sorted((size, len(ngrams))
+                      for size, ngrams in self.ngrams.items())
+
+    def find_matches(self, sentence):
+        """Find every n-gram in the sentence in a single scan of the trie.
+
+        Args:
+             sentence (list): Tokens to scan for n-grams.
+        Returns:
+             matches (dict): Start locations of matches, by n-gram size.
+        """
+        if self._trie is None or self._trie_signature != self._signature():
+            self.build_trie()
+        matches = defaultdict(list)
+        n_tokens = len(sentence)
+        for loc, token in enumerate(sentence):
+            node = self._trie.get(token)
+            end = loc + 1
+            while node is not None and end < n_tokens:
+                node = node.get(sentence[end])
+                if node is None:
+                    break
+                end += 1
+                size = node.get(None)
+                if size is not None:
+                    matches[size].append(loc)
+        return matches
+
+    def replace_ngrams(self, sentence):
+        """Find and replace all n-grams in the sentence, in place.
+        This is equivalent to calling :obj:`find_and_replace` recursively
+        for each size, largest first: within each size the leftmost
+        n-grams are replaced first, and n-grams may not overlap
+        with any which have already been replaced.
+
+        Args:
+             sentence (list): Tokens to scan for n-grams.
+        Returns:
+             n_replaced (int): The number of n-grams replaced.
+        """
+        matches = self.find_matches(sentence)
+        taken = [False]*len(sentence)
+        replacements = {}
+        for size in sorted(matches, reverse=True):
+            for loc in matches[size]:
+                if any(taken[loc:loc+size]):
+                    continue
+                taken[loc:loc+size] = [True]*size
+                replacements[loc] = size
+        if not replacements:
+            return 0
+        replaced = []
+        loc = 0
+        while loc < len(sentence):
+            size = replacements.get(loc, 1)
+            replaced.append("_".join(sentence[loc:loc+size]))
+            loc += size
+        sentence[:] = replaced
+        return len(replacements)
 
     def find_and_replace(self, sentence, size):
         """Find and replace any n-grams of :obj:`size`. Stops if a single
@@ -78,15 +233,29 @@ class Ngrammer:
         """
         # Tokenize and clean up the text first
         text = tokenize_document(raw_text)
+        return self._process_tokens(text, remove_stops)
+
+    def process_corpus(self, raw_texts, remove_stops=True, **kwargs):
+        """Tokenize (in parallel, see :obj:`tokenize_corpus`) and insert
+        n-grams into many documents.
+
+        Args:
+             raw_texts (iterable): Raw text documents.
+             remove_stops (bools): Whether or not to remove stops.
+             kwargs: Any other arguments to :obj:`tokenize_corpus`.
+        Yields:
+             processed_doc (list): Iterable ready for word embedding,
+                                   in the order of raw_texts.
+        """
+        for text in tokenize_corpus(raw_texts, **kwargs):
+            yield self._process_tokens(text, remove_stops)
+
+    def _process_tokens(self, text, remove_stops):
+        """Insert n-grams into a tokenized document, and then
+        remove stop words if required."""
         # Replace large n-grams first, then small n-grams
-        for size in sorted(self.ngrams, reverse=True):
-            for sentence in text:
-                # Ignore n-grams longer than the sentence(!)
-                if size > len(sentence):
-                    continue
-                # Replace until done
-                while self.find_and_replace(sentence, size):
-                    pass
+        for sentence in text:
+            self.replace_ngrams(sentence)
 
         # Remove stop words if required
         processed_doc = text
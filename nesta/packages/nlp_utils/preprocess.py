@@ -1,18 +1,66 @@
 import re
 import string
 import gensim
+import logging
 import nltk
+import os
+import time
 from nltk.corpus import stopwords
 import numpy as np
-from operator import iadd
-from functools import reduce
-from sklearn.feature_extraction.text import TfidfVectorizer
-nltk.download('stopwords', quiet=True)
-nltk.download('punkt', quiet=True)
+from collections import Counter
+from collections import deque
+from collections.abc import Set
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
 
-stop_words = set(stopwords.words('english') +
-                 list(string.punctuation) +
-                 ['\\n'] + ['quot'])
+
+def load_nltk_resource(name, load):
+    """Load an NLTK resource from the local NLTK data path (i.e.
+    :obj:`nltk.data.path`, which includes the NLTK_DATA environmental
+    variable), without ever trying to download it.
+
+    Args:
+        name (str): Name of the NLTK package, e.g. 'stopwords'.
+        load (function): Function which loads the resource.
+    Returns:
+        The output of :obj:`load`.
+    """
+    try:
+        return load()
+    except LookupError as err:
+        raise LookupError(f"NLTK resource '{name}' was not found in "
+                          f"{nltk.data.path}. It must be provisioned "
+                          "before use, e.g. with 'python -m nltk.downloader "
+                          f"-d <path> {name}' and setting NLTK_DATA=<path>"
+                          ) from err
+
+
+class StopWords(Set):
+    """English stop words and punctuation, which are only loaded
+    from the NLTK data path on first use."""
+    def __init__(self):
+        self._words = None
+
+    @property
+    def words(self):
+        if self._words is None:
+            words = load_nltk_resource('stopwords',
+                                       lambda: stopwords.words('english'))
+            self._words = set(words + list(string.punctuation) +
+                              ['\\n'] + ['quot'])
+        return self._words
+
+    def __contains__(self, word):
+        return word in self.words
+
+    def __iter__(self):
+        return iter(self.words)
+
+    def __len__(self):
+        return len(self.words)
+
+
+stop_words = StopWords()
 
 regex_str = [r"http[s]?://(?:[a-z]|[0-9]|[$-_@.&+]|"
              r"[!*\(\),](?:%[0-9a-f][0-9a-f]))+",
@@ -38,8 +86,9 @@ def tokenize_document(text, remove_stops=False):
     Return:
         List of preprocessed and tokenized documents
     """
+    sentences = load_nltk_resource('punkt', lambda: nltk.sent_tokenize(text))
     return [clean_and_tokenize(sentence, remove_stops)
-            for sentence in nltk.sent_tokenize(text)]
+            for sentence in sentences]
 
 
 def clean_and_tokenize(text, remove_stops):
@@ -61,6 +110,106 @@ def clean_and_tokenize(text, remove_stops):
     return filtered_tokens
 
 
+def _load_resources(remove_stops):
+    """Load the NLTK resources required by :obj:`tokenize_document`, so that
+    they are loaded once per process rather than once per document.
+    If called before the process pool is forked, the workers inherit them."""
+    load_nltk_resource('punkt', lambda: nltk.sent_tokenize(''))
+    if remove_stops:
+        len(stop_words)
+
+
+def _tokenize_chunk(chunk, remove_stops):
+    """Tokenize a chunk of documents in a worker process"""
+    # Inherited from the parent if forked, otherwise loaded here once
+    # per worker (subsequent calls are cheap)
+    _load_resources(remove_stops)
+    return [tokenize_document(text, remove_stops) for text in chunk]
+
+
+def _chunks(documents, chunksize):
+    documents = iter(documents)
+    while True:
+        chunk = list(islice(documents, chunksize))
+        if len(chunk) == 0:
+            return
+        yield chunk
+
+
+def tokenize_corpus(documents, remove_stops=False, n_jobs=None,
+                    chunksize=100, max_pending=None):
+    """Tokenize many documents (as per :obj:`tokenize_document`) in parallel
+    chunks across a process pool. Documents are yielded in their input
+    order, and no more than max_pending chunks are read ahead of the
+    consumer, so that memory is bounded for arbitrarily large iterables.
+    The throughput (documents per second) is logged on completion.
+
+    Args:
+        documents (iterable): Raw strings of text.
+        remove_stops (bool): Flag to remove english stopwords
+        n_jobs (int): Number of worker processes, defaults to the number of
+                      CPUs. If 1, documents are tokenized in this process.
+        chunksize (int): Number of documents sent to a worker at a time.
+        max_pending (int): Number of chunks in flight, defaults to 2*n_jobs.
+    Yields:
+        tokens (list): Tokenized document, i.e. a list of lists of tokens.
+    """
+    if n_jobs is None:
+        n_jobs = os.cpu_count()
+    if max_pending is None:
+        max_pending = 2 * n_jobs
+    _load_resources(remove_stops)
+    start, n_docs = time.time(), 0
+    chunks = _chunks(documents, chunksize)
+    if n_jobs == 1:
+        for chunk in chunks:
+            n_docs += len(chunk)
+            yield from _tokenize_chunk(chunk, remove_stops)
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            pending = deque()
+            for chunk in chain(chunks, [None]):
+                if chunk is not None:
+                    n_docs += len(chunk)
+                    pending.append(executor.submit(_tokenize_chunk, chunk,
+                                                   remove_stops))
+                # Yield from the oldest chunks, to preserve the order
+                while pending and (chunk is None or
+                                   len(pending) >= max_pending):
+                    yield from pending.popleft().result()
+    duration = time.time() - start
+    logging.info(f"Tokenized {n_docs} documents in {duration:.1f}s "
+                 f"({n_docs / max(duration, 1e-9):.1f} documents/s)")
+
+
+def idf_mask(documents, lower_idf_limit, upper_idf_limit):
+    """Identify the terms to keep, in a single pass over the documents.
+    The IDF is calculated identically to :obj:`TfidfVectorizer`
+    (i.e. with smoothing), but directly from the document frequencies.
+
+    Args:
+        documents (iterable): Iterables of terms.
+        lower_idf_limit (float): Lower percentile (between 0 and 100) on which
+                                 to exclude terms by their IDF.
+        upper_idf_limit (float): Upper percentile (between 0 and 100) on which
+                                 to exclude terms by their IDF.
+    Returns:
+        keep (dict): Mapping of each term to whether it should be kept.
+    """
+    doc_freqs = Counter()
+    n_docs = 0
+    for doc in documents:
+        doc_freqs.update(set(doc))
+        n_docs += 1
+    df = np.fromiter(doc_freqs.values(), dtype=np.float64,
+                     count=len(doc_freqs))
+    idf = np.log((n_docs + 1) / (df + 1)) + 1
+    lower_idf = np.percentile(idf, lower_idf_limit)
+    upper_idf = np.percentile(idf, upper_idf_limit)
+    mask = (idf >= lower_idf) & (idf < upper_idf)
+    return dict(zip(doc_freqs, mask.tolist()))
+
+
 def filter_by_idf(documents, lower_idf_limit, upper_idf_limit):
     """Remove (from documents) terms which are in a range of IDF values.
     
@@ -79,22 +228,14 @@ def filter_by_idf(documents, lower_idf_limit, upper_idf_limit):
     # Check the shape of the input documents
     docs = documents
     if type(documents[0]) is list:
-        docs = [reduce(iadd, d) for d in documents]
-    # Evaluate the TFIDF
-    tfidf = TfidfVectorizer(tokenizer=lambda x: x, lowercase=False)
-    tfidf.fit(docs)
-    lower_idf = np.percentile(tfidf.idf_, lower_idf_limit)
-    upper_idf = np.percentile(tfidf.idf_, upper_idf_limit)
-    # Pick out the vocab to be dropped
-    drop_vocab = set(term for term, idx in tfidf.vocabulary_.items()
-                     if tfidf.idf_[idx] < lower_idf
-                     or tfidf.idf_[idx] >= upper_idf)
+        docs = (chain.from_iterable(d) for d in documents)
+    keep = idf_mask(docs, lower_idf_limit, upper_idf_limit)
     # Filter the documents
     new_docs = []
     for doc in documents:
         _new_doc = []
         for sent in doc:
-            _new_sent = [w for w in sent if w not in drop_vocab]
+            _new_sent = [w for w in sent if keep[w]]
             if len(_new_sent) == 0:
                 continue
             _new_doc.append(_new_sent)
@@ -0,0 +1,50 @@
+"""
+benchmark_ngrammer
+==================
+
+Throughput (tokens/second) of n-gram replacement with the token trie
+(:obj:`Ngrammer.replace_ngrams`) against the original algorithm
+(calling :obj:`Ngrammer.find_and_replace` until no n-gram is left,
+for each size), on a synthetic corpus. Run with:
+
+    python nesta/packages/nlp_utils/tests/benchmark_ngrammer.py
+"""
+
+import random
+import time
+
+from nesta.packages.nlp_utils.ngrammer import Ngrammer
+from nesta.packages.nlp_utils.tests.test_ngrammer import make_ngrammer
+from nesta.packages.nlp_utils.tests.test_ngrammer import find_and_replace_all
+
+
+def throughput(func, ngrammer, sentences):
+    n_tokens = sum(len(sentence) for sentence in sentences)
+    start = time.time()
+    for sentence in sentences:
+        func(ngrammer, list(sentence))
+    return n_tokens / (time.time() - start)
+
+
+def run(n_tokens=200000, vocab_size=2000, n_ngrams=200000, match_every=5,
+        sentence_lengths=(25, 100, 1000), seed=42):
+    random.seed(seed)
+    words = [f"w{random.randint(0, vocab_size)}" for _ in range(n_tokens)]
+    ngrams = {"_".join(f"w{random.randint(0, vocab_size)}"
+                       for _ in range(random.randint(2, 4)))
+              for _ in range(n_ngrams)}
+    # Plant n-grams in the corpus
+    ngrams.update(f"{a}_{b}" for a, b in zip(words[::match_every],
+                                              words[1::match_every]))
+    ngrammer = make_ngrammer(ngrams)
+    ngrammer.build_trie()  # Don't time building the trie
+    for length in sentence_lengths:
+        sentences = [words[i:i+length] for i in range(0, n_tokens, length)]
+        trie = throughput(Ngrammer.replace_ngrams, ngrammer, sentences)
+        original = throughput(find_and_replace_all, ngrammer, sentences)
+        print(f"{length} token sentences: {trie:,.0f} tokens/s "
+              f"(originally {original:,.0f} tokens/s)")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,33 @@
+"""
+benchmark_preprocess
+====================
+
+Time :obj:`filter_by_idf` against the previous implementation (fitting a
+:obj:`TfidfVectorizer` and filtering against a set of dropped terms) on
+synthetic tokenized corpora of increasing size. Run with:
+
+    python nesta/packages/nlp_utils/tests/benchmark_preprocess.py
+"""
+
+import time
+
+from nesta.packages.nlp_utils.preprocess import filter_by_idf
+from nesta.packages.nlp_utils.tests.test_preprocess import filter_by_idf_tfidf
+from nesta.packages.nlp_utils.tests.test_preprocess import synthetic_corpus
+
+
+def run(sizes=(100, 1000, 10000)):
+    for n_docs in sizes:
+        docs = synthetic_corpus(n_docs)
+        times = []
+        for func in (filter_by_idf_tfidf, filter_by_idf):
+            start = time.time()
+            result = func(docs, 10, 90)
+            times.append(time.time() - start)
+        assert result == filter_by_idf_tfidf(docs, 10, 90)
+        print(f"{n_docs:>6} documents: {1000*times[0]:8.1f} ms --> "
+              f"{1000*times[1]:8.1f} ms")
+
+
+if __name__ == "__main__":
+    run()
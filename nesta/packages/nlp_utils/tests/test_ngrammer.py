@@ -1,5 +1,34 @@
+import os
+import random
+from tempfile import TemporaryDirectory
 from unittest import TestCase
+from unittest import mock
+
 from nesta.packages.nlp_utils.ngrammer import Ngrammer
+from nesta.packages.nlp_utils.ngrammer import save_snapshot
+from nesta.packages.nlp_utils.ngrammer import load_snapshot
+
+PATH = 'nesta.packages.nlp_utils.ngrammer.{}'
+
+
+@mock.patch(PATH.format('Base'))
+@mock.patch(PATH.format('sessionmaker'))
+@mock.patch(PATH.format('get_mysql_engine'))
+def make_ngrammer(ngrams, mocked_engine, mocked_session, mocked_base,
+                  **kwargs):
+    """Ngrammer with the given n-grams, read from a mocked database"""
+    rows = [mock.Mock(ngram=ngram) for ngram in ngrams]
+    mocked_session()().query().all.return_value = rows
+    return Ngrammer(**kwargs)
+
+
+def find_and_replace_all(ngrammer, sentence):
+    """The original algorithm, for regression testing"""
+    for size in sorted(ngrammer.ngrams, reverse=True):
+        if size > len(sentence):
+            continue
+        while ngrammer.find_and_replace(sentence, size):
+            pass
 
 
 class TestNgrammer(TestCase):
@@ -16,3 +45,99 @@ class TestNgrammer(TestCase):
         for _, ngrams in ngrammer.ngrams.items():
             for ng in ngrams:
                 self.assertIn(ng, processed_doc[0])
+
+    def test_replace_ngrams(self):
+        ngrammer = make_ngrammer(['neural_networks',
+                                  'convolutional_neural_networks',
+                                  'bed_and_breakfast', 'and_bed'])
+        sentence = ['convolutional', 'neural', 'networks', 'neural',
+                    'networks', 'and', 'bed', 'and', 'breakfast']
+        self.assertEqual(ngrammer.replace_ngrams(sentence), 3)
+        self.assertEqual(sentence, ['convolutional_neural_networks',
+                                    'neural_networks', 'and',
+                                    'bed_and_breakfast'])
+
+    def test_replace_ngrams_larger_first(self):
+        # A smaller n-gram to the left doesn't block a larger n-gram
+        ngrammer = make_ngrammer(['a_b', 'b_c_d'])
+        sentence = ['a', 'b', 'c', 'd']
+        ngrammer.replace_ngrams(sentence)
+        self.assertEqual(sentence, ['a', 'b_c_d'])
+
+    def test_replace_ngrams_rebuilds_trie(self):
+        ngrammer = make_ngrammer(['a_b'])
+        sentence = ['a', 'b', 'c']
+        ngrammer.replace_ngrams(sentence)
+        self.assertEqual(sentence, ['a_b', 'c'])
+        ngrammer.ngrams[2].add('b_c')
+        sentence = ['b', 'c']
+        ngrammer.replace_ngrams(sentence)
+        self.assertEqual(sentence, ['b_c'])
+
+    def test_replace_ngrams_regression(self):
+        random.seed(42)
+        tokens = list('abcde') + ['a_b', 'c_d']
+        for _ in range(500):
+            ngrams = {'_'.join(random.choice('abcde')
+                               for _ in range(random.randint(2, 4)))
+                      for _ in range(random.randint(1, 20))}
+            ngrammer = make_ngrammer(ngrams)
+            sentence = [random.choice(tokens)
+                        for _ in range(random.randint(0, 25))]
+            expected = list(sentence)
+            find_and_replace_all(ngrammer, expected)
+            ngrammer.replace_ngrams(sentence)
+            self.assertEqual(sentence, expected)
+
+    def test_snapshot_round_trip(self):
+        with TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'ngrams.txt')
+            save_snapshot({'b_c', 'a_b', 'a_b_c'}, path)
+            self.assertEqual(load_snapshot(path), ['a_b', 'a_b_c', 'b_c'])
+            self.assertIsNone(load_snapshot(os.path.join(tmp_dir,
+                                                         'missing.txt')))
+
+    def test_snapshot_wrong_version(self):
+        with TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'ngrams.txt')
+            with open(path, 'w') as f:
+                f.write('# ngrammer snapshot v0\na_b')
+            self.assertIsNone(load_snapshot(path))
+
+    def test_ngrammer_from_snapshot(self):
+        with TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'ngrams.txt')
+            # The first ngrammer reads the database and saves the snapshot
+            ngrammer = make_ngrammer(['a_b', 'a_b_c'], snapshot_path=path)
+            self.assertEqual(load_snapshot(path), ['a_b', 'a_b_c'])
+            # Subsequent ngrammers don't touch the database
+            with mock.patch(PATH.format('get_mysql_engine')) as mocked_engine:
+                _ngrammer = Ngrammer(snapshot_path=path)
+        self.assertEqual(mocked_engine.call_count, 0)
+        self.assertEqual(_ngrammer.ngrams, {2: {'a_b'}, 3: {'a_b_c'}})
+        self.assertEqual(ngrammer.ngrams, _ngrammer.ngrams)
+
+    @mock.patch(PATH.format('boto3'))
+    def test_snapshot_s3(self, mocked_boto3):
+        save_snapshot(['a_b'], 's3://bucket/ngrams.txt')
+        mocked_boto3.resource().Object.assert_called_with('bucket',
+                                                          'ngrams.txt')
+        body = mocked_boto3.resource().Object().put.call_args[1]['Body']
+        mocked_boto3.resource().Object().get.return_value = {'Body': mock.Mock()}
+        mocked_boto3.resource().Object().get()['Body'].read.return_value = body
+        self.assertEqual(load_snapshot('s3://bucket/ngrams.txt'), ['a_b'])
+
+    @mock.patch('nesta.packages.nlp_utils.preprocess.nltk.sent_tokenize',
+                side_effect=lambda text: text.split('. '))
+    def test_process_corpus(self, mocked_sent_tokenize):
+        ngrammer = make_ngrammer(['neural_networks', 'bed_and_breakfast'])
+        documents = [f'Neural networks {i}. A bed and breakfast'
+                     for i in range(20)]
+        processed = list(ngrammer.process_corpus(documents,
+                                                 remove_stops=False,
+                                                 n_jobs=2, chunksize=3))
+        self.assertEqual(processed,
+                         [ngrammer.process_document(doc, remove_stops=False)
+                          for doc in documents])
+        self.assertEqual(processed[0], [['neural_networks'],
+                                        ['a', 'bed_and_breakfast']])
@@ -1,8 +1,21 @@
 from nesta.packages.nlp_utils.preprocess import tokenize_document
 from nesta.packages.nlp_utils.preprocess import filter_by_idf
+from nesta.packages.nlp_utils.preprocess import StopWords
+from nesta.packages.nlp_utils.preprocess import tokenize_corpus
+from itertools import accumulate, chain
 import nltk
 from nltk.corpus import gutenberg
 import unittest
+from unittest import mock
+import pytest
+import json
+import numpy as np
+import os
+import random
+import subprocess
+import sys
+import textwrap
+from sklearn.feature_extraction.text import TfidfVectorizer
 
 
 def get_vocab(docs):
@@ -32,5 +45,141 @@ class PreprocessTest(unittest.TestCase):
         self.assertGreater(len(vocab_after), 1)
 
 
+def filter_by_idf_tfidf(documents, lower_idf_limit, upper_idf_limit):
+    """The previous implementation of filter_by_idf, except that the
+    documents are flattened without modifying them in place."""
+    docs = [list(chain.from_iterable(d)) for d in documents]
+    tfidf = TfidfVectorizer(tokenizer=lambda x: x, lowercase=False)
+    tfidf.fit(docs)
+    lower_idf = np.percentile(tfidf.idf_, lower_idf_limit)
+    upper_idf = np.percentile(tfidf.idf_, upper_idf_limit)
+    drop_vocab = set(term for term, idx in tfidf.vocabulary_.items()
+                     if tfidf.idf_[idx] < lower_idf
+                     or tfidf.idf_[idx] >= upper_idf)
+    new_docs = []
+    for doc in documents:
+        _new_doc = []
+        for sent in doc:
+            _new_sent = [w for w in sent if w not in drop_vocab]
+            if len(_new_sent) == 0:
+                continue
+            _new_doc.append(_new_sent)
+        new_docs.append(_new_doc)
+    return new_docs
+
+
+def synthetic_corpus(n_docs, vocab_size=50000, seed=42):
+    """Documents of 5-15 sentences of 5-25 tokens, with Zipfian
+    term frequencies."""
+    rng = random.Random(seed)
+    vocab = [f'term{i}' for i in range(vocab_size)]
+    cum_weights = list(accumulate(1 / (rank + 1)
+                                  for rank in range(vocab_size)))
+    return [[rng.choices(vocab, cum_weights=cum_weights,
+                         k=rng.randint(5, 25))
+             for _ in range(rng.randint(5, 15))]
+            for _ in range(n_docs)]
+
+
+def test_filter_by_idf_matches_tfidf():
+    docs = synthetic_corpus(200, vocab_size=500)
+    original = [[list(sent) for sent in doc] for doc in docs]
+    for lower, upper in [(10, 90), (0, 100), (25, 50)]:
+        assert filter_by_idf(docs, lower, upper) == \
+            filter_by_idf_tfidf(docs, lower, upper)
+    assert docs == original  # not modified in place
+
+
+PATH = 'nesta.packages.nlp_utils.preprocess.{}'
+
+
+# Note: the patch is inherited by the (forked) worker processes
+@mock.patch(PATH.format('nltk.sent_tokenize'),
+            side_effect=lambda text: text.split('. '))
+@pytest.mark.parametrize('n_jobs', [1, 3])
+def test_tokenize_corpus(mocked_sent_tokenize, n_jobs, caplog):
+    texts = [f'Document number {i}. It has {i % 7} sentence-ish things'
+             for i in range(250)]
+    consumed = []
+
+    def documents():
+        for text in texts:
+            consumed.append(text)
+            yield text
+
+    caplog.set_level('INFO')
+    tokens = tokenize_corpus(documents(), n_jobs=n_jobs, chunksize=10,
+                             max_pending=4)
+    first = next(tokens)
+    # Only a bounded number of chunks are read ahead
+    assert len(consumed) <= 50
+    assert [first] + list(tokens) == [tokenize_document(text)
+                                      for text in texts]
+    assert first == [['document', 'number'],
+                     ['it', 'has', 'sentence_ish', 'things']]
+    assert 'Tokenized 250 documents' in caplog.text
+
+
+# Import and use preprocess in a fresh interpreter with networking disabled
+OFFLINE_SCRIPT = textwrap.dedent("""
+    import json, os, socket, time
+    import nltk
+    # Only search the given NLTK_DATA (which NLTK otherwise prepends to
+    # the default paths), so that no system-wide data is found
+    nltk.data.path[:] = [os.environ['NLTK_DATA']]
+    def no_network(*args, **kwargs):
+        raise OSError("Networking is disabled")
+    socket.socket.connect = socket.socket.connect_ex = no_network
+    socket.getaddrinfo = socket.create_connection = no_network
+    start = time.time()
+    from nesta.packages.nlp_utils import preprocess
+    output = {'import_time': time.time() - start}
+    try:
+        output['tokens'] = preprocess.clean_and_tokenize('the cat, and a dog',
+                                                         remove_stops=True)
+        output['stop_words'] = sorted(preprocess.stop_words)[:3]
+    except LookupError as err:
+        output['stopwords_error'] = str(err)
+    try:
+        preprocess.tokenize_document('A sentence. Another one.')
+    except LookupError as err:
+        output['punkt_error'] = str(err)
+    print(json.dumps(output))
+""")
+
+
+def run_offline(nltk_data):
+    env = {**os.environ, 'NLTK_DATA': str(nltk_data)}
+    result = subprocess.run([sys.executable, '-c', OFFLINE_SCRIPT],
+                            env=env, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, universal_newlines=True,
+                            check=True, timeout=120)
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def test_offline_stopwords(tmp_path):
+    # A pre-provisioned (synthetic) NLTK data path, without punkt
+    corpus = tmp_path / 'corpora' / 'stopwords'
+    corpus.mkdir(parents=True)
+    (corpus / 'english').write_text('the\nand\nabc\n')
+    output = run_offline(tmp_path)
+    assert output['tokens'] == ['cat', 'dog']
+    assert output['stop_words'] == ['!', '"', '#']
+    assert "NLTK resource 'punkt' was not found" in output['punkt_error']
+    assert output['import_time'] < 30
+
+
+def test_offline_missing_resources(tmp_path, monkeypatch):
+    monkeypatch.setattr(nltk.data, 'path', [str(tmp_path)])
+    with mock.patch.object(nltk, 'download') as mocked_download:
+        stop_words = StopWords()
+        with pytest.raises(LookupError, match="'stopwords' was not found"):
+            'the' in stop_words
+    assert mocked_download.call_count == 0
+    output = run_offline(tmp_path)
+    assert "'stopwords' was not found" in output['stopwords_error']
+    assert "'punkt' was not found" in output['punkt_error']
+
+
 if __name__ == "__main__":
     unittest.main()
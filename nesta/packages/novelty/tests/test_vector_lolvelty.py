@@ -0,0 +1,74 @@
+import pytest
+from unittest import mock
+import numpy as np
+from nesta.packages.novelty.lolvelty import lolvelty
+from nesta.packages.novelty.vector_lolvelty import novelty_from_similarities
+from nesta.packages.novelty.vector_lolvelty import vector_lolvelty
+from nesta.packages.novelty.vector_lolvelty import tfidf_vectors
+from nesta.packages.novelty.vector_lolvelty import write_scores
+
+
+def test_novelty_from_similarities_matches_lolvelty():
+    es = mock.MagicMock()
+    es.count.return_value = {'count': 100}
+    for hits in ([100, 5, 1, 1, 1], [1, 1, 1, 1, 1], [10, 10, 1, 1, 1]):
+        es.search.return_value = {'hits': {'hits': [{'_score': s}
+                                                    for s in hits],
+                                           'max_score': max(hits)}}
+        D = np.array([hits], dtype=np.float32)
+        I = np.arange(len(hits))[None, :]
+        for human_friendly in (True, False):
+            score, = novelty_from_similarities(D, I,
+                                               human_friendly=human_friendly)
+            expected = lolvelty(es, 'an_index', 'some_doc', [''],
+                                human_friendly=human_friendly)
+            assert score == pytest.approx(expected, rel=1e-5)
+
+
+def test_novelty_from_similarities_ignores_invalid():
+    D = np.array([[1, 0.5, -0.2, 0.1],
+                  [1, 0, -1, 0],
+                  [1, 0.9, 0.8, 0.7]], dtype=np.float32)
+    I = np.array([[0, 1, 2, -1],
+                  [1, 2, 3, 0],
+                  [2, 1, 0, 3]])
+    scores = novelty_from_similarities(D, I)
+    assert scores[1] is None
+    expected, = novelty_from_similarities(D[:1, :2], I[:1, :2])
+    assert scores[0] == pytest.approx(expected)
+    assert scores[2] < scores[0]
+
+
+def test_vector_lolvelty():
+    np.random.seed(0)
+    # A tight cluster of near duplicates plus one "novel" outlier
+    centre = np.random.uniform(size=64)
+    data = centre + np.random.normal(scale=0.01, size=(50, 64))
+    outlier = np.random.uniform(size=(1, 64))
+    data = np.vstack([data, outlier]).astype(np.float32)
+    data /= np.linalg.norm(data, axis=1)[:, None]
+    ids = np.array([f'id{i}' for i in range(len(data))])
+    scores = vector_lolvelty(data, ids, k=20, n_clusters=4, chunksize=7)
+    assert len(scores) == len(data)
+    assert scores['id50'] > max(scores[f'id{i}'] for i in range(50))
+
+
+def test_tfidf_vectors():
+    texts = ['the cat sat on the mat', 'the cat sat on a hat',
+             'quantum field theory of gravity', 'a dog sat on the mat']
+    data = tfidf_vectors(texts, n_components=3)
+    assert data.shape == (4, 3)
+    assert data.dtype == np.float32
+    assert np.allclose(np.linalg.norm(data, axis=1), 1, atol=1e-5)
+
+
+def test_write_scores():
+    es = mock.MagicMock()
+    n = write_scores(es, 'an_index', '_doc', {'a': 1.2, 'b': None},
+                     'metric_novelty_article')
+    assert n == 2
+    _, kwargs = es.update_fields_bulk.call_args
+    assert kwargs['index'] == 'an_index'
+    assert kwargs['doc_type'] == '_doc'
+    assert kwargs['docs'] == {'a': {'metric_novelty_article': 1.2},
+                              'b': {'metric_novelty_article': None}}
@@ -0,0 +1,146 @@
+"""
+vector_lolvelty
+===============
+
+Batch calculation of the :obj:`lolvelty` novelty score from locally
+built vectors, rather than via one Elasticsearch `more_like_this`
+query per document. The score is defined in exactly the same way:
+the (up to) `k` most similar documents are retrieved, their similarity
+is normalised to the most similar document (typically the document itself)
+and novelty is derived from the `similar_perc` percentile of these
+normalised similarities.
+
+Vectors can either be latent TF-IDF vectors (see :obj:`tfidf_vectors`) or
+any precomputed embeddings (e.g. BERT vectors read via
+:obj:`nesta.packages.vectors.read.download_vectors`), which are indexed with
+FAISS and queried in chunks. Since all of the work happens locally,
+the scores for an entire corpus can be calculated in one go, and then
+written back to Elasticsearch with partial bulk updates.
+"""
+
+from nesta.packages.vectors.similarity import build_index
+from nesta.packages.vectors.similarity import search_in_chunks
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.decomposition import TruncatedSVD
+from sklearn.preprocessing import normalize
+import numpy as np
+import faiss
+import logging
+
+
+def tfidf_vectors(texts, n_components=300, max_doc_frac=0.75,
+                  min_df=1, random_state=42):
+    """Latent (i.e. SVD-reduced) TF-IDF vectors, normalised
+    such that the inner product of two vectors is their cosine similarity.
+
+    Args:
+        texts (list): List of document texts.
+        n_components (int): Dimensionality of the output vectors, capped
+                            at one fewer than the vocabulary size.
+        max_doc_frac (float): Maximum fraction of documents a term can
+                              be present in (cuts out stop words).
+        min_df (int): Minimum number of documents a term must be present in.
+        random_state (int): Seed for the SVD, for reproducibility.
+    Returns:
+        data (np.array): An (n_docs x n_components) float32 array of vectors.
+    """
+    tfidf = TfidfVectorizer(max_df=max_doc_frac, min_df=min_df,
+                            sublinear_tf=True)
+    X = tfidf.fit_transform(texts)
+    n_components = min(n_components, X.shape[1] - 1)
+    svd = TruncatedSVD(n_components=n_components,
+                       random_state=random_state)
+    data = normalize(svd.fit_transform(X))
+    return np.ascontiguousarray(data, dtype=np.float32)
+
+
+def novelty_from_similarities(D, I, similar_perc=25, human_friendly=True):
+    """Calculate the lolvelty score for each row of a FAISS search result.
+    Non-positive similarities (i.e. unrelated documents) and missing
+    results are ignored, analogously to documents which would not be
+    matched by the `more_like_this` query in :obj:`lolvelty`.
+
+    Args:
+        D (np.array): Similarities of the nearest neighbours of each query.
+        I (np.array): Indexes of the nearest neighbours of each query.
+        similar_perc (float): Percentile of normalised similarities to
+                              define novelty from.
+        human_friendly (bool): Rescale the score to a human-friendly scale.
+    Returns:
+        scores (list): A novelty score (or None) for each row.
+    """
+    valid = (I >= 0) & (D > 0)
+    enough = valid.sum(axis=1) > 1
+    scores = [None]*len(D)
+    if not enough.any():
+        return scores
+    # Normalise to the most similar document, ignoring invalid results
+    sims = np.where(valid[enough], D[enough], np.nan)
+    sims /= np.nanmax(sims, axis=1)[:, None]
+    deltas = np.nanpercentile(sims, similar_perc, axis=1)
+    if human_friendly:
+        _scores = 10*(similar_perc - 100*deltas)
+    else:
+        _scores = 1 - deltas
+    for irow, score in zip(np.where(enough)[0], _scores):
+        scores[irow] = float(score)
+    return scores
+
+
+def vector_lolvelty(data, ids, similar_perc=25, k=1000,
+                    n_clusters=250, nprobe=100,
+                    chunksize=10000, human_friendly=True):
+    """Calculate the lolvelty score for every vector in the data,
+    via batched k-NN queries against a FAISS index.
+
+    Args:
+        data (np.array): An array of L2-normalised vectors (e.g. from
+                         :obj:`tfidf_vectors` or BERT).
+        ids (np.array): An array of id fields, aligned with the data.
+        similar_perc (float): Percentile of normalised similarities to
+                              define novelty from.
+        k (int): The number of similar documents to consider per document.
+        n_clusters (int): Number of IVF cells in the FAISS index.
+        nprobe (int): Number of IVF cells to visit for each query.
+        chunksize (int): The number of documents to query at a time.
+        human_friendly (bool): Rescale the score to a human-friendly scale.
+    Returns:
+        scores (dict): Lookup of document id to novelty score (or None).
+    """
+    data = np.ascontiguousarray(data, dtype=np.float32)
+    n, _ = data.shape
+    k = n if k > n else k
+    index = build_index(data, n_clusters=n_clusters,
+                        metric=faiss.METRIC_INNER_PRODUCT,
+                        nprobe=nprobe)
+    scores = {}
+    offset = 0
+    for D, I in search_in_chunks(index, data, k, chunksize=chunksize):
+        _scores = novelty_from_similarities(D, I, similar_perc=similar_perc,
+                                            human_friendly=human_friendly)
+        for _id, score in zip(ids[offset:offset+len(D)], _scores):
+            scores[str(_id)] = score
+        offset += len(D)
+        logging.info(f"Calculated novelty for {offset} of {n} documents")
+    return scores
+
+
+def write_scores(es, index, doc_type, scores, score_field,
+                 chunk_size=1000):
+    """Write novelty scores to existing Elasticsearch documents,
+    via partial-document bulk updates.
+
+    Args:
+        es (ElasticsearchPlus): Elasticsearch object.
+        index (str): Elasticsearch index to update.
+        doc_type (str): Document type to supply to ES.
+        scores (dict): Lookup of document id to novelty score.
+        score_field (str): Name of the field to write the score to.
+        chunk_size (int): Number of updates per bulk request.
+    Returns:
+        n_docs (int): The number of updated documents.
+    """
+    docs = {_id: {score_field: score} for _id, score in scores.items()}
+    es.update_fields_bulk(index=index, doc_type=doc_type, docs=docs,
+                          chunk_size=chunk_size)
+    return len(docs)
@@ -1,9 +1,13 @@
 from nesta.core.orms.orm_utils import get_mysql_engine
 import os
 from sqlalchemy.orm import Session
+from sqlalchemy.sql import text
 import pandas as pd
 
 MYSQL_INTEGER_LIMIT = 18446744073709551615  # BIGINT
+# Seconds that MySQL will wait for the client to read from a streaming
+# cursor before dropping the connection (the server default is 60s)
+NET_WRITE_TIMEOUT = 3600
 
 def generate_temp_tables(engine, limit=MYSQL_INTEGER_LIMIT, region='eu'):
     '''
@@ -83,6 +87,81 @@ def concat_dfs(dfs):
     return data
 
 
+def split_appln_columns(df, delimiter=','):
+    '''Vectorised equivalent of :obj:`pop_and_split` on the appln_id and
+    appln_auth columns, for every row of a table at once.
+
+    Args:
+        df (pd.DataFrame): Rows of one of the temporary tables.
+        delimiter (str): Delimiter of the concatenated fields.
+    Returns:
+        data (list): List of dictionaries, with appln_id and appln_auth
+                     split into lists of strings.
+    '''
+    df = df.copy()
+    for col in ('appln_id', 'appln_auth'):
+        df[col] = df[col].astype(str).str.split(delimiter)
+    return df.to_dict('records')
+
+
+def stream_temp_tables(connection, tables=["tmp_appln_fam_groups",
+                                           "tmp_appln_no_fam"],
+                       chunksize=10000, limit=None):
+    '''Stream the required temporary tables from a server-side cursor,
+    yielding the same rows as :obj:`concat_dfs` in fixed-size chunks, so
+    that no more than one chunk is held in memory. On MySQL the server
+    drops the connection if a chunk is not consumed within
+    net_write_timeout, so this is raised to :obj:`NET_WRITE_TIMEOUT` for
+    the session: reduce the chunksize if processing a chunk can take
+    longer than that.
+
+    Args:
+        connection (sqlalchemy.Connection): The connection in which the
+                                            temp tables exist.
+        tables (list): Tables to extract.
+        chunksize (int): Number of rows per chunk.
+        limit (int): Max results to return per table.
+    Yields:
+        data (list): Chunk of (at most) chunksize rows, as dictionaries.
+    '''
+    if connection.dialect.name == 'mysql':
+        connection.execute(f"SET SESSION net_write_timeout = "
+                           f"{NET_WRITE_TIMEOUT}")
+    connection = connection.execution_options(stream_results=True)
+    data = []
+    for tbl in tables:
+        results = connection.execute(text(f"SELECT * FROM {tbl}"))
+        columns = list(results.keys())
+        totalsize = 0
+        while limit is None or totalsize < limit:
+            size = chunksize if limit is None else min(chunksize,
+                                                       limit - totalsize)
+            rows = results.fetchmany(size)
+            if len(rows) == 0:
+                break
+            totalsize += len(rows)
+            data += split_appln_columns(pd.DataFrame(rows, columns=columns))
+            while len(data) >= chunksize:
+                yield data[:chunksize]
+                data = data[chunksize:]
+        results.close()
+    if len(data) > 0:
+        yield data
+
+
+def stream_data(limit=None, db='patstat_2019_05_13', region='eu',
+                chunksize=10000):
+    '''Streaming equivalent of :obj:`extract_data`, yielding
+    chunks which are ready for :obj:`insert_data`.'''
+    engine = get_mysql_engine('MYSQLDB', 'mysqldb', db)
+    with engine.connect() as connection:
+        # The temp tables only exist in this connection
+        session = generate_temp_tables(connection, limit=limit, region=region)
+        yield from stream_temp_tables(connection, chunksize=chunksize,
+                                      limit=limit)
+        session.close()
+
+
 def extract_data(limit=None, db='patstat_2019_05_13', region='eu'):
     '''Get all patents, grouped and aggregated by their doc families'''
     engine = get_mysql_engine('MYSQLDB', 'mysqldb', db)
@@ -1,12 +1,16 @@
 import pytest
 from unittest import mock
 from pandas.testing import assert_frame_equal
+from sqlalchemy import create_engine
 
 from nesta.packages.patstat.fetch_appln import pd
 from nesta.packages.patstat.fetch_appln import concat_dfs
 from nesta.packages.patstat.fetch_appln import pop_and_split
 from nesta.packages.patstat.fetch_appln import temp_tables_to_dfs
 from nesta.packages.patstat.fetch_appln import generate_temp_tables
+from nesta.packages.patstat.fetch_appln import split_appln_columns
+from nesta.packages.patstat.fetch_appln import stream_temp_tables
+from nesta.packages.patstat.fetch_appln import stream_data
 
 PATH='nesta.packages.patstat.fetch_appln.{}'
 
@@ -122,3 +126,68 @@ def test_generate_temp_tables(mocked_session, mocked_open):
     session = generate_temp_tables(engine=None)    
     assert len(session.execute.call_args_list) == 32
     assert len(session.commit.call_args_list) == 1
+
+
+def test_split_appln_columns(dfs):
+    for df in dfs.values():
+        assert split_appln_columns(df) == concat_dfs({'df': df})
+        assert 'appln_id' in df.columns  # not modified in place
+
+
+def _create_temp_tables(connection, n_groups=25, n_no_groups=12):
+    """Synthetic versions of the PATSTAT temp tables"""
+    auths = ['GB', 'DE', 'CN']
+    connection.execute("CREATE TEMPORARY TABLE tmp_appln_fam_groups "
+                       "(docdb_family_id INTEGER, nb_citing_docdb_fam "
+                       "INTEGER, earliest_filing_year INTEGER, "
+                       "appln_id TEXT, appln_auth TEXT)")
+    connection.execute("CREATE TEMPORARY TABLE tmp_appln_no_fam "
+                       "(appln_id INTEGER, appln_auth TEXT, "
+                       "nb_citing_docdb_fam INTEGER, "
+                       "earliest_filing_year INTEGER, "
+                       "docdb_family_id INTEGER)")
+    for i in range(n_groups):
+        appln_ids = ','.join(str(100*i + j) for j in range(i % 4 + 1))
+        connection.execute("INSERT INTO tmp_appln_fam_groups VALUES "
+                           "(?, ?, ?, ?, ?)", (i, i % 3, 2000 + i, appln_ids,
+                                               ','.join(auths[:i % 3 + 1])))
+    for i in range(n_no_groups):
+        connection.execute("INSERT INTO tmp_appln_no_fam VALUES "
+                           "(?, ?, ?, ?, ?)", (10000 + i, 'CN', None,
+                                               2010, 5000 + i))
+
+
+@pytest.fixture
+def sqlite_engine(tmp_path):
+    return create_engine(f'sqlite:///{tmp_path}/patstat.db')
+
+
+@pytest.mark.parametrize('chunksize,limit', [(10, None), (7, None),
+                                             (100, None), (10, 8)])
+def test_stream_temp_tables(sqlite_engine, chunksize, limit):
+    with sqlite_engine.connect() as connection:
+        _create_temp_tables(connection)
+        chunks = list(stream_temp_tables(connection, chunksize=chunksize,
+                                         limit=limit))
+        # The equivalent non-streamed data
+        tables = ["tmp_appln_fam_groups", "tmp_appln_no_fam"]
+        dfs = {tbl: pd.read_sql(f"SELECT * FROM {tbl}", connection)
+               for tbl in tables}
+    if limit is not None:
+        dfs = {tbl: df[:limit] for tbl, df in dfs.items()}
+    assert all(len(chunk) == chunksize for chunk in chunks[:-1])
+    assert 0 < len(chunks[-1]) <= chunksize
+    data = [row for chunk in chunks for row in chunk]
+    assert data == concat_dfs(dfs)
+
+
+@mock.patch(PATH.format('generate_temp_tables'))
+@mock.patch(PATH.format('get_mysql_engine'))
+def test_stream_data(mocked_engine, mocked_generate, sqlite_engine):
+    mocked_engine.return_value = sqlite_engine
+    mocked_generate.side_effect = lambda conn, **kwargs: (
+        _create_temp_tables(conn) or mock.Mock())
+    chunks = list(stream_data(chunksize=10))
+    assert [len(chunk) for chunk in chunks] == [10, 10, 10, 7]
+    assert chunks[-1][-1]['appln_id'] == ['10011']
+    assert chunks[0][0]['appln_auth'] == ['GB']
@@ -40,12 +40,196 @@ would have at least 1000 members and so the default value of
 """
 
 from nesta.packages.vectors.read import download_vectors
+from nesta.core.luigihacks.s3 import parse_s3_path
+from botocore.exceptions import ClientError
+from io import BytesIO
+import numpy as np
+import logging
+import boto3
 import faiss
 
+INDEX_TYPES = ('ivf_flat', 'ivf_pq', 'hnsw')
+
+
+def build_index(data, n_clusters=250, metric=faiss.METRIC_L1, nprobe=100):
+    """Train and fill an IVF index with the given vectors. Note that
+    only the quantizer (which assigns vectors to IVF cells) uses the given
+    metric, since the IVF lists of faiss 1.6 only support the L2 metric.
+
+    Args:
+        data (np.array): An array of vectors (float32).
+        n_clusters (int): Number of IVF cells, capped at the number of vectors.
+        metric (faiss.METRIC*): The distance metric for the quantizer.
+        nprobe (int): Number of IVF cells to visit for each query.
+    Returns:
+        index (faiss.IndexIVFFlat): A trained index, containing all vectors.
+    """
+    n, d = data.shape
+    n_clusters = n if n < n_clusters else n_clusters
+    quantizer = faiss.IndexFlat(d, metric)
+    index = faiss.IndexIVFFlat(quantizer, d, n_clusters)
+    index.train(data)
+    index.add(data)
+    index.nprobe = nprobe
+    return index
+
+
+def search_in_chunks(index, data, k, chunksize=10000):
+    """Query the index with consecutive chunks of vectors, so that
+    no more than chunksize x k distances are held in memory at once.
+
+    Args:
+        index (faiss.Index): A filled index.
+        data (np.array): An array of query vectors.
+        k (int): The number of nearest neighbours to retrieve.
+        chunksize (int): The number of query vectors per search.
+    Yields:
+        D, I (np.array, np.array): Distances and indexes of the k nearest
+                                   neighbours for each vector in the chunk.
+    """
+    for start in range(0, len(data), chunksize):
+        yield index.search(data[start:start+chunksize], k)
+
+
+class VectorIndex:
+    """A FAISS index of vectors and their ids, which can be saved to (and
+    loaded from) local disk or S3, extended with new vectors without
+    retraining, and queried in chunks of bounded memory. Use
+    :obj:`VectorIndex.build` to create a new index.
+
+    Args:
+        index (faiss.Index): A trained FAISS index.
+        ids (np.array): An array of id fields, aligned with the vectors
+                        in the index.
+    """
+    def __init__(self, index, ids):
+        self.index = index
+        self.ids = np.asarray(ids)
+
+    @classmethod
+    def build(cls, data, ids, index_type='ivf_flat', metric=faiss.METRIC_L1,
+              n_clusters=250, nprobe=100, pq_m=64, pq_nbits=8,
+              hnsw_m=32, ef_search=128):
+        """Build (and train, if required) an index, containing the given vectors.
+        'ivf_flat' is exact within the probed IVF cells, although it only
+        uses the metric to assign vectors to cells (see :obj:`build_index`). 'ivf_pq' compresses
+        vectors with product quantization, which uses much less memory but
+        only supports the L2 and inner product metrics. 'hnsw' requires no
+        training, and is fast to query on CPU-only boxes.
+
+        Args:
+            data (np.array): An array of vectors (float32).
+            ids (np.array): An array of id fields, aligned with the data.
+            index_type (str): One of 'ivf_flat', 'ivf_pq' or 'hnsw'.
+            metric (faiss.METRIC*): The distance metric for faiss to use.
+            n_clusters (int): Number of IVF cells, capped at the number of vectors.
+            nprobe (int): Number of IVF cells to visit for each query.
+            pq_m (int): Number of PQ sub-vectors, which must divide the
+                        dimensionality of the vectors.
+            pq_nbits (int): Number of bits per PQ sub-vector code.
+            hnsw_m (int): Number of neighbours per node in the HNSW graph.
+            ef_search (int): Size of the HNSW candidate list for each query.
+        Returns:
+            index (VectorIndex): A trained index, containing all vectors.
+        """
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f'index_type must be one of {INDEX_TYPES}, '
+                             f'not {index_type}')
+        data = np.ascontiguousarray(data, dtype=np.float32)
+        n, d = data.shape
+        if index_type == 'ivf_flat':
+            return cls(build_index(data, n_clusters=n_clusters,
+                                   metric=metric, nprobe=nprobe), ids)
+        if index_type == 'hnsw':
+            index = faiss.IndexHNSWFlat(d, hnsw_m, metric)
+            index.hnsw.efSearch = ef_search
+            index.add(data)
+            return cls(index, ids)
+        if metric not in (faiss.METRIC_L2, faiss.METRIC_INNER_PRODUCT):
+            raise ValueError("The 'ivf_pq' index only supports "
+                             "the L2 and inner product metrics")
+        n_clusters = n if n < n_clusters else n_clusters
+        quantizer = faiss.IndexFlat(d, metric)
+        index = faiss.IndexIVFPQ(quantizer, d, n_clusters, pq_m,
+                                 pq_nbits, metric)
+        index.train(data)
+        index.add(data)
+        index.nprobe = nprobe
+        return cls(index, ids)
+
+    def __len__(self):
+        return self.index.ntotal
+
+    def add(self, data, ids):
+        """Add vectors to the index, without retraining it.
+
+        Args:
+            data (np.array): An array of vectors.
+            ids (np.array): An array of id fields, aligned with the data.
+        """
+        self.index.add(np.ascontiguousarray(data, dtype=np.float32))
+        self.ids = np.concatenate([self.ids, np.asarray(ids)])
+
+    def search(self, data, k, chunksize=10000):
+        """Query the index in chunks (see :obj:`search_in_chunks`).
+
+        Args:
+            data (np.array): An array of query vectors.
+            k (int): The number of nearest neighbours to retrieve,
+                     capped at the number of vectors in the index.
+            chunksize (int): The number of query vectors per search.
+        Yields:
+            D, I (np.array, np.array): Distances and positions (in :obj:`ids`)
+                                       of the nearest neighbours of each vector.
+        """
+        data = np.ascontiguousarray(data, dtype=np.float32)
+        k = min(k, len(self))
+        yield from search_in_chunks(self.index, data, k, chunksize=chunksize)
+
+    def save(self, path):
+        """Save the index to a local path, or an S3 path (s3://bucket/key).
+
+        Args:
+            path (str): Path to save the index to.
+        """
+        buffer = BytesIO()
+        np.savez(buffer, index=faiss.serialize_index(self.index),
+                 ids=self.ids)
+        if path.startswith('s3://'):
+            s3 = boto3.resource('s3')
+            s3.Object(*parse_s3_path(path)).put(Body=buffer.getvalue())
+        else:
+            with open(path, 'wb') as f:
+                f.write(buffer.getvalue())
+
+    @classmethod
+    def load(cls, path):
+        """Load an index saved by :obj:`save`.
+
+        Args:
+            path (str): Local path, or S3 path (s3://bucket/key).
+        Returns:
+            index (VectorIndex): The index, or None if the path doesn't exist.
+        """
+        try:
+            if path.startswith('s3://'):
+                s3 = boto3.resource('s3')
+                body = s3.Object(*parse_s3_path(path)).get()['Body'].read()
+            else:
+                with open(path, 'rb') as f:
+                    body = f.read()
+        except (ClientError, FileNotFoundError):
+            logging.info(f'No index found at {path}')
+            return None
+        # allow_pickle is required for object (e.g. string) ids
+        saved = np.load(BytesIO(body), allow_pickle=True)
+        return cls(faiss.deserialize_index(saved['index']), saved['ids'])
+
 
 def find_similar_vectors(data, ids, k=20, k_large=1000,
                          n_clusters=250,
-                         metric=faiss.METRIC_L1, score_threshold=0.5):
+                         metric=faiss.METRIC_L1, score_threshold=0.5,
+                         index=None, chunksize=10000):
     """Returns a lookup of similar vectors, by ID.
     Similarity is determined by the given metric parameter. For high-dim
     vectors, such as those generated by BERT transformers
@@ -70,53 +254,56 @@ def find_similar_vectors(data, ids, k=20, k_large=1000,
         metric (faiss.METRIC*): The distance metric for faiss to use.
                                 (default=faiss.METRIC_L2)
         score_threshold (float): See above for definition. (default=0.5)
+        index (VectorIndex): A prebuilt index to query, which must
+                             contain the data. If None, an IVF index is
+                             built from the data.
+        chunksize (int): The number of query vectors per search, which bounds
+                         the memory used to chunksize x k_large distances.
     """
-    n, d = data.shape
+    if index is None:
+        index = VectorIndex.build(data, ids, n_clusters=n_clusters,
+                                  metric=metric)
+    n = len(index)
     k = n if k > n else k
     k_large = n if k_large > n else k_large
-    n_clusters = n if n < n_clusters else n_clusters
-    quantizer = faiss.IndexFlat(d, metric)
-    index = faiss.IndexIVFFlat(quantizer, d, n_clusters)
-    index.train(data)
-    index.add(data)
-    
-    # Make an expansive search to determine the base level of 
-    # similarity in this space as the mean similarity of documents
-    # in the close vicinity
-    index.nprobe = 100
-    D, I = index.search(data, k_large)
-    base_similarity = D.mean(axis=1)  # Calculate the mean distance
-
-    # Now subset only the top k results
-    D = D[:,:k]  # Distances
-    I = I[:,:k]  # Indexes of the k results
-
-    # Extract similar vectors
+
+    # Extract similar vectors, a chunk of query vectors at a time
     similar_vectors = {}
-    for _id, all_ids, sims, base in zip(ids, ids[I], D, base_similarity):
-        _id = str(_id)  # FAISS returns ids as strings
-        scores = (base - sims) / base
-        over_threshold = scores > score_threshold
-        # If no similar results, noting that the query vector is always
-        # found so there will always be one result
-        if over_threshold.sum() <= 1:
-            continue
-        results = {i: float(s) for i, s in zip(all_ids, scores)
-                   if s > score_threshold  # Ignore low scores
-                   and _id != i  # Ignore the query vector itself
-                   and i not in similar_vectors}  # Don't duplicate results
-        # Possible that there are no similar vectors, 
-        # depending on the score_threshold
-        if len(results) == 0:
-            continue
-        similar_vectors[_id] = results
+    query_ids = iter(ids)
+    for D, I in index.search(data, k_large, chunksize=chunksize):
+        # Make an expansive search to determine the base level of
+        # similarity in this space as the mean similarity of documents
+        # in the close vicinity
+        base_similarity = D.mean(axis=1)  # Calculate the mean distance
+        # Now subset only the top k results
+        D = D[:, :k]  # Distances
+        I = I[:, :k]  # Indexes of the k results
+        for _id, all_ids, sims, base in zip(query_ids, index.ids[I], D,
+                                            base_similarity):
+            _id = str(_id)  # FAISS returns ids as strings
+            scores = (base - sims) / base
+            over_threshold = scores > score_threshold
+            # If no similar results, noting that the query vector is always
+            # found so there will always be one result
+            if over_threshold.sum() <= 1:
+                continue
+            results = {i: float(s) for i, s in zip(all_ids, scores)
+                       if s > score_threshold  # Ignore low scores
+                       and _id != i  # Ignore the query vector itself
+                       and i not in similar_vectors}  # Don't duplicate results
+            # Possible that there are no similar vectors,
+            # depending on the score_threshold
+            if len(results) == 0:
+                continue
+            similar_vectors[_id] = results
     return similar_vectors
 
 
 def generate_duplicate_links(orm, id_field, database, k=20, k_large=1000,
                              n_clusters=250,
                              metric=faiss.METRIC_L1, duplicate_threshold=0.5,
-                             read_chunksize=10000, read_max_chunks=None):
+                             read_chunksize=10000, read_max_chunks=None,
+                             index_path=None, rebuild_index=False):
     """Convenience method finding duplicate text via embeddings
     in the database.
 
@@ -154,6 +341,16 @@ def generate_duplicate_links(orm, id_field, database, k=20, k_large=1000,
                                read from the database (e.g. if in testing mode).
                                If set to None (default) then all data will be read.
                                (default=None)
+        index_path (str): Optional local or S3 path (s3://bucket/key) of a
+                          persistent index. If it exists, only vectors which
+                          are not already in the index are added to it
+                          (without retraining), and it is then saved back.
+                          Vectors of ids which are already in the index are
+                          never replaced, so the index must be rebuilt
+                          (see `rebuild_index`) if any vectors have changed.
+        rebuild_index (bool): Build a new index from all of the vectors,
+                              and save it to `index_path`, rather than
+                              extending the existing index.
 
     Returns:
         links (json): Rows containing the ids of matching documents
@@ -163,14 +360,27 @@ def generate_duplicate_links(orm, id_field, database, k=20, k_large=1000,
     data, ids = download_vectors(orm=orm, id_field=id_field, database=database,
                                  chunksize=read_chunksize, 
                                  max_chunks=read_max_chunks)
+    index = None
+    if index_path is not None:
+        if not rebuild_index:
+            index = VectorIndex.load(index_path)
+        if index is None:
+            index = VectorIndex.build(data, ids, n_clusters=n_clusters,
+                                      metric=metric)
+        else:
+            new = ~np.isin(ids, index.ids)
+            index.add(data[new], ids[new])
+        index.save(index_path)
     # Find all sets of similar vectors
     similar_vectors = find_similar_vectors(data=data, ids=ids, k=k,
                                            k_large=k_large, metric=metric,
                                            n_clusters=n_clusters,
-                                           score_threshold=duplicate_threshold)
+                                           score_threshold=duplicate_threshold,
+                                           index=index)
     # Clean up
     del data
     del ids
+    del index
     # Structure the output for ingestion to the database as a link table
     links = [{f"{id_field}_1": _id1, f"{id_field}_2": _id2, "weight": weight}
              for _id1, sims in similar_vectors.items()
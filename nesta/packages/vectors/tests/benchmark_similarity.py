@@ -0,0 +1,65 @@
+"""
+benchmark_similarity
+====================
+
+Recall@k (against an exact, brute-force index) and query latency of each
+:obj:`VectorIndex` type, on synthetic BERT-sized (768 dimensional)
+vectors, which are clustered in order to mimic the "lumpiness" of
+document embeddings. Run with:
+
+    python nesta/packages/vectors/tests/benchmark_similarity.py
+"""
+
+import time
+
+import faiss
+import numpy as np
+
+from nesta.packages.vectors.similarity import VectorIndex
+
+
+def synthetic_vectors(n, d=768, n_topics=200, seed=42):
+    rng = np.random.RandomState(seed)
+    centres = rng.normal(size=(n_topics, d))
+    topics = rng.randint(0, n_topics, size=n)
+    data = centres[topics] + 0.5 * rng.normal(size=(n, d))
+    return data.astype(np.float32)
+
+
+def recall(I, exact):
+    k = exact.shape[1]
+    return np.mean([len(set(a) & set(b)) / k for a, b in zip(I, exact)])
+
+
+def run(n=50000, n_queries=1000, k=20, options=None):
+    data = synthetic_vectors(n)
+    ids = np.arange(n)
+    queries = data[:n_queries]
+    if options is None:
+        options = [('ivf_flat', faiss.METRIC_L1, {}),
+                   ('hnsw', faiss.METRIC_L1, {}),
+                   ('ivf_flat', faiss.METRIC_L2, {}),
+                   ('ivf_pq', faiss.METRIC_L2, {'pq_m': 96}),
+                   ('hnsw', faiss.METRIC_L2, {})]
+    for index_type, metric, kwargs in options:
+        # The IVF lists of 'ivf_flat' are always searched with L2
+        exact_metric = (faiss.METRIC_L2 if index_type == 'ivf_flat'
+                        else metric)
+        exact = faiss.IndexFlat(data.shape[1], exact_metric)
+        exact.add(data)
+        _, exact_I = exact.search(queries, k)
+        start = time.time()
+        index = VectorIndex.build(data, ids, index_type=index_type,
+                                  metric=metric, **kwargs)
+        build_time = time.time() - start
+        start = time.time()
+        (_, I), = index.search(queries, k)
+        latency = 1000 * (time.time() - start) / n_queries
+        metric_name = 'L1' if metric == faiss.METRIC_L1 else 'L2'
+        print(f"{index_type:>8} ({metric_name}): recall@{k} "
+              f"{recall(I, exact_I):.3f}, {latency:.2f} ms/query, "
+              f"built in {build_time:.1f}s")
+
+
+if __name__ == "__main__":
+    run()
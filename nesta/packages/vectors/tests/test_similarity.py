@@ -0,0 +1,155 @@
+import pytest
+from unittest import mock
+
+import faiss
+import numpy as np
+
+from nesta.packages.vectors.similarity import VectorIndex
+from nesta.packages.vectors.similarity import find_similar_vectors
+from nesta.packages.vectors.similarity import generate_duplicate_links
+
+PATH = 'nesta.packages.vectors.similarity.{}'
+
+
+@pytest.fixture
+def data():
+    rng = np.random.RandomState(42)
+    return rng.uniform(size=(500, 16)).astype(np.float32)
+
+
+@pytest.fixture
+def ids():
+    return np.array([f'id{i}' for i in range(500)])
+
+
+def _exact_neighbours(data, k, metric):
+    index = faiss.IndexFlat(data.shape[1], metric)
+    index.add(data)
+    _, I = index.search(data, k)
+    return I
+
+
+# The IVF lists of 'ivf_flat' are always searched with the L2 metric
+@pytest.mark.parametrize('index_type,metric,exact_metric',
+                         [('ivf_flat', faiss.METRIC_L1, faiss.METRIC_L2),
+                          ('ivf_pq', faiss.METRIC_L2, faiss.METRIC_L2),
+                          ('hnsw', faiss.METRIC_L1, faiss.METRIC_L1)])
+def test_vector_index_recall(data, ids, index_type, metric, exact_metric):
+    index = VectorIndex.build(data, ids, index_type=index_type, metric=metric,
+                              n_clusters=10, pq_m=8)
+    assert len(index) == len(data)
+    (D, I), = index.search(data, 5)
+    exact = _exact_neighbours(data, 5, exact_metric)
+    recall = np.mean([len(set(a) & set(b)) / 5 for a, b in zip(I, exact)])
+    assert recall > 0.3 if index_type == 'ivf_pq' else recall > 0.9
+
+
+def test_vector_index_pq_requires_l2(data, ids):
+    with pytest.raises(ValueError):
+        VectorIndex.build(data, ids, index_type='ivf_pq',
+                          metric=faiss.METRIC_L1)
+    with pytest.raises(ValueError):
+        VectorIndex.build(data, ids, index_type='kd_tree')
+
+
+def test_vector_index_search_in_chunks(data, ids):
+    index = VectorIndex.build(data, ids, n_clusters=10)
+    chunks = list(index.search(data, 5, chunksize=200))
+    assert [len(D) for D, _ in chunks] == [200, 200, 100]
+    (_, I), = index.search(data, 5)
+    assert np.array_equal(np.vstack([I for _, I in chunks]), I)
+    # k is capped by the size of the index
+    (D, _), = index.search(data[:3], 1000)
+    assert D.shape == (3, 500)
+
+
+def test_vector_index_add(data, ids):
+    index = VectorIndex.build(data[:400], ids[:400], n_clusters=10)
+    index.add(data[400:], ids[400:])
+    assert len(index) == 500
+    assert np.array_equal(index.ids, ids)
+    # The query vectors find themselves
+    (_, I), = index.search(data[400:], 1)
+    assert list(index.ids[I[:, 0]]) == list(ids[400:])
+
+
+def test_vector_index_save_load(tmp_path, data, ids):
+    path = str(tmp_path / 'index.npz')
+    assert VectorIndex.load(path) is None
+    index = VectorIndex.build(data, ids, index_type='hnsw')
+    index.save(path)
+    loaded = VectorIndex.load(path)
+    assert np.array_equal(loaded.ids, ids)
+    (D, I), = index.search(data, 5)
+    (_D, _I), = loaded.search(data, 5)
+    assert np.array_equal(I, _I)
+
+
+@mock.patch(PATH.format('boto3'))
+def test_vector_index_save_load_s3(mocked_boto, data, ids):
+    index = VectorIndex.build(data, ids, n_clusters=10)
+    index.save('s3://bucket/path/index.npz')
+    obj = mocked_boto.resource.return_value.Object
+    assert obj.call_args[0] == ('bucket', 'path/index.npz')
+    body = obj.return_value.put.call_args[1]['Body']
+    obj.return_value.get.return_value['Body'].read.return_value = body
+    loaded = VectorIndex.load('s3://bucket/path/index.npz')
+    assert np.array_equal(loaded.ids, ids)
+    assert len(loaded) == len(data)
+
+
+def test_find_similar_vectors_chunks(data, ids):
+    # Plant some near-duplicates
+    data[1] = data[0] + 1e-3
+    data[3] = data[2] + 1e-3
+    similar = find_similar_vectors(data, ids, k=5, k_large=50, n_clusters=10)
+    assert similar == find_similar_vectors(data, ids, k=5, k_large=50,
+                                           n_clusters=10, chunksize=7)
+    assert 'id1' in similar['id0'] or 'id0' in similar['id1']
+    assert 'id3' in similar['id2'] or 'id2' in similar['id3']
+
+
+@mock.patch(PATH.format('download_vectors'))
+def test_generate_duplicate_links_index_path(mocked_download, tmp_path,
+                                             data, ids):
+    data[1] = data[0] + 1e-3
+    path = str(tmp_path / 'index.npz')
+    mocked_download.return_value = (data[:400], ids[:400])
+    links = generate_duplicate_links(orm=None, id_field='id', database=None,
+                                     k=5, k_large=50, n_clusters=10,
+                                     index_path=path)
+    assert {'id_1': 'id0', 'id_2': 'id1'} in [{k: v for k, v in link.items()
+                                               if k != 'weight'}
+                                              for link in links]
+    assert len(VectorIndex.load(path)) == 400
+
+    # Only the new vectors are added to the saved index
+    mocked_download.return_value = (data, ids)
+    generate_duplicate_links(orm=None, id_field='id', database=None,
+                             k=5, k_large=50, n_clusters=10,
+                             index_path=path)
+    index = VectorIndex.load(path)
+    assert len(index) == 500
+    assert np.array_equal(index.ids, ids)
+
+
+@mock.patch(PATH.format('download_vectors'))
+def test_generate_duplicate_links_rebuild_index(mocked_download, tmp_path,
+                                                data, ids):
+    path = str(tmp_path / 'index.npz')
+    mocked_download.return_value = (data, ids)
+    kwargs = dict(orm=None, id_field='id', database=None, k=5, k_large=50,
+                  n_clusters=10, index_path=path)
+
+    def linked(links):
+        return {(link['id_1'], link['id_2']) for link in links}
+
+    data[1] = data[0] + 1e-3
+    assert ('id0', 'id1') in linked(generate_duplicate_links(**kwargs))
+    # The vector of id1 changes, but the saved index still has the old one
+    data[1] = 1 - data[0]
+    assert ('id0', 'id1') in linked(generate_duplicate_links(**kwargs))
+    # ...until the index is rebuilt
+    links = generate_duplicate_links(rebuild_index=True, **kwargs)
+    assert ('id0', 'id1') not in linked(links)
+    assert ('id0', 'id1') not in linked(generate_duplicate_links(**kwargs))